@@ -384,9 +384,9 @@ class AdvancedPipelineUI:
                 # Model config changed - cleanup Gemini files
                 if st.session_state.previous_model_config == 'gemini_flash':
                     try:
-                        from services.gemini_service import GeminiService
+                        from services.shared_services import shared_gemini_service
                         from model_configs import GOOGLE_API_KEY
-                        gemini_service = GeminiService(GOOGLE_API_KEY, 'gemini_flash')
+                        gemini_service = shared_gemini_service(GOOGLE_API_KEY, 'gemini_flash')
                         cleanup_result = gemini_service.delete_all_files()
                         if cleanup_result['success']:
                             st.success(f"🗑️ Cleaned up {cleanup_result['deleted_count']} Gemini files")
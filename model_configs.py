@@ -3,6 +3,7 @@ Model configuration presets for easy switching between different Claude models
 Allows for cost optimization and performance tuning based on task requirements
 """
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -87,18 +88,24 @@ def get_model_config(config_name: str = 'claude_sonnet') -> dict:
     """Get model configuration by name"""
     return AVAILABLE_CONFIGS.get(config_name, CLAUDE_SONNET_CONFIG)
 
+# The lookups below only read the static tables above and run on every request
+# (and every UI rerun), so their answers are memoized
+
+@lru_cache(maxsize=64)
 def get_model_for_task(task: str, config_name: str = 'claude_sonnet') -> str:
     """Get specific model for a task"""
     config = get_model_config(config_name)
     return config.get(task, 'claude-3-5-sonnet-20241022')
 
+@lru_cache(maxsize=16)
 def get_provider(config_name: str = 'claude_sonnet') -> str:
     """Get AI provider for the configuration"""
     config = get_model_config(config_name)
     return config.get('provider', 'anthropic')
 
+@lru_cache(maxsize=1)
 def list_available_configs() -> dict:
-    """List all available configurations with details"""
+    """List all available configurations with details (one shared dict; treat as read-only)"""
     result = {}
     for name, config in AVAILABLE_CONFIGS.items():
         result[name] = {
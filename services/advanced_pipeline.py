@@ -4,27 +4,314 @@ Complete 4-step pipeline: Preprocess -> Upload Vision Image -> Extract -> Valida
 Optimized to save tokens by removing unnecessary PDF uploads to Claude
 """
 
+import copy
 import json
 import time
 import os
+import hashlib
 import io
+import mmap
+import multiprocessing
+import logging
+import queue
+import threading
 import cv2
 import numpy as np
 import fitz  # PyMuPDF
-from PIL import Image, ImageEnhance, ImageFilter
+from PIL import Image, ImageFilter
 from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from functools import cached_property
 # OpenAI import removed - using Claude only
-import tempfile
 import re
-from dotenv import load_dotenv
 
-# Ensure .env is loaded
-load_dotenv()
+# orjson is much faster on large LLM payloads; fall back to stdlib json if missing
+try:
+    import orjson
+    _json_loads = orjson.loads
+
+    def _json_dumps(obj) -> str:
+        # Compact output: no indentation or separator spaces
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+    def _json_canonical(obj) -> bytes:
+        # Sorted keys so equal data always hashes the same; bytes feed hashlib directly
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+except ImportError:
+    orjson = None
+    _json_loads = json.loads
+
+    def _json_dumps(obj) -> str:
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+    def _json_canonical(obj) -> bytes:
+        return json.dumps(obj, sort_keys=True, ensure_ascii=False).encode('utf-8')
+
+# cysimdjson parses lazily, so envelope fields can be read without building the full dict
+try:
+    import cysimdjson
+except ImportError:
+    cysimdjson = None
+
+# Precompiled once - _clean_json_response runs on every validation round
+_TRAILING_COMMA_RE = re.compile(r',(\s*[}\]])')
+
+# Sentinel for dict lookups where None is a legitimate value
+_MISSING = object()
+
+# Top-level fields every validation response must carry
+_REQUIRED_FIELDS = ("validation_status", "accuracy_estimate", "corrections_made")
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on memoized Gemini validation responses kept per pipeline
+_VALIDATION_CACHE_SIZE = 128
+# Seconds a memoized validation response stays usable
+_VALIDATION_CACHE_TTL = 600
+
+# Upper bound on cached raw page texts kept per pipeline
+_TEXT_CACHE_SIZE = 64
+
+# Worker processes for CPU-bound page preprocessing in multi-page runs, so concurrent pages
+# enhance/encode in parallel instead of contending for the GIL. Created once, on the first
+# multi-page run; spawned rather than forked because the parent already runs threads
+# (Streamlit, page workers, the debug writer) and forking those can deadlock the child
+_cpu_pool = None
+_cpu_pool_lock = threading.Lock()
+
+
+def _get_cpu_pool() -> ProcessPoolExecutor:
+    global _cpu_pool
+    with _cpu_pool_lock:
+        if _cpu_pool is None:
+            _cpu_pool = ProcessPoolExecutor(max_workers=min(4, os.cpu_count() or 1),
+                                            mp_context=multiprocessing.get_context("spawn"))
+        return _cpu_pool
+
+# Longest image edge each provider's vision models actually use
+_VISION_MAX_EDGE = {'anthropic': 1568, 'google': 3072}
+
+# Shared rules block for Gemini validation prompts (single-page and batched)
+_GEMINI_VALIDATION_RULES = """CRITICAL VALIDATION RULES:
+
+1. **TEXT TRUNCATION HANDLING - CRITICAL RULE:**
+   - **ALWAYS PRESERVE the longer extracted text over shorter visual text**
+   - If extracted data = "Dental Insurance S125" but image shows = "Dental Insurance", KEEP "Dental Insurance S125"
+   - If extracted data = "Minnesota Federal Loan Assessment" but image shows = "Minnesota Federal Lo...", KEEP the full text
+   - **NEVER truncate good extracted data to match visually truncated image text**
+   - Only change if extracted text is completely wrong (different meaning entirely)
+
+0. **DATE FORMAT STANDARDIZATION:**
+   - Convert dates to clean format: "YYYY-MM-DD" (e.g., "2024-12-17")
+   - Remove time components: "2024-12-17T00:00:00" should become "2024-12-17"
+   - Apply to ALL date fields consistently
+
+2. **TABLE ROW COUNT ACCURACY:**
+   - Count EXACTLY how many rows you see in each table in the PDF
+   - Do NOT add extra rows that don't exist in the PDF
+   - Flag if extracted data has more rows than visually present
+
+3. **COLUMN ALIGNMENT VALIDATION:**
+   - For deduction tables: Check if values are in correct columns
+   - Look for shifts: "B5" appearing in CalCode instead of Frequency column
+   - Verify each value is under the correct column header
+
+4. **MINIMAL CORRECTIONS:**
+   - Express each fix as a JSON Patch (RFC 6902) operation in "corrections"
+   - Use "replace" to change a value, "add" to insert a missing field or row, "remove" to drop an extra row
+   - Paths are JSON Pointers into the extracted data, e.g. "/deductions/2/frequency"
+   - Only patch the specific fields that have errors; everything else is kept unchanged
+
+The extracted data is given as compact JSON (no indentation); its structure is unchanged.
+
+INSTRUCTIONS:
+1. **PRESERVE FULL TEXT**: Never shorten extracted text to match truncated visual text
+2. Count table rows precisely - never add rows that don't exist
+3. Check column alignment carefully for deduction information
+4. Clean all date formats to YYYY-MM-DD (remove time components)
+5. Return only JSON Patch operations in corrections - never repeat the full JSON structure
+6. Only set accuracy_estimate to 1.0 (100%) if NO issues are found in this round
+7. Return VALIDATION RESULTS in JSON format ONLY - no extra commentary
+"""
+
+# Response contract for single-page validation
+_GEMINI_RESPONSE_FORMAT = """Return JSON with this structure:
+{
+    "validation_passed": true/false,
+    "accuracy_estimate": 0.95,
+    "issues_found": [
+        {
+            "field": "field_name",
+            "issue": "description of issue",
+            "suggested_correction": "corrected value"
+        }
+    ],
+    "corrections": [
+        {"op": "replace", "path": "/field_name", "value": "corrected value"}
+    ]
+}
+"""
+
+# Response contract for batched multi-page validation
+_GEMINI_BATCH_RESPONSE_FORMAT = """Return JSON with this structure:
+{
+    "pages": [
+        {
+            "index": 0,
+            "validation_passed": true/false,
+            "accuracy_estimate": 0.95,
+            "issues_found": [
+                {
+                    "field": "field_name",
+                    "issue": "description of issue",
+                    "suggested_correction": "corrected value"
+                }
+            ],
+            "corrections": [
+                {"op": "replace", "path": "/field_name", "value": "corrected value"}
+            ]
+        }
+    ]
+}
+"""
+
+# Everything that does not change between rounds or pages goes first, so the
+# provider's implicit prefix caching can reuse it; round data is appended last
+_GEMINI_VALIDATION_PROMPT_PREFIX = (
+    "\nYou are a data validation specialist. Compare the extracted data against the actual PDF image "
+    "to verify accuracy. The extracted data for this round follows the rules below.\n\n"
+    + _GEMINI_VALIDATION_RULES + _GEMINI_RESPONSE_FORMAT
+)
+
+# Fixed text that follows the "ROUND n of m" marker, ahead of the round's data
+_GEMINI_ROUND_HEADER_TAIL = " - VALIDATION WITH CORRECTIONS:\n\nEXTRACTED DATA:\n"
+_GEMINI_BATCH_ROUND_HEADER_TAIL = " - BATCHED VALIDATION WITH CORRECTIONS:\n\nEXTRACTED DATA:\n"
+# Appended after the round marker when the previous round listed issues but sent no corrections
+_GEMINI_MISSING_CORRECTIONS_NOTE = (
+    "\nThe previous round reported issues but returned no corrections. Include a JSON Patch "
+    "operation in \"corrections\" for every issue you report.\n"
+)
+
+_GEMINI_BATCH_PROMPT_PREFIX = (
+    "\nYou are a data validation specialist. Compare the extracted data for each page against its PDF page image "
+    "to verify accuracy. The page images are attached in the same order as the PAGE sections below. "
+    "Validate each page only against its own image.\n\n"
+    + _GEMINI_VALIDATION_RULES + _GEMINI_BATCH_RESPONSE_FORMAT
+)
+
+
+def _apply_json_patch(document, operations: list):
+    """Apply RFC 6902 add/replace/remove operations without mutating document
+
+    Only the containers along each patched path are copied; everything else is
+    shared with the original. Operations that do not fit the document are skipped.
+    """
+    for operation in operations:
+        try:
+            document = _apply_patch_operation(document, operation)
+        except (KeyError, IndexError, TypeError, ValueError, AttributeError) as e:
+            print(f"[WARNING] Skipping JSON Patch operation {operation!r}: {e}")
+    return document
+
+
+def _apply_patch_operation(document, operation: dict):
+    """Apply a single JSON Patch operation, copying containers on the way down"""
+    op = operation["op"]
+    if op not in ("add", "replace", "remove"):
+        raise ValueError(f"unsupported op {op!r}")
+
+    tokens = [token.replace("~1", "/").replace("~0", "~") for token in operation["path"].split("/")[1:]]
+    if not tokens:
+        if op == "remove":
+            raise ValueError("cannot remove the document root")
+        return operation["value"]
+
+    last = len(tokens) - 1
+
+    def patch(container, depth):
+        token = tokens[depth]
+        if isinstance(container, list):
+            container = list(container)
+            if token == "-":
+                # "-" names the slot past the end, which only an add can target
+                if depth < last or op != "add":
+                    raise IndexError(f"'-' is only valid as the target of add, not {op}")
+                index = len(container)
+            elif token.isdigit() and (token == "0" or not token.startswith("0")):
+                index = int(token)
+            else:
+                raise ValueError(f"invalid array index {token!r}")
+            # add may insert at the end; every other target has to exist already
+            upper = len(container) if depth == last and op == "add" else len(container) - 1
+            if index > upper:
+                raise IndexError(f"array index {index} out of range for length {len(container)}")
+            if depth < last:
+                container[index] = patch(container[index], depth + 1)
+            elif op == "add":
+                container.insert(index, operation["value"])
+            elif op == "replace":
+                container[index] = operation["value"]
+            else:
+                del container[index]
+        elif isinstance(container, dict):
+            container = dict(container)
+            if depth < last:
+                container[token] = patch(container[token], depth + 1)
+            elif op == "remove":
+                del container[token]
+            elif op == "replace":
+                if token not in container:
+                    raise KeyError(f"replace target {token!r} does not exist")
+                container[token] = operation["value"]
+            else:
+                container[token] = operation["value"]
+        else:
+            raise TypeError(f"cannot index into {type(container).__name__}")
+        return container
+
+    return patch(document, 0)
+
+
+def _corrected_data_from(validation_data: dict, current_data):
+    """Resolve a validation response to the corrected document, or None if it has none"""
+    corrections = validation_data.get('corrections')
+    if isinstance(corrections, list):
+        return _apply_json_patch(current_data, corrections)
+    # Responses that still carry a full corrected copy
+    return validation_data.get('corrected_data')
+
+
+def _leaf_values(value):
+    """Every scalar in a nested dict/list structure"""
+    if isinstance(value, dict):
+        for item in value.values():
+            yield from _leaf_values(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _leaf_values(item)
+    else:
+        yield value
+
+
+def _fill_ratio(data) -> float:
+    """Share of leaf values that are present (not None and not blank strings)"""
+    total = filled = 0
+    for value in _leaf_values(data):
+        total += 1
+        if value is not None and (not isinstance(value, str) or value.strip()):
+            filled += 1
+    return filled / total if total else 0.0
 
 from .schema_text_extractor import SchemaTextExtractor
-from .claude_service import ClaudeService
-from .gemini_service import GeminiService
+from .shared_services import ServiceScope, shared_claude_service, shared_gemini_service
 from .table_alignment_fixer import EnhancedValidationEngine
+from .rate_limiter import limiter_for
+from .http_clients import shared_anthropic_client
+from .upload_index import lookup_upload, record_upload, upload_key
+from .debug_writer import write_debug_file
+from .fast_json import serialized_schema
 
 # Add parent directory to path for imports
 import sys
@@ -39,23 +326,36 @@ class DebugLogger:
         os.makedirs(debug_dir, exist_ok=True)
         self.session_id = int(time.time())
 
+    def _serialize_json(self, data: Any) -> str:
+        """Pretty-printed JSON text, using orjson when available
+
+        Types JSON has no encoding for are written as their str() rather than failing
+        the whole debug dump.
+        """
+        if orjson is not None:
+            return orjson.dumps(
+                data, default=str,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+            ).decode('utf-8')
+        return json.dumps(data, indent=2, ensure_ascii=False, default=str)
+
     def save_step(self, step_name: str, data: Any, data_type: str = "json"):
         """Save intermediate step data"""
         try:
             filename = f"step_{step_name}_{self.session_id}.{data_type}"
             filepath = os.path.join(self.debug_dir, filename)
 
+            # Serialize on the caller's thread so later mutations of data can't leak into the file
             if data_type == "json":
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    if isinstance(data, (dict, list)):
-                        json.dump(data, f, indent=2, ensure_ascii=False)
-                    else:
-                        json.dump({"data": str(data)}, f, indent=2, ensure_ascii=False)
+                payload = self._serialize_json(data)
             elif data_type == "txt":
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    f.write(str(data))
+                payload = str(data)
+            else:
+                payload = None
 
-            print(f"[DEBUG] Saved {step_name} to {filepath}")
+            if payload is not None:
+                # Written on the shared background writer so steps don't block on disk I/O
+                write_debug_file(filepath, payload)
             return filepath
 
         except Exception as e:
@@ -68,57 +368,95 @@ class DebugLogger:
             filename = f"validation_round_{round_num}_{self.session_id}.json"
             filepath = os.path.join(self.debug_dir, filename)
 
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(validation_data, f, indent=2, ensure_ascii=False)
-
-            print(f"[DEBUG] Saved validation round {round_num} to {filepath}")
+            payload = self._serialize_json(validation_data)
+            write_debug_file(filepath, payload)
             return filepath
 
         except Exception as e:
             print(f"[DEBUG] Failed to save validation round {round_num}: {e}")
             return None
 
+@dataclass
+class RenderedPage:
+    """Preprocessed page image, encoded in memory and ready to upload"""
+    data: bytes
+    size: Tuple[int, int]
+    mime_type: str = "image/png"
+
+    @property
+    def bytes_written(self) -> int:
+        return len(self.data)
+
 class HighResImagePreprocessor:
     """600 DPI image preprocessing with advanced enhancements"""
 
-    def __init__(self):
+    # PIL format -> (mime type, save options). Both Claude and Gemini vision accept
+    # WebP, which is several times smaller than PNG for the same page
+    UPLOAD_ENCODINGS = {
+        "WEBP": ("image/webp", {"quality": 90, "method": 4}),
+        "JPEG": ("image/jpeg", {"quality": 92, "optimize": True}),
+        "PNG": ("image/png", {"optimize": True, "dpi": (600, 600)}),
+    }
+
+    def __init__(self, upload_format: str = "WEBP", max_edge: Optional[int] = None):
         self.target_dpi = 600
         self.max_file_size_mb = 20
+        self.upload_format = upload_format
+        # Pixel budget for uploaded images, plus the provider's longest-edge cap if any
+        # (pixels beyond it are discarded server-side anyway)
+        self.max_pixels = 2048 * 2048
+        self.max_edge = max_edge
 
-    def pdf_to_high_res_image(self, pdf_path: str, page_num: int) -> str:
+    def pdf_to_high_res_image(self, pdf_path: str, page_num: int) -> RenderedPage:
         """Convert PDF page to 600 DPI image with preprocessing"""
 
-        print(f"[CONVERT] Converting PDF page {page_num} to 600 DPI...")
+        with fitz.open(pdf_path) as doc:
+            image = self.render_page(doc[page_num])
 
-        doc = fitz.open(pdf_path)
-        page = doc[page_num]
+        return self.preprocess_and_encode(image)
+
+    def render_page(self, page) -> Image.Image:
+        """Render an already-opened fitz page at the target DPI"""
+
+        print(f"[CONVERT] Converting PDF page {page.number} to 600 DPI...")
 
         # Calculate matrix for 600 DPI (scale factor = 600/72 = 8.33)
         zoom_factor = self.target_dpi / 72.0
+
+        # Render straight at the upload size limits instead of materializing the full
+        # 600 DPI buffer and resizing it; enhancement then runs on the smaller image.
+        # The 0.999 margin keeps fitz's rounded-up pixel dimensions inside the limits
+        width, height = page.rect.width * zoom_factor, page.rect.height * zoom_factor
+        scale = min(1.0, (self.max_pixels / (width * height)) ** 0.5)
+        if self.max_edge:
+            scale = min(scale, self.max_edge / max(width, height))
+        if scale < 1.0:
+            zoom_factor *= scale * 0.999
+            print(f"[RESIZE] Rendering at ~{int(zoom_factor * 72)} effective DPI")
         matrix = fitz.Matrix(zoom_factor, zoom_factor)
 
         # Render at high resolution
         pix = page.get_pixmap(matrix=matrix, alpha=False)
 
-        # Convert to PIL Image
-        img_data = pix.tobytes("png")
-        image = Image.open(io.BytesIO(img_data))
-
-        doc.close()
+        # Wrap the raw RGB samples directly (alpha=False guarantees 3 channels);
+        # a PNG encode/decode round trip here costs hundreds of ms at 600 DPI
+        image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples,
+                                "raw", "RGB", pix.stride)
 
         print(f"[OK] Original 600 DPI image size: {image.size}")
+        return image
+
+    def preprocess_and_encode(self, image: Image.Image) -> RenderedPage:
+        """Preprocess a rendered page and encode it for upload (no temp file)"""
 
         # Apply preprocessing
         processed_image = self._preprocess_high_res_image(image)
 
-        # Save with optimization
-        output_path = f"temp_600dpi_{page_num}_{int(time.time())}.png"
-        self._optimize_for_upload(processed_image, output_path)
+        mime_type = self.UPLOAD_ENCODINGS[self.upload_format][0]
+        rendered = RenderedPage(self._optimize_for_upload(processed_image), processed_image.size, mime_type)
+        print(f"[OK] Preprocessed image encoded: {rendered.bytes_written / (1024 * 1024):.1f}MB")
 
-        file_size_mb = os.path.getsize(output_path) / (1024 * 1024)
-        print(f"[OK] Preprocessed image saved: {file_size_mb:.1f}MB")
-
-        return output_path
+        return rendered
 
     def _preprocess_high_res_image(self, image: Image.Image) -> Image.Image:
         """Complete preprocessing pipeline for 600 DPI image"""
@@ -127,8 +465,9 @@ class HighResImagePreprocessor:
         if image.mode != 'RGB':
             image = image.convert('RGB')
 
-        # Check size limits for Claude
-        max_pixels = 2048 * 2048
+        # Check size limits (render_page already renders within them; this covers
+        # images that come from elsewhere)
+        max_pixels = self.max_pixels
         current_pixels = image.size[0] * image.size[1]
 
         if current_pixels > max_pixels:
@@ -158,13 +497,20 @@ class HighResImagePreprocessor:
             print(f"[WARNING] Image too small for processing: {image.size}")
             return image
 
-        # Sharpness enhancement
-        enhancer = ImageEnhance.Sharpness(image)
-        image = enhancer.enhance(1.3)
-
-        # Contrast enhancement
-        enhancer = ImageEnhance.Contrast(image)
-        image = enhancer.enhance(1.15)
+        # Sharpness (1.3) and contrast (1.15) in one fused pass. ImageEnhance.Sharpness
+        # blends with the SMOOTH-filtered image and Contrast with the mean grey level,
+        # so both collapse into a single weighted sum:
+        #   out = c*s*x + c*(1-s)*smooth(x) + (1-c)*mean
+        sharpness, contrast = 1.3, 1.15
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        pixels = np.asarray(image)
+        smoothed = np.asarray(image.filter(ImageFilter.SMOOTH))
+        mean_grey = int(np.asarray(image.convert('L')).mean() + 0.5)
+        enhanced = cv2.addWeighted(pixels, contrast * sharpness,
+                                   smoothed, contrast * (1 - sharpness),
+                                   (1 - contrast) * mean_grey)
+        image = Image.fromarray(enhanced)
 
         # Noise reduction (MedianFilter requires odd size and minimum dimensions)
         if image.size[0] >= 3 and image.size[1] >= 3:
@@ -181,8 +527,8 @@ class HighResImagePreprocessor:
             return image
 
         try:
-            cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-            gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
+            # Canny/Hough only need grayscale - skip the full-size BGR copy
+            gray = np.asarray(image.convert('L'))
         except Exception as e:
             print(f"[WARNING] Error in image conversion for skew correction: {e}")
             return image
@@ -206,11 +552,14 @@ class HighResImagePreprocessor:
 
                     if abs(skew_angle) > 0.5:
                         print(f"[FIX] Correcting skew: {skew_angle:.2f}°")
+                        # Only materialize the colour array when we actually rotate
+                        cv_image = np.asarray(image)
                         center = tuple(np.array(cv_image.shape[1::-1]) / 2)
                         rot_matrix = cv2.getRotationMatrix2D(center, skew_angle, 1.0)
                         cv_image = cv2.warpAffine(cv_image, rot_matrix, cv_image.shape[1::-1])
+                        return Image.fromarray(cv_image)
 
-            return Image.fromarray(cv2.cvtColor(cv_image, cv2.COLOR_BGR2RGB))
+            return image
 
         except Exception as e:
             print(f"[WARNING] Error in skew correction: {e}")
@@ -253,42 +602,33 @@ class HighResImagePreprocessor:
 
         return Image.fromarray(cv2.cvtColor(cv_image, cv2.COLOR_BGR2RGB))
 
-    def _optimize_for_upload(self, image: Image.Image, output_path: str) -> None:
-        """Optimize image for upload while maintaining quality"""
-
-        # Try different quality levels
-        for quality in [95, 90, 85, 80, 75]:
-            temp_path = f"temp_{quality}_{output_path}"
-            image.save(temp_path, "PNG", optimize=True, quality=quality, dpi=(600, 600))
+    def _optimize_for_upload(self, image: Image.Image) -> bytes:
+        """Encode image in upload_format while maintaining quality"""
+        buffer = io.BytesIO()
+        image.save(buffer, self.upload_format, **self.UPLOAD_ENCODINGS[self.upload_format][1])
+        data = buffer.getvalue()
 
-            file_size_mb = os.path.getsize(temp_path) / (1024 * 1024)
-
-            if file_size_mb <= self.max_file_size_mb:
-                os.rename(temp_path, output_path)
-                return
-            else:
-                os.unlink(temp_path)
-
-        # If still too large, use basic compression
-        image.save(output_path, "PNG", optimize=True, dpi=(600, 600))
+        if len(data) > self.max_file_size_mb * 1024 * 1024:
+            print(f"[WARNING] Encoded image exceeds {self.max_file_size_mb}MB: {len(data) / (1024 * 1024):.1f}MB")
+        return data
 
 class OptimizedFileManager:
     """File upload manager for both Claude and Gemini APIs - Vision images only"""
 
-    def __init__(self, api_key: str, provider: str = 'anthropic', model_config_name: str = 'claude_sonnet'):
+    def __init__(self, api_key: str, provider: str = 'anthropic', model_config_name: str = 'claude_sonnet',
+                 services: ServiceScope = None):
         self.provider = provider
         self.model_config_name = model_config_name
+        # File IDs keyed by image path, or by (pdf_blake2b, page_num, kind) for content-addressed entries
         self.uploaded_files = {}
 
         if provider == 'google':
             # Initialize Gemini service
-            from services.gemini_service import GeminiService
             from model_configs import GOOGLE_API_KEY
-            self.ai_service = GeminiService(GOOGLE_API_KEY, model_config_name)
+            self.ai_service = shared_gemini_service(GOOGLE_API_KEY, model_config_name, services)
         else:
             # Initialize Claude service
-            from services.claude_service import ClaudeService
-            self.ai_service = ClaudeService(api_key, model_config_name)
+            self.ai_service = shared_claude_service(api_key, model_config_name, services)
 
     # Removed upload_original_pdf method - PDF uploads to Claude were unnecessary
     # Pipeline now uses only vision images for validation, saving significant tokens
@@ -302,26 +642,40 @@ class OptimizedFileManager:
             print(f"[OK] Using cached image file ID: {cached_file_id}")
             return cached_file_id
 
-        provider_name = "Gemini" if self.provider == 'google' else "Claude"
-        print(f"[UPLOAD] Uploading image to Gemini Files API...")
+        with open(image_path, 'rb') as f:
+            file_id = self.upload_image_bytes(f.read())
+        self.uploaded_files[image_path] = file_id
+        return file_id
 
-        # Add small delay to help with rate limiting
-        time.sleep(2)  # 2 second delay before upload
+    def upload_image_bytes(self, data: bytes, mime_type: str = "image/png") -> str:
+        """Upload an in-memory encoded image to AI service (Claude or Gemini)"""
 
-        try:
-            # Use unified AI service upload method
-            upload_result = self.ai_service.upload_image(image_path)
+        # Same bytes uploaded before (by any pipeline instance): reuse that file
+        index_key = upload_key(self.provider, self.ai_service.api_key, data)
+        cached_file_id = lookup_upload(index_key)
+        if cached_file_id:
+            print(f"[OK] Using previously uploaded image: {cached_file_id}")
+            return cached_file_id
 
-            if upload_result['success']:
-                file_size_mb = os.path.getsize(image_path) / (1024 * 1024)
-                file_id = upload_result['file_id']
-                print(f"[OK] Upload complete: {file_size_mb:.1f}MB, File ID: {file_id}")
+        provider_name = "Gemini" if self.provider == 'google' else "Claude"
+        print(f"[UPLOAD] Uploading image to {provider_name} Files API...")
 
-                # Cache the file ID
-                self.uploaded_files[image_path] = file_id
-                return file_id
-            else:
-                raise Exception(upload_result.get('error', 'Upload failed'))
+        try:
+            # Shared per-provider limiter instead of a fixed delay before every upload;
+            # it backs off only when the provider actually throttles
+            with limiter_for(self.provider).slot():
+                # Use unified AI service upload method
+                upload_result = self.ai_service.upload_image_bytes(data, mime_type)
+                if not upload_result['success']:
+                    raise Exception(upload_result.get('error', 'Upload failed'))
+
+            file_size_mb = len(data) / (1024 * 1024)
+            file_id = upload_result['file_id']
+            print(f"[OK] Upload complete: {file_size_mb:.1f}MB, File ID: {file_id}")
+
+            # Cache the file ID
+            record_upload(index_key, file_id)
+            return file_id
 
         except Exception as e:
             print(f"ERROR: {provider_name} Files API upload failed: {str(e)}")
@@ -378,11 +732,10 @@ class OptimizedFileManager:
             if self.provider == 'google':
                 # Use Gemini service delete method
                 result = self.ai_service.delete_file(file_id)
-                return result['success']
             else:
                 # Use Claude service delete method
                 result = self.ai_service.delete_file(file_id)
-                return result['success']
+            return result['success']
         except Exception as e:
             print(f"ERROR: Failed to delete file {file_id}: {str(e)}")
             return False
@@ -414,7 +767,7 @@ class OptimizedFileManager:
 class ValidationCorrectionEngine:
     """Combined validation and correction engine with Claude and Claude support"""
 
-    def __init__(self, api_key: str, model_config_name: str = 'claude_sonnet'):
+    def __init__(self, api_key: str, model_config_name: str = 'claude_sonnet', services: ServiceScope = None):
         from model_configs import get_provider
 
         self.config_name = model_config_name
@@ -425,11 +778,10 @@ class ValidationCorrectionEngine:
             gemini_api_key = os.environ.get('GOOGLE_API_KEY')
             if not gemini_api_key:
                 raise ValueError("GOOGLE_API_KEY environment variable is required for Gemini")
-            self.ai_service = GeminiService(gemini_api_key, model_config_name)
+            self.ai_service = shared_gemini_service(gemini_api_key, model_config_name, services)
         else:
             # Initialize Claude service (default)
-            from anthropic import Anthropic
-            self.client = Anthropic(api_key=api_key or os.environ.get('ANTHROPIC_API_KEY'))
+            self.client = shared_anthropic_client(api_key or os.environ.get('ANTHROPIC_API_KEY'))
             self.model_client_manager = ModelClientManager(
                 anthropic_api_key=api_key or os.environ.get('ANTHROPIC_API_KEY'),
                 config_name=model_config_name
@@ -438,12 +790,21 @@ class ValidationCorrectionEngine:
         self.max_rounds = 10
         self.target_accuracy = 1.0
 
+        # Set by the owning pipeline when debug output is enabled
+        self.debug_logger = None
+
+        # ((schema,), serialized schema) from the last prompt build; rounds reuse the same schema
+        self._schema_json = None
+
         # Set model config for validation
         from model_configs import get_model_for_task
         self.model_config = {
             'vision_model': get_model_for_task('vision_validation', model_config_name)
         }
 
+        # Reusable lazy JSON parser for validation envelopes (optional dependency)
+        self._simd_parser = cysimdjson.JSONParser() if cysimdjson else None
+
     def _clean_json_response(self, response_text: str) -> str:
         """Clean JSON response using the same method as schema_text_extractor"""
 
@@ -462,7 +823,7 @@ class ValidationCorrectionEngine:
 
         # Clean common issues - same as schema_text_extractor
         # Remove trailing commas
-        json_part = re.sub(r',(\s*[}\]])', r'\1', json_part)
+        json_part = _TRAILING_COMMA_RE.sub(r'\1', json_part)
 
         # Fix unescaped quotes in string values
         lines = json_part.split('\n')
@@ -675,7 +1036,7 @@ class ValidationCorrectionEngine:
         {json.dumps(current_data, indent=2)}
 
         REQUIRED SCHEMA:
-        {json.dumps(schema, indent=2)}
+        {serialized_schema(self, schema)}
 
         {history_context}
 
@@ -755,13 +1116,13 @@ class ValidationCorrectionEngine:
 
             # Use the same JSON cleaning approach as schema_text_extractor
             cleaned_json = self._clean_json_response(content)
-            result = json.loads(cleaned_json)
+            result = self._load_validation_envelope(cleaned_json)
 
-            # Validate structure
-            required_fields = ["validation_status", "accuracy_estimate", "corrections_made"]
-            for field in required_fields:
-                if field not in result:
-                    raise ValueError(f"Missing required field: {field}")
+            # Validate structure in one pass with a bound lookup
+            get = result.get
+            missing = next((field for field in _REQUIRED_FIELDS if get(field, _MISSING) is _MISSING), None)
+            if missing:
+                raise ValueError(f"Missing required field: {missing}")
 
             # Handle corrected data
             if result["corrections_made"]:
@@ -784,45 +1145,92 @@ class ValidationCorrectionEngine:
                 "accuracy_estimate": 0.5
             }
 
+    def _load_validation_envelope(self, cleaned_json: str) -> dict:
+        """Parse a validation response, only materializing corrected_data when corrections were made"""
+
+        if self._simd_parser is None:
+            return _json_loads(cleaned_json)
+
+        try:
+            doc = self._simd_parser.parse(cleaned_json.encode('utf-8'))
+        except ValueError:
+            return _json_loads(cleaned_json)
+
+        if not isinstance(doc, cysimdjson.JSONObject):
+            return _json_loads(cleaned_json)
+
+        result = {}
+        for key in doc.keys():
+            if key == "corrected_data":
+                continue
+            value = doc[key]
+            result[key] = value.export() if hasattr(value, 'export') else value
+
+        if result.get("corrections_made") and "corrected_data" in doc:
+            corrected_data = doc["corrected_data"]
+            result["corrected_data"] = corrected_data.export() if hasattr(corrected_data, 'export') else corrected_data
+
+        return result
+
     def _compile_validation_results(self, round_results: list, final_data: dict,
                                   correction_history: list) -> dict:
         """Compile final validation results"""
 
+        # Single pass over the rounds collects everything the summary needs.
+        # Rounds whose corrected_data is the final_data object itself drop it from
+        # round_details so the full document is stored (and serialized) only once.
+        rounds_needed = 0
+        corrections_per_round = []
+        accuracy_progression = []
+        final_round = None
+        round_details = []
+        # Bound appends keep attribute lookups out of the loop body
+        add_corrections = corrections_per_round.append
+        add_accuracy = accuracy_progression.append
+        add_detail = round_details.append
+        for r in round_results:
+            get = r.get
+            if r["success"]:
+                rounds_needed += 1
+                add_corrections(len(get("corrections_applied", ())))
+                add_accuracy(get("accuracy_estimate", 0))
+                final_round = r
+            if get("corrected_data") is final_data:
+                r = {k: v for k, v in r.items() if k != "corrected_data"}
+            add_detail(r)
+
         # DEBUG: Save final compilation input
         if self.debug_logger:
             compilation_input = {
-                "round_results": round_results,
+                "round_results": round_details,
                 "final_data": final_data,
                 "correction_history": correction_history,
                 "timestamp": time.time()
             }
             self.debug_logger.save_step("10_final_compilation_input", compilation_input, "json")
 
-        successful_rounds = [r for r in round_results if r["success"]]
-
-        if not successful_rounds:
+        if final_round is None:
             return {
                 "success": False,
                 "error": "No successful validation rounds",
                 "final_data": final_data
             }
 
-        final_round = successful_rounds[-1]
         total_corrections = len(correction_history)
 
         final_results = {
             "success": True,
             "final_data": final_data,
-            "validation_rounds_completed": len(successful_rounds),
+            "validation_rounds_completed": rounds_needed,
             "total_corrections_applied": total_corrections,
             "final_accuracy_estimate": final_round["accuracy_estimate"],
             "target_accuracy_achieved": final_round["accuracy_estimate"] >= self.target_accuracy,
-            "round_details": round_results,
+            "round_details": round_details,
             "correction_history": correction_history,
             "validation_summary": {
-                "rounds_needed": len(successful_rounds),
-                "corrections_per_round": [len(r.get("corrections_applied", [])) for r in successful_rounds],
-                "accuracy_progression": [r.get("accuracy_estimate", 0) for r in successful_rounds]
+                "rounds_needed": rounds_needed,
+                "corrections_per_round": corrections_per_round,
+                "accuracy_progression": accuracy_progression
             }
         }
 
@@ -847,29 +1255,80 @@ class AdvancedPDFExtractionPipeline:
             from model_configs import GOOGLE_API_KEY
             if not GOOGLE_API_KEY:
                 raise ValueError("GOOGLE_API_KEY environment variable is required for Gemini")
-            self.ai_service = GeminiService(GOOGLE_API_KEY, model_config_name)
-        else:
-            # For Claude (default)
-            from anthropic import Anthropic
-            self.client = Anthropic(api_key=api_key or os.environ.get('ANTHROPIC_API_KEY'))
-
-        # Always initialize text extractor for both providers
-        self.text_extractor = SchemaTextExtractor(api_key, model_config_name)
-
-        self.preprocessor = HighResImagePreprocessor()
-        # Initialize file manager for both providers
-        self.file_manager = OptimizedFileManager(api_key, self.provider, model_config_name)
-        self.validator_corrector = ValidationCorrectionEngine(api_key, model_config_name)
-        self.enhanced_validator = EnhancedValidationEngine(api_key, model_config_name)
-        self.model_client_manager = ModelClientManager(
-            anthropic_api_key=api_key or os.environ.get('ANTHROPIC_API_KEY'),
-            config_name=model_config_name
-        )
+
+        # Service components are cached properties (see below), built on first use
+        # so a run only pays for the services its path actually touches. They share
+        # LLM service objects through this scope, never with other pipelines
+        self._services = ServiceScope()
+
+        # LRU of raw page text keyed by (pdf_path, mtime, page_num); an edited file gets
+        # a new mtime, so entries stay valid across process_document calls
+        self._text_cache = OrderedDict()
+
+        # Open fitz documents by path, shared by rendering and text extraction and closed
+        # once the last in-flight process_document call returns. MuPDF is not
+        # thread-safe, so all use of these handles goes through _document_lock
+        self._documents = {}
+        self._document_lock = threading.Lock()
+        self._document_users = 0
+        # process_document_pages calls in progress with more than one page
+        self._multi_page_runs = 0
+
+        # LRU of validation responses/results keyed by image + data content hash
+        self._validation_cache = OrderedDict()
+        self._validation_cache_lock = threading.Lock()
 
         # Debug logging
         self.debug_logger = DebugLogger() if enable_debug else None
         self.enable_debug = enable_debug
 
+        # When set (e.g. 0.98), step 4 skips the vision rounds for extractions whose
+        # fill ratio reaches it. Off by default: a complete extraction can still hold
+        # misread values that only the vision check catches
+        self.local_precheck_threshold = None
+
+    @cached_property
+    def ai_service(self):
+        """Gemini service (Google provider)"""
+        from model_configs import GOOGLE_API_KEY
+        return shared_gemini_service(GOOGLE_API_KEY, self.model_config_name, self._services)
+
+    @cached_property
+    def client(self):
+        """Anthropic client (Claude provider)"""
+        return shared_anthropic_client(self.api_key or os.environ.get('ANTHROPIC_API_KEY'))
+
+    @cached_property
+    def text_extractor(self):
+        # Used by both providers
+        return SchemaTextExtractor(self.api_key, self.model_config_name, self._services)
+
+    @cached_property
+    def preprocessor(self):
+        return HighResImagePreprocessor(max_edge=_VISION_MAX_EDGE.get(self.provider))
+
+    @cached_property
+    def file_manager(self):
+        # Used by both providers
+        return OptimizedFileManager(self.api_key, self.provider, self.model_config_name, self._services)
+
+    @cached_property
+    def validator_corrector(self):
+        validator_corrector = ValidationCorrectionEngine(self.api_key, self.model_config_name, self._services)
+        validator_corrector.debug_logger = self.debug_logger
+        return validator_corrector
+
+    @cached_property
+    def enhanced_validator(self):
+        return EnhancedValidationEngine(self.api_key, self.model_config_name)
+
+    @cached_property
+    def model_client_manager(self):
+        return ModelClientManager(
+            anthropic_api_key=self.api_key or os.environ.get('ANTHROPIC_API_KEY'),
+            config_name=self.model_config_name
+        )
+
     def process_document(self, pdf_path: str, schema: dict, page_num: int = 0,
                         max_rounds: int = 10, target_accuracy: float = 1.0,
                         progress_callback=None, selected_file_id: str = None) -> dict:
@@ -891,71 +1350,25 @@ class AdvancedPDFExtractionPipeline:
             }
             self.debug_logger.save_step("00_pipeline_input", pipeline_input, "json")
 
-        result = {
-            "success": False,
-            "pipeline_steps": {},
-            "final_data": None,
-            "workflow_summary": {},
-            "processing_log": []
-        }
+        result = self._new_pipeline_result()
 
-        def log_progress(message):
-            result["processing_log"].append(f"[{time.time() - pipeline_start:.1f}s] {message}")
+        def log_progress(message, logged_at=None):
+            elapsed = (logged_at or time.time()) - pipeline_start
+            result["processing_log"].append(f"[{elapsed:.1f}s] {message}")
             if progress_callback:
                 progress_callback(message)
 
+        # Concurrent calls (process_document_pages) share the open documents
+        with self._document_lock:
+            self._document_users += 1
+
         try:
             log_progress("🚀 Starting advanced PDF extraction pipeline")
 
-            # STEP 1 & 2: Handle file input with optimized image upload for validation
-            if selected_file_id:
-                # Skip preprocessing for selected files
-                log_progress(f"📎 Using selected file ID: {selected_file_id}")
-                step1_result = {
-                    "success": True,
-                    "processed_image_path": None,
-                    "source": "selected_file"
-                }
-                result["pipeline_steps"]["step1_preprocess"] = step1_result
-
-                step2_result = {
-                    "success": True,
-                    "file_id": selected_file_id,
-                    "upload_time": 0,
-                    "source": "selected_file"
-                }
-
-                # Also create and upload high-res image for vision validation
-                log_progress("[UPLOAD] Creating high-res image for token-efficient validation...")
-                vision_image_result = self._create_and_upload_vision_image(pdf_path, page_num, log_progress)
-                step2_result["vision_image_file_id"] = vision_image_result.get("file_id")
-            else:
-                # Preprocess and upload both PDF and high-res image
-                log_progress("[STEP] Step 1: Preprocessing PDF to 600 DPI...")
-                step1_result = self._step1_preprocess(pdf_path, page_num, log_progress)
-                result["pipeline_steps"]["step1_preprocess"] = step1_result
-
-                if not step1_result["success"]:
-                    result["error"] = f"Step 1 failed: {step1_result.get('error')}"
-                    return result
-
-                log_progress("[UPLOAD] Step 2: Uploading vision image for validation (PDF upload removed to save tokens)...")
-                step2_result = self._step2_upload_vision_image_only(pdf_path, page_num, log_progress)
-
-            result["pipeline_steps"]["step2_upload"] = step2_result
-
-            if not step2_result["success"]:
-                result["error"] = f"Step 2 failed: {step2_result.get('error')}"
-                return result
-
-            # STEP 3: Schema-based text extraction using proven SchemaTextExtractor
-            log_progress("📝 Step 3: Schema-based text extraction...")
-            step3_result = self._step3_text_extraction(pdf_path, schema, page_num, log_progress)
-            result["pipeline_steps"]["step3_text_extraction"] = step3_result
-
-            if not step3_result["success"]:
-                result["error"] = f"Step 3 failed: {step3_result.get('error')}"
+            inputs = self._run_input_steps(pdf_path, schema, page_num, selected_file_id, result, log_progress)
+            if inputs is None:
                 return result
+            step2_result, step3_result = inputs
 
             # STEP 4: Token-efficient multi-round vision validation using uploaded image
             log_progress("[VALIDATE] Step 4: Multi-round vision validation with uploaded image...")
@@ -975,73 +1388,397 @@ class AdvancedPDFExtractionPipeline:
                 vision_image_file_id,
                 log_progress
             )
-            result["pipeline_steps"]["step4_validation"] = step4_result
+            return self._finish_pipeline(result, step4_result, pipeline_start, log_progress)
 
-            # DEBUG: Log step4 result contents
-            print(f"\nDEBUG: Step4 Result Contents:")
-            print(f"  step4_result keys: {list(step4_result.keys())}")
-            print(f"  final_accuracy_estimate: {step4_result.get('final_accuracy_estimate')}")
-            print(f"  validation_rounds_completed: {step4_result.get('validation_rounds_completed')}")
-            print(f"  total_corrections_applied: {step4_result.get('total_corrections_applied')}")
+        except Exception as e:
+            log_progress(f"ERROR: Pipeline failed: {str(e)}")
+            result["error"] = str(e)
+            return result
+
+        finally:
+            self._release_documents()
+
+    def _new_pipeline_result(self) -> dict:
+        return {
+            "success": False,
+            "pipeline_steps": {},
+            "final_data": None,
+            "workflow_summary": {},
+            "processing_log": []
+        }
 
-            # Compile final results
-            result["success"] = step4_result["success"]
-            result["final_data"] = step4_result["final_data"]
-            result["workflow_summary"] = self._compile_workflow_summary(result["pipeline_steps"])
+    def _run_input_steps(self, pdf_path: str, schema: dict, page_num: int, selected_file_id: Optional[str],
+                         result: dict, log_progress) -> Optional[Tuple[dict, dict]]:
+        """Steps 1-3 for one page, recorded in result
 
-            # DEBUG: Log workflow summary contents after compilation
-            print(f"\nDEBUG: Compiled Workflow Summary:")
-            print(f"  workflow_summary keys: {list(result['workflow_summary'].keys())}")
-            print(f"  final_accuracy: {result['workflow_summary'].get('final_accuracy')}")
-            print(f"  validation_rounds_completed: {result['workflow_summary'].get('validation_rounds_completed')}")
-            print(f"  total_corrections_applied: {result['workflow_summary'].get('total_corrections_applied')}")
+        Returns (step2_result, step3_result), or None after setting result["error"]
+        when a step failed.
+        """
+        step1_result, rendered = self._run_step1(pdf_path, page_num, selected_file_id, log_progress)
+        result["pipeline_steps"]["step1_preprocess"] = step1_result
 
-            # Cleanup
-            self._cleanup_temp_files(step1_result.get("processed_image_path"))
+        if not step1_result["success"]:
+            result["error"] = f"Step 1 failed: {step1_result.get('error')}"
+            return None
 
-            total_time = time.time() - pipeline_start
-            result["workflow_summary"]["total_processing_time"] = total_time
+        step2_result, step3_result = self._run_upload_and_extraction(
+            pdf_path, schema, page_num, selected_file_id, rendered, log_progress
+        )
+        result["pipeline_steps"]["step2_upload"] = step2_result
 
-            log_progress(f"[OK] Pipeline complete in {total_time:.1f}s")
+        if not step2_result["success"]:
+            result["error"] = f"Step 2 failed: {step2_result.get('error')}"
+            return None
 
-            # DEBUG: Save final pipeline result
-            if self.debug_logger:
-                self.debug_logger.save_step("12_final_pipeline_result", result, "json")
+        result["pipeline_steps"]["step3_text_extraction"] = step3_result
 
-            return result
+        if not step3_result["success"]:
+            result["error"] = f"Step 3 failed: {step3_result.get('error')}"
+            return None
 
-        except Exception as e:
-            log_progress(f"ERROR: Pipeline failed: {str(e)}")
-            result["error"] = str(e)
-            return result
+        return step2_result, step3_result
+
+    def _finish_pipeline(self, result: dict, step4_result: dict, pipeline_start: float, log_progress) -> dict:
+        """Record step 4 in result and compile the workflow summary"""
+        result["pipeline_steps"]["step4_validation"] = step4_result
+
+        # DEBUG: Log step4 result contents
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Step4 result: keys=%s final_accuracy_estimate=%s "
+                "validation_rounds_completed=%s total_corrections_applied=%s",
+                list(step4_result.keys()),
+                step4_result.get('final_accuracy_estimate'),
+                step4_result.get('validation_rounds_completed'),
+                step4_result.get('total_corrections_applied')
+            )
+
+        # Compile final results
+        result["success"] = step4_result["success"]
+        result["final_data"] = step4_result["final_data"]
+        result["workflow_summary"] = self._compile_workflow_summary(result["pipeline_steps"])
+
+        # DEBUG: Log workflow summary contents after compilation
+        if logger.isEnabledFor(logging.DEBUG):
+            workflow_summary = result['workflow_summary']
+            logger.debug(
+                "Compiled workflow summary: keys=%s final_accuracy=%s "
+                "validation_rounds_completed=%s total_corrections_applied=%s",
+                list(workflow_summary.keys()),
+                workflow_summary.get('final_accuracy'),
+                workflow_summary.get('validation_rounds_completed'),
+                workflow_summary.get('total_corrections_applied')
+            )
+
+        total_time = time.time() - pipeline_start
+        result["workflow_summary"]["total_processing_time"] = total_time
+
+        log_progress(f"[OK] Pipeline complete in {total_time:.1f}s")
+
+        # DEBUG: Save final pipeline result
+        if self.debug_logger:
+            self.debug_logger.save_step("12_final_pipeline_result", result, "json")
+
+        return result
+
+    def _open_document(self, pdf_path: str):
+        """Shared fitz.Document for pdf_path; the caller must hold _document_lock"""
+        doc = self._documents.get(pdf_path)
+        if doc is None:
+            doc = self._documents[pdf_path] = fitz.open(pdf_path)
+        return doc
+
+    def _release_documents(self) -> None:
+        """End of one process_document call; the last one out closes the documents"""
+        with self._document_lock:
+            self._document_users -= 1
+            if self._document_users:
+                return
+            for doc in self._documents.values():
+                doc.close()
+            self._documents.clear()
+
+    def process_document_pages(self, pdf_path: str, schema: dict, pages: List[int],
+                               max_rounds: int = 10, target_accuracy: float = 1.0,
+                               progress_callback=None, max_concurrency: int = None,
+                               batch_validation: bool = True) -> List[dict]:
+        """Run the pipeline for several pages of one PDF concurrently
+
+        Library entry point for multi-page runs (the Streamlit app processes one page).
+        Steps 1-3 run for all pages at once, then step 4 validates the pages that got
+        that far. Concurrency defaults to the provider's request limit. Results have
+        process_document's shape and come back in the same order as pages; the PDF is
+        opened once and shared by all pages.
+
+        Pages run on worker threads, but progress_callback is only ever called on the
+        calling thread, with each message prefixed by its page number. With Gemini,
+        batch_validation=False validates each page with its own prompts (concurrently)
+        instead of several pages per prompt.
+        """
+        if max_concurrency is None:
+            max_concurrency = limiter_for(self.provider).max_concurrent
+
+        pipeline_start = time.time()
+        messages = queue.SimpleQueue()
+        results = [self._new_pipeline_result() for _ in pages]
+
+        def page_logger(result: dict, page_num: int):
+            def log_progress(message, logged_at=None):
+                elapsed = (logged_at or time.time()) - pipeline_start
+                result["processing_log"].append(f"[{elapsed:.1f}s] {message}")
+                if progress_callback:
+                    messages.put(f"[Page {page_num + 1}] {message}")
+            return log_progress
+
+        def replay_progress():
+            while not messages.empty():
+                progress_callback(messages.get())
+
+        loggers = [page_logger(result, page_num) for result, page_num in zip(results, pages)]
+
+        def input_steps(index: int):
+            log_progress = loggers[index]
+            try:
+                log_progress("🚀 Starting advanced PDF extraction pipeline")
+                return self._run_input_steps(pdf_path, schema, pages[index], None, results[index], log_progress)
+            except Exception as e:
+                log_progress(f"ERROR: Pipeline failed: {str(e)}")
+                results[index]["error"] = str(e)
+                return None
+
+        with self._document_lock:
+            self._document_users += 1
+            multi_page = len(pages) > 1
+            if multi_page:
+                self._multi_page_runs += 1
+
+        try:
+            inputs = self._map_on_threads(input_steps, range(len(pages)), max_concurrency, replay_progress)
+
+            validated = [index for index, page_inputs in enumerate(inputs) if page_inputs is not None]
+            step4_pages = [{
+                "page_num": pages[index],
+                "extracted_data": inputs[index][1]["extracted_data"],
+                "vision_image_file_id": inputs[index][0].get("vision_image_file_id"),
+                "log_progress": loggers[index]
+            } for index in validated]
+            step4_results = self._step4_pages(
+                pdf_path, step4_pages, schema, max_rounds, target_accuracy, max_concurrency,
+                batch_validation, replay_progress
+            )
+
+            for index, step4_result in zip(validated, step4_results):
+                self._finish_pipeline(results[index], step4_result, pipeline_start, loggers[index])
+        finally:
+            if multi_page:
+                with self._document_lock:
+                    self._multi_page_runs -= 1
+            self._release_documents()
+            if progress_callback:
+                replay_progress()
+
+        return results
+
+    def _step4_pages(self, pdf_path: str, pages: List[dict], schema: dict, max_rounds: int,
+                     target_accuracy: float, max_concurrency: int, batch_validation: bool,
+                     replay_progress) -> List[dict]:
+        """Step 4 for several pages; each entry carries page_num, extracted_data,
+        vision_image_file_id and log_progress. Results are in page order.
+
+        With Gemini, pages are validated together through _gemini_multi_round_validation_batched
+        (one prompt per batch of pages), or with batch_validation=False concurrently through
+        _gemini_multi_round_validation_pages; Claude's visual inspector validates each page on
+        its own worker thread.
+        """
+        if self._validates_with_gemini():
+            return self._step4_pages_gemini(pdf_path, pages, schema, max_rounds, target_accuracy,
+                                            max_concurrency, batch_validation)
+
+        def validate(page: dict) -> dict:
+            page["log_progress"]("[VALIDATE] Step 4: Multi-round vision validation with uploaded image...")
+            return self._step4_token_efficient_validation(
+                pdf_path, page["extracted_data"], schema, page["page_num"], max_rounds, target_accuracy,
+                page["vision_image_file_id"], page["log_progress"]
+            )
 
-    def _step1_preprocess(self, pdf_path: str, page_num: int, log_progress) -> dict:
-        """Step 1: PDF preprocessing"""
+        return self._map_on_threads(validate, pages, max_concurrency, replay_progress)
 
+    def _step4_pages_gemini(self, pdf_path: str, pages: List[dict], schema: dict, max_rounds: int,
+                            target_accuracy: float, max_concurrency: int, batch_validation: bool) -> List[dict]:
+        """Gemini step 4 for several pages: batched prompts, or per-page prompts run concurrently"""
         step_start = time.time()
+        step4_results = [None] * len(pages)
+        to_validate = []
+
+        for index, page in enumerate(pages):
+            log_progress = page["log_progress"]
+            log_progress("[VALIDATE] Step 4: Multi-round vision validation with uploaded image...")
+            shortcut = self._step4_shortcut(page["extracted_data"], page["vision_image_file_id"],
+                                            step_start, log_progress)
+            if shortcut is not None:
+                step4_results[index] = shortcut
+                continue
+
+            result_key = self._step4_cache_key(page["vision_image_file_id"], schema, page["extracted_data"],
+                                               max_rounds, target_accuracy)
+            cached = self._get_cached_validation(result_key)
+            if cached is not None:
+                log_progress("[OK] Reusing validation result for identical image, schema and data")
+                step4_results[index] = self._step4_result(cached, result_key, page["extracted_data"],
+                                                          step_start, log_progress)
+                continue
+
+            log_progress(f"[VALIDATE] Using Gemini-optimized multi-round validation with image file: "
+                         f"{page['vision_image_file_id']}")
+            to_validate.append((index, result_key))
+
+        if to_validate:
+            pending_pages = [pages[index] for index, _ in to_validate]
+            try:
+                if batch_validation:
+                    validation_results = self._gemini_multi_round_validation_batched(
+                        pdf_path, pending_pages, schema, max_rounds, target_accuracy
+                    )
+                else:
+                    validation_results = self._gemini_multi_round_validation_pages(
+                        pdf_path, pending_pages, schema, max_rounds, target_accuracy, max_concurrency
+                    )
+            except Exception as e:
+                validation_results = [{"success": False, "error": str(e)}] * len(to_validate)
+
+            for (index, result_key), validation_result in zip(to_validate, validation_results):
+                page = pages[index]
+                step4_results[index] = self._step4_result(validation_result, result_key, page["extracted_data"],
+                                                          step_start, page["log_progress"])
+
+        return step4_results
+
+    def _map_on_threads(self, function, items, max_concurrency: int, on_wait=None) -> list:
+        """function(item) for every item on up to max_concurrency worker threads
+
+        Results are in item order. on_wait runs on the calling thread while the
+        workers are busy (used to replay progress messages).
+        """
+        items = list(items)
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(items)))) as executor:
+            futures = [executor.submit(function, item) for item in items]
+            pending = set(futures)
+            while pending:
+                _, pending = wait(pending, timeout=0.2)
+                if on_wait:
+                    on_wait()
+            return [future.result() for future in futures]
+
+    def _render_high_res_image(self, pdf_path: str, page_num: int) -> RenderedPage:
+        """pdf_to_high_res_image on the shared document handle
+
+        Only the rasterization holds the document lock; preprocessing runs unlocked.
+        While several pages are being processed it runs in the worker processes;
+        for a single page, shipping the image there and back costs more than it saves.
+        """
+        with self._document_lock:
+            image = self.preprocessor.render_page(self._open_document(pdf_path)[page_num])
+            use_pool = self._multi_page_runs > 0
+
+        if use_pool:
+            # The preprocessor holds only plain settings, so its bound method pickles cleanly
+            try:
+                return _get_cpu_pool().submit(self.preprocessor.preprocess_and_encode, image).result()
+            except Exception as e:
+                print(f"[WARNING] Process pool preprocessing failed, preprocessing in-process: {e}")
+        return self.preprocessor.preprocess_and_encode(image)
+
+    def _run_step1(self, pdf_path: str, page_num: int, selected_file_id: Optional[str],
+                   log_progress) -> Tuple[dict, Optional[RenderedPage]]:
+        """Step 1: render and preprocess the page (nothing to do for a selected file)"""
+        if selected_file_id:
+            # Skip preprocessing for selected files
+            log_progress(f"📎 Using selected file ID: {selected_file_id}")
+            return {"success": True, "source": "selected_file"}, None
+
+        log_progress("[STEP] Step 1: Preprocessing PDF to 600 DPI...")
+        return self._step1_preprocess(pdf_path, page_num, log_progress)
+
+    def _run_upload_and_extraction(self, pdf_path: str, schema: dict, page_num: int,
+                                   selected_file_id: Optional[str], rendered: Optional[RenderedPage],
+                                   log_progress) -> Tuple[dict, dict]:
+        """Steps 2 and 3 side by side: the vision image uploads while the text is extracted
+
+        Only called once step 1 has succeeded. Step 3 is a paid LLM request and is
+        already running when the upload fails, so a failed step 2 still costs one
+        extraction. Step 3 runs on a worker thread; its progress messages are queued
+        and replayed here, because progress callbacks (Streamlit) only work on the
+        calling thread.
+        """
+        step3_progress = []
+
+        def queue_progress(message):
+            step3_progress.append((message, time.time()))
 
         try:
-            processed_image_path = self.preprocessor.pdf_to_high_res_image(pdf_path, page_num)
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                step3_future = executor.submit(self._run_step3, pdf_path, schema, page_num, queue_progress)
+                step2_result = self._run_step2(pdf_path, page_num, selected_file_id, rendered, log_progress)
+                step3_result = step3_future.result()
+        finally:
+            for message, logged_at in step3_progress:
+                log_progress(message, logged_at)
+        return step2_result, step3_result
+
+    def _run_step2(self, pdf_path: str, page_num: int, selected_file_id: Optional[str],
+                   rendered: Optional[RenderedPage], log_progress) -> dict:
+        """Step 2: upload the high-res image used for vision validation"""
+        if selected_file_id:
+            step2_result = {
+                "success": True,
+                "file_id": selected_file_id,
+                "upload_time": 0,
+                "source": "selected_file"
+            }
+
+            # Also create and upload high-res image for vision validation
+            log_progress("[UPLOAD] Creating high-res image for token-efficient validation...")
+            vision_image_result = self._create_and_upload_vision_image(pdf_path, page_num, log_progress)
+            step2_result["vision_image_file_id"] = vision_image_result.get("file_id")
+            return step2_result
+
+        log_progress("[UPLOAD] Step 2: Uploading vision image for validation (PDF upload removed to save tokens)...")
+        return self._step2_upload_vision_image_only(pdf_path, page_num, log_progress, rendered)
 
-            with Image.open(processed_image_path) as img:
-                file_size_mb = os.path.getsize(processed_image_path) / (1024 * 1024)
+    def _run_step3(self, pdf_path: str, schema: dict, page_num: int, log_progress) -> dict:
+        """Step 3: Schema-based text extraction using proven SchemaTextExtractor"""
+        log_progress("📝 Step 3: Schema-based text extraction...")
+        return self._step3_text_extraction(pdf_path, schema, page_num, log_progress)
 
-            log_progress(f"[OK] Preprocessing complete: {img.size}, {file_size_mb:.1f}MB")
+    def _step1_preprocess(self, pdf_path: str, page_num: int, log_progress) -> Tuple[dict, Optional[RenderedPage]]:
+        """Step 1: PDF preprocessing
+
+        Returns the step result and the in-memory rendered page (None on failure).
+        """
+
+        step_start = time.time()
+
+        try:
+            # The preprocessor already knows the final dimensions and file size
+            rendered = self._render_high_res_image(pdf_path, page_num)
+            image_size = rendered.size
+            file_size_mb = rendered.bytes_written / (1024 * 1024)
+
+            log_progress(f"[OK] Preprocessing complete: {image_size}, {file_size_mb:.1f}MB")
 
             return {
                 "success": True,
-                "processed_image_path": processed_image_path,
-                "image_size": img.size,
+                "image_size": image_size,
                 "file_size_mb": file_size_mb,
                 "processing_time": time.time() - step_start
-            }
+            }, rendered
 
         except Exception as e:
             return {
                 "success": False,
                 "error": str(e),
                 "processing_time": time.time() - step_start
-            }
+            }, None
 
     def _step2_upload(self, image_path: str, log_progress) -> dict:
         """Step 2: Upload to Claude"""
@@ -1069,52 +1806,53 @@ class AdvancedPDFExtractionPipeline:
     # Removed _step2_upload_pdf method - PDF upload to Claude was unnecessary
     # Text extraction uses local PyMuPDF, validation uses vision images only
 
-    def _create_and_upload_vision_image(self, pdf_path: str, page_num: int, log_progress) -> dict:
-        """Create high-res image and upload to Claude for token-efficient vision validation"""
+    def _pdf_digest(self, pdf_path: str) -> str:
+        """Content hash of a PDF file, used to key per-page upload caches"""
 
-        import os
-        import hashlib
+        with open(pdf_path, 'rb') as f:
+            try:
+                # Hash straight from the page cache instead of copying the file into memory
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return hashlib.blake2b(mapped, digest_size=16).hexdigest()
+            except ValueError:
+                # Empty files cannot be mapped
+                return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+    def _create_and_upload_vision_image(self, pdf_path: str, page_num: int, log_progress,
+                                        rendered: Optional[RenderedPage] = None) -> dict:
+        """Create high-res image and upload to Claude for token-efficient vision validation
+
+        If rendered is given (already rendered by step 1) it is uploaded as-is.
+        """
 
         step_start = time.time()
 
         try:
-            # Create deterministic cache key for this PDF + page combination
-            pdf_name = os.path.basename(pdf_path)
-            cache_key = f"{pdf_name}_page_{page_num}_vision"
+            # Content-addressed cache key for this PDF + page combination
+            cache_key = (self._pdf_digest(pdf_path), page_num, 'vision')
 
             # Check if we already have this image uploaded
-            for cached_path, file_id in self.file_manager.uploaded_files.items():
-                if cache_key in cached_path:
-                    log_progress(f"[OK] Using cached vision image: {file_id}")
-                    return {
-                        "success": True,
-                        "file_id": file_id,
-                        "upload_time": time.time() - step_start,
-                        "file_type": "vision_image_cached"
-                    }
+            file_id = self.file_manager.uploaded_files.get(cache_key)
+            if file_id:
+                log_progress(f"[OK] Using cached vision image: {file_id}")
+                return {
+                    "success": True,
+                    "file_id": file_id,
+                    "upload_time": time.time() - step_start,
+                    "file_type": "vision_image_cached"
+                }
 
-            # Create high-resolution image
-            image_path = self.preprocessor.pdf_to_high_res_image(pdf_path, page_num)
+            # Create high-resolution image unless step 1 already rendered it
+            if rendered is None:
+                rendered = self._render_high_res_image(pdf_path, page_num)
 
-            # Upload image to Claude Files API
-            vision_file_id = self.file_manager.upload_processed_image(image_path)
+            # Upload the encoded image straight from memory
+            vision_file_id = self.file_manager.upload_image_bytes(rendered.data, rendered.mime_type)
 
             log_progress(f"[OK] Vision image uploaded: {vision_file_id}")
 
-            # Cache with deterministic key instead of temp path
-            self.file_manager.uploaded_files[f"{cache_key}_{image_path}"] = vision_file_id
-
-            # Clean up temporary image with retry logic
-            try:
-                os.unlink(image_path)
-            except PermissionError:
-                # File locked, wait and retry
-                time.sleep(0.5)
-                try:
-                    os.unlink(image_path)
-                except (PermissionError, FileNotFoundError):
-                    # Log warning but don't fail the operation
-                    log_progress(f"[WARNING] Could not delete temp file: {image_path}")
+            # Cache by content hash of the source PDF
+            self.file_manager.uploaded_files[cache_key] = vision_file_id
 
             return {
                 "success": True,
@@ -1130,14 +1868,15 @@ class AdvancedPDFExtractionPipeline:
                 "upload_time": time.time() - step_start
             }
 
-    def _step2_upload_vision_image_only(self, pdf_path: str, page_num: int, log_progress) -> dict:
+    def _step2_upload_vision_image_only(self, pdf_path: str, page_num: int, log_progress,
+                                        rendered: Optional[RenderedPage] = None) -> dict:
         """Upload only high-res image for token-efficient validation (PDF upload removed to save tokens)"""
 
         step_start = time.time()
 
         try:
             # Create and upload high-res image for vision validation only
-            vision_result = self._create_and_upload_vision_image(pdf_path, page_num, log_progress)
+            vision_result = self._create_and_upload_vision_image(pdf_path, page_num, log_progress, rendered)
 
             # Debug: Check vision result
             vision_file_id = vision_result.get("file_id")
@@ -1162,6 +1901,24 @@ class AdvancedPDFExtractionPipeline:
                 "upload_time": time.time() - step_start
             }
 
+    def _get_raw_text(self, pdf_path: str, page_num: int) -> dict:
+        """Extract raw page text once per file version; failures are not cached"""
+        key = (pdf_path, os.path.getmtime(pdf_path), page_num)
+        with self._document_lock:
+            text_result = self._text_cache.get(key)
+            if text_result is not None:
+                self._text_cache.move_to_end(key)
+                return text_result
+
+            text_result = self.text_extractor.extract_raw_text(
+                pdf_path, page_num, doc=self._open_document(pdf_path)
+            )
+            if text_result.get("success"):
+                self._text_cache[key] = text_result
+                if len(self._text_cache) > _TEXT_CACHE_SIZE:
+                    self._text_cache.popitem(last=False)
+        return text_result
+
     def _step3_text_extraction(self, pdf_path: str, schema: dict, page_num: int, log_progress, file_id: str = None) -> dict:
         """Step 3: Text-based extraction - routes to Claude or Claude based on config"""
 
@@ -1193,7 +1950,7 @@ class AdvancedPDFExtractionPipeline:
 
         try:
             # Extract raw text
-            text_result = self.text_extractor.extract_raw_text(pdf_path, page_num)
+            text_result = self._get_raw_text(pdf_path, page_num)
 
             if not text_result["success"]:
                 return text_result
@@ -1227,7 +1984,7 @@ class AdvancedPDFExtractionPipeline:
         try:
             # Extract raw text from PDF first
             log_progress("[STEP] Extracting text from PDF...")
-            text_result = self.text_extractor.extract_raw_text(pdf_path, page_num)
+            text_result = self._get_raw_text(pdf_path, page_num)
 
             if not text_result["success"]:
                 return {
@@ -1269,9 +2026,13 @@ class AdvancedPDFExtractionPipeline:
                 # If the data is already a dict (successfully parsed), validate it
                 if isinstance(extracted_data, dict):
                     try:
-                        # Validate JSON structure
-                        json_str = json.dumps(extracted_data)
-                        validated_data = json.loads(json_str)
+                        # Validate JSON structure - a single serialize pass raises TypeError
+                        # on unserializable values, so the parsed dict can be reused as-is
+                        if orjson is not None:
+                            orjson.dumps(extracted_data, option=orjson.OPT_NON_STR_KEYS)
+                        else:
+                            json.dumps(extracted_data)
+                        validated_data = extracted_data
 
                         # DEBUG: Save validated data
                         if self.debug_logger:
@@ -1302,7 +2063,7 @@ class AdvancedPDFExtractionPipeline:
                         if isinstance(extracted_data, str):
                             # Clean and parse the JSON string
                             cleaned_json = self.text_extractor._clean_json_response(extracted_data)
-                            validated_data = json.loads(cleaned_json)
+                            validated_data = _json_loads(cleaned_json)
 
                             log_progress("[OK] Claude text-based extraction complete")
 
@@ -1351,7 +2112,7 @@ class AdvancedPDFExtractionPipeline:
 
         try:
             # Use SchemaTextExtractor's extract_with_schema_from_text method
-            text_result = self.text_extractor.extract_raw_text(pdf_path, page_num)
+            text_result = self._get_raw_text(pdf_path, page_num)
 
             if not text_result["success"]:
                 return {
@@ -1399,27 +2160,22 @@ class AdvancedPDFExtractionPipeline:
             # Debug: Log what file_id we received
             log_progress(f"DEBUG: Received vision_image_file_id: {vision_image_file_id}")
 
-            if not vision_image_file_id:
-                log_progress("[WARNING] No vision image uploaded, using standard validation...")
-                # Fallback to basic validation if no image
-                return {
-                    "success": True,
-                    "final_data": extracted_data,
-                    "validation_rounds_completed": 0,
-                    "final_accuracy_estimate": 0.85,
-                    "total_corrections_applied": 0,
-                    "validation_time": time.time() - step_start,
-                    "token_efficient": False,
-                    # Keep old names for backward compatibility
-                    "validation_rounds": 0,
-                    "accuracy_estimate": 0.85,
-                    "corrections_applied": 0
-                }
+            shortcut = self._step4_shortcut(extracted_data, vision_image_file_id, step_start, log_progress)
+            if shortcut is not None:
+                return shortcut
 
             log_progress(f"[VALIDATE] Using token-efficient validation with image file: {vision_image_file_id}")
 
+            # The whole multi-round outcome is memoized too: an identical image, schema and
+            # data (e.g. the same page re-run in this session) skips every vision call
+            result_key = self._step4_cache_key(vision_image_file_id, schema, extracted_data,
+                                               max_rounds, target_accuracy)
+            validation_result = self._get_cached_validation(result_key)
+
+            if validation_result is not None:
+                log_progress("[OK] Reusing validation result for identical image, schema and data")
             # Use provider-specific validation logic
-            if hasattr(self.text_extractor, 'provider') and self.text_extractor.provider == 'google':
+            elif self._validates_with_gemini():
                 # Use Gemini's multi-round validation with simple prompts
                 log_progress(f"[VALIDATE] Using Gemini-optimized multi-round validation")
 
@@ -1437,54 +2193,140 @@ class AdvancedPDFExtractionPipeline:
                     vision_image_file_id, page_file_ids
                 )
 
-            # DEBUG: Log validation_result contents
-            print(f"\nDEBUG: Validation Result from multi_round_visual_validation:")
-            print(f"  validation_result keys: {list(validation_result.keys())}")
-            print(f"  rounds_performed: {validation_result.get('rounds_performed')}")
-            print(f"  validation_rounds_completed: {validation_result.get('validation_rounds_completed')}")
-            print(f"  accuracy_estimate: {validation_result.get('accuracy_estimate')}")
-            print(f"  final_accuracy_estimate: {validation_result.get('final_accuracy_estimate')}")
-            print(f"  total_corrections: {validation_result.get('total_corrections')}")
-            print(f"  total_corrections_applied: {validation_result.get('total_corrections_applied')}")
+            return self._step4_result(validation_result, result_key, extracted_data, step_start, log_progress)
 
-            if validation_result["success"]:
-                # Use the correct field names from the multi_round_visual_validation result
-                rounds_completed = validation_result.get("validation_rounds_completed", 0)
-                final_accuracy = validation_result.get("final_accuracy_estimate", 0.9)
-                total_corrections = validation_result.get("total_corrections_applied", 0)
+        except Exception as e:
+            log_progress(f"ERROR: Token-efficient validation failed: {str(e)}")
+            return {
+                "success": False,
+                "error": f"Token-efficient validation failed: {str(e)}",
+                "final_data": extracted_data,
+                "validation_time": time.time() - step_start
+            }
+
+    def _validates_with_gemini(self) -> bool:
+        return hasattr(self.text_extractor, 'provider') and self.text_extractor.provider == 'google'
 
-                log_progress(f"[OK] Token-efficient validation complete: {final_accuracy:.0%} accuracy")
+    def _step4_cache_key(self, vision_image_file_id: str, schema: dict, extracted_data: dict,
+                         max_rounds: int, target_accuracy: float) -> str:
+        return self._validation_cache_key(
+            vision_image_file_id, ("step4", schema, extracted_data, max_rounds, target_accuracy)
+        )
+
+    def _step4_shortcut(self, extracted_data: dict, vision_image_file_id: str, step_start: float,
+                        log_progress) -> Optional[dict]:
+        """Step 4 result when no vision rounds are needed (or possible), else None"""
+        if not vision_image_file_id:
+            log_progress("[WARNING] No vision image uploaded, using standard validation...")
+            # Fallback to basic validation if no image
+            return {
+                "success": True,
+                "final_data": extracted_data,
+                "validation_rounds_completed": 0,
+                "final_accuracy_estimate": 0.85,
+                "total_corrections_applied": 0,
+                "validation_time": time.time() - step_start,
+                "token_efficient": False,
+                # Keep old names for backward compatibility
+                "validation_rounds": 0,
+                "accuracy_estimate": 0.85,
+                "corrections_applied": 0
+            }
 
+        if not extracted_data:
+            # Nothing was extracted, so there are no values for the vision rounds to check
+            log_progress("[OK] No extracted fields to validate, skipping vision rounds")
+            return {
+                "success": True,
+                "final_data": extracted_data,
+                "validation_rounds_completed": 0,
+                "final_accuracy_estimate": 1.0,
+                "total_corrections_applied": 0,
+                "validation_time": time.time() - step_start,
+                "token_efficient": True,
+                # Keep old names for backward compatibility
+                "validation_rounds": 0,
+                "accuracy_estimate": 1.0,
+                "corrections_applied": 0
+            }
+
+        if self.local_precheck_threshold is not None:
+            fill_ratio = _fill_ratio(extracted_data)
+            if fill_ratio >= self.local_precheck_threshold:
+                log_progress(f"[OK] Local pre-check passed ({fill_ratio:.0%} filled), skipping vision rounds")
                 return {
                     "success": True,
-                    "final_data": validation_result["extracted_data"],
-                    "validation_rounds_completed": rounds_completed,
-                    "final_accuracy_estimate": final_accuracy,
-                    "total_corrections_applied": total_corrections,
+                    "final_data": extracted_data,
+                    "validation_rounds_completed": 0,
+                    "final_accuracy_estimate": fill_ratio,
+                    "total_corrections_applied": 0,
                     "validation_time": time.time() - step_start,
                     "token_efficient": True,
+                    "validation_history": [{"round": 0, "method": "local",
+                                            "accuracy_estimate": fill_ratio,
+                                            "validation_passed": True}],
                     # Keep old names for backward compatibility
-                    "validation_rounds": rounds_completed,
-                    "accuracy_estimate": final_accuracy,
-                    "corrections_applied": total_corrections
-                }
-            else:
-                return {
-                    "success": False,
-                    "error": f"Token-efficient validation failed: {validation_result.get('error')}",
-                    "final_data": extracted_data,
-                    "validation_time": time.time() - step_start
+                    "validation_rounds": 0,
+                    "accuracy_estimate": fill_ratio,
+                    "corrections_applied": 0
                 }
 
-        except Exception as e:
-            log_progress(f"ERROR: Token-efficient validation failed: {str(e)}")
+        return None
+
+    def _step4_result(self, validation_result: dict, result_key: str, extracted_data: dict,
+                      step_start: float, log_progress) -> dict:
+        """Step 4 result from a multi-round validation result (Gemini loop or visual inspector)"""
+
+        # DEBUG: Log validation_result contents
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Validation result: keys=%s rounds_performed=%s validation_rounds_completed=%s "
+                "accuracy_estimate=%s final_accuracy_estimate=%s total_corrections=%s "
+                "total_corrections_applied=%s",
+                list(validation_result.keys()),
+                validation_result.get('rounds_performed'),
+                validation_result.get('validation_rounds_completed'),
+                validation_result.get('accuracy_estimate'),
+                validation_result.get('final_accuracy_estimate'),
+                validation_result.get('total_corrections'),
+                validation_result.get('total_corrections_applied')
+            )
+
+        if not validation_result["success"]:
             return {
                 "success": False,
-                "error": f"Token-efficient validation failed: {str(e)}",
+                "error": f"Token-efficient validation failed: {validation_result.get('error')}",
                 "final_data": extracted_data,
                 "validation_time": time.time() - step_start
             }
 
+        self._cache_validation(result_key, validation_result)
+
+        # Use the correct field names from the multi_round_visual_validation result
+        # (the Gemini loop reports its count as total_corrections)
+        get = validation_result.get
+        rounds_completed, final_accuracy, total_corrections = (
+            get("validation_rounds_completed", 0),
+            get("final_accuracy_estimate", 0.9),
+            get("total_corrections_applied", get("total_corrections", 0))
+        )
+
+        log_progress(f"[OK] Token-efficient validation complete: {final_accuracy:.0%} accuracy")
+
+        return {
+            "success": True,
+            "final_data": validation_result["extracted_data"],
+            "validation_rounds_completed": rounds_completed,
+            "final_accuracy_estimate": final_accuracy,
+            "total_corrections_applied": total_corrections,
+            "validation_time": time.time() - step_start,
+            "token_efficient": True,
+            # Keep old names for backward compatibility
+            "validation_rounds": rounds_completed,
+            "accuracy_estimate": final_accuracy,
+            "corrections_applied": total_corrections
+        }
+
     def _step4_enhanced_validate_correct(self, file_id: str, extracted_data: dict, schema: dict,
                                         max_rounds: int, target_accuracy: float, log_progress) -> dict:
         """Step 4: Enhanced validation and correction with specialized fixes"""
@@ -1532,119 +2374,95 @@ class AdvancedPDFExtractionPipeline:
                                      page_num: int, max_rounds: int, target_accuracy: float,
                                      vision_image_file_id: str = None) -> dict:
         """Multi-round validation for Gemini using simple prompts"""
-        import json
-        import time
 
         validation_history = []
         rounds_performed = 0
-        current_data = extracted_data.copy()
+        # Rounds replace current_data wholesale and never mutate it, so the caller's
+        # dict can be shared rather than copied
+        current_data = extracted_data
         final_accuracy = 0.85  # Default starting accuracy
         total_corrections = 0
+        # Consecutive rounds that reported the same number of issues as the round before
+        no_progress_rounds = 0
+        previous_issue_count = None
+        # Previous round listed issues without patches; the next round must ask the model again
+        missing_corrections = False
 
         for round_num in range(1, max_rounds + 1):
             rounds_performed = round_num
 
-            # Build simple validation prompt
-            schema_str = json.dumps(schema, indent=2)
-            data_str = json.dumps(current_data, indent=2)
-            prompt = f"""
-You are a data validation specialist. Compare the extracted data against the actual PDF image to verify accuracy.
-
-ROUND {round_num} of {max_rounds} - VALIDATION WITH CORRECTIONS:
-
-EXTRACTED DATA:
-{data_str}
-
-CRITICAL VALIDATION RULES:
-
-1. **TEXT TRUNCATION HANDLING - CRITICAL RULE:**
-   - **ALWAYS PRESERVE the longer extracted text over shorter visual text**
-   - If extracted data = "Dental Insurance S125" but image shows = "Dental Insurance", KEEP "Dental Insurance S125"
-   - If extracted data = "Minnesota Federal Loan Assessment" but image shows = "Minnesota Federal Lo...", KEEP the full text
-   - **NEVER truncate good extracted data to match visually truncated image text**
-   - Only change if extracted text is completely wrong (different meaning entirely)
-
-0. **DATE FORMAT STANDARDIZATION:**
-   - Convert dates to clean format: "YYYY-MM-DD" (e.g., "2024-12-17")
-   - Remove time components: "2024-12-17T00:00:00" should become "2024-12-17"
-   - Apply to ALL date fields consistently
-
-2. **TABLE ROW COUNT ACCURACY:**
-   - Count EXACTLY how many rows you see in each table in the PDF
-   - Do NOT add extra rows that don't exist in the PDF
-   - Flag if extracted data has more rows than visually present
-
-3. **COLUMN ALIGNMENT VALIDATION:**
-   - For deduction tables: Check if values are in correct columns
-   - Look for shifts: "B5" appearing in CalCode instead of Frequency column
-   - Verify each value is under the correct column header
-
-4. **COMPLETE DATA PRESERVATION:**
-   - In corrected_data, include the ENTIRE JSON structure
-   - Only modify the specific fields that have errors
-   - Keep all other data unchanged from the original extraction
-
-INSTRUCTIONS:
-1. **PRESERVE FULL TEXT**: Never shorten extracted text to match truncated visual text
-2. Count table rows precisely - never add rows that don't exist
-3. Check column alignment carefully for deduction information
-4. Clean all date formats to YYYY-MM-DD (remove time components)
-5. Return complete JSON structure in corrected_data (not just the problem section)
-6. Only set accuracy_estimate to 1.0 (100%) if NO issues are found in this round
-7. Return VALIDATION RESULTS in JSON format ONLY - no extra commentary
-Return JSON with this structure:
-{{
-    "validation_passed": true/false,
-    "accuracy_estimate": 0.95,
-    "issues_found": [
-        {{
-            "field": "field_name",
-            "issue": "description of issue",
-            "suggested_correction": "corrected value"
-        }}
-    ],
-    "corrected_data": {{}} // COMPLETE JSON with all fields, only corrections applied
-}}
-"""
-
             # Perform validation round
             if vision_image_file_id:
-                result = self.text_extractor.ai_service.validate_with_vision_file(
-                    vision_image_file_id, prompt
-                )
+                # Same image + same data already validated (earlier round or page): reuse it,
+                # unless that answer is the one that came back without corrections
+                cache_key = self._validation_cache_key(vision_image_file_id, current_data)
+                validation_data = None if missing_corrections else self._get_cached_validation(cache_key)
+
+                if validation_data is None:
+                    # Build simple validation prompt (the schema itself is not part of it)
+                    # Compact JSON: indentation only adds prompt tokens
+                    data_str = _json_dumps(current_data)
+                    # Static prefix first so repeated rounds share a cacheable prompt prefix
+                    prompt = "".join((
+                        _GEMINI_VALIDATION_PROMPT_PREFIX,
+                        f"\nROUND {round_num} of {max_rounds}",
+                        _GEMINI_MISSING_CORRECTIONS_NOTE if missing_corrections else "",
+                        _GEMINI_ROUND_HEADER_TAIL,
+                        data_str,
+                        "\n"
+                    ))
+
+                    # Streamed: a clean pass is cut off before corrected_data is downloaded
+                    result = self.text_extractor.ai_service.validate_with_vision_file(
+                        vision_image_file_id, prompt, stop_when_passed=True
+                    )
+
+                    if not result.get('success'):
+                        break
+
+                    validation_data = result.get('data', {})
+                    self._cache_validation(cache_key, validation_data)
             else:
                 image_data = self.text_extractor.vision_extractor.convert_pdf_to_image(pdf_path, page_num)
                 result = self.text_extractor.ai_service.validate_with_vision(image_data, current_data, schema)
 
-            if not result.get('success'):
-                break
+                if not result.get('success'):
+                    break
 
-            # Extract validation data
-            if vision_image_file_id:
-                validation_data = result.get('data', {})
-            else:
                 validation_data = result.get('validation_result', {})
 
+            final_accuracy = validation_data.get('accuracy_estimate', 0.85)
+            issues_found = validation_data.get('issues_found', [])
+            total_corrections += len(issues_found)
+
+            # History keeps per-round counts; the full issue list is attached for the last round only
             validation_history.append({
                 'round': round_num,
-                'accuracy_estimate': validation_data.get('accuracy_estimate', 0.85),
-                'issues_found': validation_data.get('issues_found', []),
+                'accuracy_estimate': final_accuracy,
+                'issues_count': len(issues_found),
                 'validation_passed': validation_data.get('validation_passed', False)
             })
-
-            final_accuracy = validation_data.get('accuracy_estimate', 0.85)
-            issues_found = validation_data.get('issues_found', [])
-            total_corrections += len(issues_found)
+            last_issues_found = issues_found
 
             # Apply corrections if available
-            corrected_data = validation_data.get('corrected_data')
-            if corrected_data:
-                print(f"[DEBUG] Round {round_num}: Applying corrections to data")
-                print(f"[DEBUG] Corrected data keys: {list(corrected_data.keys()) if isinstance(corrected_data, dict) else 'Not a dict'}")
+            corrected_data = _corrected_data_from(validation_data, current_data)
+            missing_corrections = corrected_data == current_data and bool(issues_found)
+            if corrected_data == current_data and not issues_found:
+                # Model handed the data back unchanged, so another round would only repeat this one
+                logger.debug("Round %d: corrected_data unchanged, stopping", round_num)
+                break
+            elif missing_corrections:
+                # Issues without patches is not convergence; re-prompt (the plateau check below bounds this)
+                logger.debug("Round %d: %d issues but no corrections, re-prompting", round_num, len(issues_found))
+            elif corrected_data:
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Round %d: applying corrections to data, keys=%s", round_num,
+                                 list(corrected_data.keys()) if isinstance(corrected_data, dict) else 'Not a dict')
                 current_data = corrected_data
             else:
-                print(f"[DEBUG] Round {round_num}: No corrected_data found in validation response")
-                print(f"[DEBUG] validation_data keys: {list(validation_data.keys()) if isinstance(validation_data, dict) else 'Not a dict'}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Round %d: no corrected_data in validation response, keys=%s", round_num,
+                                 list(validation_data.keys()) if isinstance(validation_data, dict) else 'Not a dict')
 
             # Only stop if no issues found (true 100% accuracy)
             if not issues_found and validation_data.get('validation_passed', False):
@@ -1654,6 +2472,25 @@ Return JSON with this structure:
             if final_accuracy >= target_accuracy and not issues_found:
                 break
 
+            # Stop once the issue count has plateaued for two rounds in a row
+            issue_count = len(issues_found)
+            no_progress_rounds = no_progress_rounds + 1 if issue_count == previous_issue_count else 0
+            previous_issue_count = issue_count
+            if no_progress_rounds >= 2:
+                logger.debug("Round %d: issue count stuck at %d, stopping", round_num, issue_count)
+                break
+
+            # Accuracy has plateaued at a good level: further rounds are unlikely to pay off
+            if len(validation_history) >= 2 and final_accuracy >= 0.9:
+                accuracy_gain = final_accuracy - validation_history[-2]['accuracy_estimate']
+                if accuracy_gain < 0.005:
+                    logger.debug("Round %d: accuracy gain %.3f below threshold, adaptive stop",
+                                 round_num, accuracy_gain)
+                    break
+
+        if validation_history:
+            validation_history[-1]['issues_found'] = last_issues_found
+
         return {
             'success': True,
             'validation_rounds_completed': rounds_performed,
@@ -1666,6 +2503,203 @@ Return JSON with this structure:
             'target_accuracy_reached': final_accuracy >= target_accuracy
         }
 
+    def _validation_cache_key(self, file_id: str, data) -> str:
+        """Content hash of the image reference plus the data being validated
+
+        Entries for single Gemini rounds and for whole step 4 results share one LRU.
+        """
+        digest = hashlib.blake2b(file_id.encode('utf-8') + b"\0", digest_size=16)
+        digest.update(_json_canonical(data))
+        return digest.hexdigest()
+
+    def _get_cached_validation(self, key: str) -> Optional[dict]:
+        with self._validation_cache_lock:
+            entry = self._validation_cache.get(key)
+            if entry is None:
+                return None
+            stored_at, validation_data = entry
+            if time.monotonic() - stored_at > _VALIDATION_CACHE_TTL:
+                del self._validation_cache[key]
+                return None
+            self._validation_cache.move_to_end(key)
+        # Callers annotate and correct the results they get back, so hand out a private copy
+        return copy.deepcopy(validation_data)
+
+    def _cache_validation(self, key: str, validation_data: dict) -> None:
+        # Only deterministic (temperature 0) responses are worth replaying
+        if getattr(self.text_extractor.ai_service, 'temperature', None) != 0:
+            return
+        validation_data = copy.deepcopy(validation_data)
+        with self._validation_cache_lock:
+            self._validation_cache[key] = (time.monotonic(), validation_data)
+            self._validation_cache.move_to_end(key)
+            if len(self._validation_cache) > _VALIDATION_CACHE_SIZE:
+                self._validation_cache.popitem(last=False)
+
+    def _gemini_multi_round_validation_batched(self, pdf_path: str, pages: List[dict], schema: dict,
+                                             max_rounds: int, target_accuracy: float,
+                                             max_batch_pages: int = 8, max_batch_chars: int = 32000) -> List[dict]:
+        """Validate several pages per request so the shared rules block is sent once per batch
+
+        Pages are sealed into batches by page count or serialized data size. Pages
+        without an uploaded vision image fall back to per-page validation. Results are
+        returned in the same order as pages.
+        """
+        results = [None] * len(pages)
+        batches = []
+        batch, batch_chars = [], 0
+
+        for index, page in enumerate(pages):
+            if not page.get("vision_image_file_id"):
+                results[index] = self._gemini_multi_round_validation(
+                    pdf_path, page["extracted_data"], schema, page["page_num"], max_rounds, target_accuracy
+                )
+                continue
+
+            page_chars = len(_json_dumps(page["extracted_data"]))
+            if batch and (len(batch) >= max_batch_pages or batch_chars + page_chars > max_batch_chars):
+                batches.append(batch)
+                batch, batch_chars = [], 0
+            batch.append(index)
+            batch_chars += page_chars
+
+        if batch:
+            batches.append(batch)
+
+        for batch in batches:
+            batch_results = self._validate_page_batch([pages[i] for i in batch], max_rounds, target_accuracy)
+            for index, page_result in zip(batch, batch_results):
+                results[index] = page_result
+
+        return results
+
+    def _validate_page_batch(self, pages: List[dict], max_rounds: int, target_accuracy: float) -> List[dict]:
+        """Run validation rounds for one sealed batch; pages drop out once they pass"""
+
+        states = [{
+            "current_data": page["extracted_data"],
+            "file_id": page["vision_image_file_id"],
+            "validation_history": [],
+            "last_issues_found": [],
+            "rounds_performed": 0,
+            "final_accuracy": 0.85,
+            "total_corrections": 0,
+            "done": False,
+            "error": None
+        } for page in pages]
+
+        for round_num in range(1, max_rounds + 1):
+            pending = [i for i, state in enumerate(states) if not state["done"]]
+            if not pending:
+                break
+
+            sections = "\n".join(
+                f"=== PAGE {i} ===\n{_json_dumps(states[i]['current_data'])}\n" for i in pending
+            )
+            prompt = "".join((
+                _GEMINI_BATCH_PROMPT_PREFIX,
+                f"\nROUND {round_num} of {max_rounds}",
+                _GEMINI_BATCH_ROUND_HEADER_TAIL,
+                sections,
+                "\n"
+            ))
+
+            result = self.text_extractor.ai_service.validate_with_vision_files(
+                [states[i]["file_id"] for i in pending], prompt
+            )
+
+            if not result.get('success'):
+                # Pages with a completed round keep their corrections, as in the single-page
+                # loop; only pages that never got a response are reported as failed
+                for i in pending:
+                    if not states[i]["rounds_performed"]:
+                        states[i]["error"] = result.get('error', 'Batched vision validation failed')
+                break
+
+            page_results = {
+                entry.get('index'): entry
+                for entry in result.get('data', {}).get('pages', [])
+                if isinstance(entry, dict)
+            }
+
+            for i in pending:
+                validation_data = page_results.get(i)
+                if validation_data is None:
+                    # Page missing from the response, retry it next round
+                    continue
+
+                state = states[i]
+                state["rounds_performed"] = round_num
+                issues_found = validation_data.get('issues_found', [])
+                state["final_accuracy"] = validation_data.get('accuracy_estimate', 0.85)
+                state["total_corrections"] += len(issues_found)
+                state["validation_history"].append({
+                    'round': round_num,
+                    'accuracy_estimate': state["final_accuracy"],
+                    'issues_count': len(issues_found),
+                    'validation_passed': validation_data.get('validation_passed', False)
+                })
+                state["last_issues_found"] = issues_found
+
+                corrected_data = _corrected_data_from(validation_data, state["current_data"])
+                if corrected_data:
+                    state["current_data"] = corrected_data
+
+                # Same stopping rules as the single-page loop
+                if not issues_found and (validation_data.get('validation_passed', False)
+                                         or state["final_accuracy"] >= target_accuracy):
+                    state["done"] = True
+
+        results = []
+        for state in states:
+            if state["validation_history"]:
+                state["validation_history"][-1]['issues_found'] = state["last_issues_found"]
+
+            if state["error"] is None and not state["rounds_performed"]:
+                # Every round's response left this page out
+                state["error"] = "Page was missing from every batched validation response"
+            if state["error"] is not None:
+                results.append({
+                    'success': False,
+                    'error': state["error"],
+                    'validation_rounds_completed': state["rounds_performed"],
+                    'rounds_performed': state["rounds_performed"],
+                    'extracted_data': state["current_data"],
+                    'validation_history': state["validation_history"]
+                })
+                continue
+
+            results.append({
+                'success': True,
+                'validation_rounds_completed': state["rounds_performed"],
+                'rounds_performed': state["rounds_performed"],
+                'accuracy_estimate': state["final_accuracy"],
+                'final_accuracy_estimate': state["final_accuracy"],
+                'total_corrections': state["total_corrections"],
+                'extracted_data': state["current_data"],
+                'validation_history': state["validation_history"],
+                'target_accuracy_reached': state["final_accuracy"] >= target_accuracy
+            })
+        return results
+
+    def _gemini_multi_round_validation_pages(self, pdf_path: str, pages: List[dict], schema: dict,
+                                           max_rounds: int, target_accuracy: float,
+                                           max_concurrency: int = 2) -> List[dict]:
+        """Validate several pages concurrently; rounds within a page stay sequential
+
+        Each entry in pages carries page_num, extracted_data and optionally
+        vision_image_file_id. At most max_concurrency pages are in flight, to respect
+        provider rate limits. Results are returned in the same order as pages.
+        """
+        # The Gemini SDK calls are blocking, so each page runs in a worker thread
+        return self._map_on_threads(
+            lambda page: self._gemini_multi_round_validation(
+                pdf_path, page["extracted_data"], schema, page["page_num"],
+                max_rounds, target_accuracy, page.get("vision_image_file_id")
+            ),
+            pages, max_concurrency
+        )
+
     def _step4_validate_correct(self, file_id: str, extracted_data: dict, schema: dict,
                                max_rounds: int, target_accuracy: float, log_progress) -> dict:
         """Step 4: Standard validation and correction (fallback)"""
@@ -1713,13 +2747,3 @@ Return JSON with this structure:
                 "validation": step4.get("total_validation_time", 0)
             }
         }
-
-    def _cleanup_temp_files(self, *file_paths):
-        """Clean up temporary files"""
-
-        for file_path in file_paths:
-            if file_path and os.path.exists(file_path):
-                try:
-                    os.unlink(file_path)
-                except Exception as e:
-                    print(f"Warning: Failed to delete {file_path}: {e}")
\ No newline at end of file
@@ -0,0 +1,61 @@
+"""
+Resumable bulk runs
+Finished results are appended to a JSONL file keyed by a hash of their request, so a
+long extraction run that dies part-way skips the completed pages when it is restarted.
+"""
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+
+class JsonlCheckpoint:
+    """Append-only record of finished results; one {"_key": ..., **result} object per line"""
+
+    def __init__(self, path: str, resume: bool = True, fsync_every: int = 10):
+        self.path = path
+        self.fsync_every = fsync_every
+        self._done = {}
+        torn = False
+        if resume and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    torn = not line.endswith("\n")
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn last line from a killed run; that item is simply redone
+                        continue
+                    self._done[record.pop("_key")] = record
+            print(f"[CHECKPOINT] {len(self._done)} finished results loaded from {path}")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a' if resume else 'w', encoding='utf-8')
+        if torn:
+            # Start new records on a fresh line
+            self._file.write("\n")
+        self._unsynced = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._done.get(key)
+
+    def add(self, key: str, result: Dict[str, Any]) -> None:
+        line = json.dumps({"_key": key, **result}, default=str)
+        with self._lock:
+            self._done[key] = result
+            self._file.write(line + "\n")
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every:
+                self._sync()
+
+    def close(self) -> None:
+        with self._lock:
+            self._sync()
+            self._file.close()
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
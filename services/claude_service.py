@@ -1,153 +1,728 @@
-from anthropic import Anthropic
-import json,os
-from typing import Dict, Any, List
+from anthropic import AsyncAnthropic
+import asyncio
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+from typing import Dict, Any, List, Tuple
 import time
+from concurrent.futures import ThreadPoolExecutor
 from model_configs import get_model_for_task
 from .prompts import PromptTemplates
 from .spatial_preprocessor import SpatialPreprocessor
-from .coordinate_table_extractor import CoordinateTableExtractor
 from .vision_extractor import VisionBasedExtractor
 from .feedback_analyzer import FeedbackAnalyzer
+from .rate_limiter import PROVIDER_LIMITS, is_retryable_error, retry_delay, token_bucket_for
+from .debug_writer import write_debug_file
+from .response_cache import response_cache, response_cache_key, single_flight
+from .semantic_cache import semantic_cache
+from .http_clients import new_async_anthropic_client, shared_anthropic_client
+from .checkpoint import JsonlCheckpoint
+from .upload_index import forget_uploads
+from .fast_json import dumps_indent as _json_dumps_indent, identity_memo, loads as _json_loads
+
+# Streamed replies that run this many characters without opening a JSON object are cut off
+_MAX_PROSE_BEFORE_JSON = 4000
+
+# Requests the Message Batches API accepts in one batch
+_MAX_BATCH_REQUESTS = 100000
+
+# Parallel DELETE calls when clearing the Files API; each one is a round trip on the pooled client
+_DELETE_WORKERS = 16
+
+# Templates are class attributes and never modified, so every service shares one instance
+_PROMPTS = PromptTemplates()
+
+
+# Forced tool call for unified extraction: the reply arrives as already-parsed tool input
+# in the shape the extraction prompts describe, so no JSON has to be recovered from text.
+# Field names are document-specific, so form_data and rows stay open objects
+_UNIFIED_EXTRACTION_TOOL = {
+    "name": "record_extraction",
+    "description": "Record the data extracted from the document.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "form_data": {
+                "type": "object",
+                "description": "Form field name -> exact extracted value, or null"
+            },
+            "table_data": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "table_name": {"type": "string"},
+                        "headers": {"type": "array", "items": {"type": "string"}},
+                        "rows": {"type": "array", "items": {"type": "object"}}
+                    },
+                    "required": ["table_name", "headers", "rows"]
+                }
+            },
+            "extraction_summary": {"type": "object"}
+        },
+        "required": ["form_data", "table_data"]
+    }
+}
+
+
+class _JsonObjectScanner:
+    """Finds where the first top-level JSON object closes in text fed piece by piece
+
+    Braces inside strings are skipped. feed() returns the index one past the closing
+    brace, counted over everything fed so far, once the object is complete.
+    """
+
+    def __init__(self):
+        self.start = None
+        self._offset = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    @property
+    def consumed(self) -> int:
+        """Characters fed so far"""
+        return self._offset
+
+    def feed(self, chunk: str):
+        offset = self._offset
+        self._offset += len(chunk)
+        i = 0
+        if self.start is None:
+            i = chunk.find('{')
+            if i == -1:
+                return None
+            self.start = offset + i
+        for i in range(i, len(chunk)):
+            char = chunk[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    return offset + i + 1
+        return None
+
+
+def _outer_json_object(content: str):
+    """Slice from the first '{' to the brace that closes it, skipping braces inside strings
+
+    A linear scan instead of a greedy regex, which backtracks badly on long responses.
+    Unbalanced (e.g. truncated) output falls back to the span up to the last '}', or
+    None when there is no object at all.
+    """
+    scanner = _JsonObjectScanner()
+    end = scanner.feed(content)
+    if end is not None:
+        return content[scanner.start:end]
+    if scanner.start is None:
+        return None
+    end = content.rfind('}')
+    return content[scanner.start:end + 1] if end > scanner.start else None
+
+
+def _fenced_json_object(content: str):
+    """The balanced object opening the first ```/```json code fence whose body is an object
+
+    Replaces a lazy fence regex: fences are located with str.find and the object is
+    closed by the same one-pass scanner as _outer_json_object, so braces inside string
+    values and nested objects can't end the match early. None when no fence holds a
+    complete object.
+    """
+    fence = content.find('```')
+    while fence != -1:
+        body = fence + 3
+        if content.startswith('json', body):
+            body += 4
+        while body < len(content) and content[body].isspace():
+            body += 1
+        if content.startswith('{', body):
+            end = _JsonObjectScanner().feed(content[body:])
+            if end is not None:
+                return content[body:body + end]
+        fence = content.find('```', body)
+    return None
+
 
 class ClaudeService:
     def __init__(self, api_key: str, model_config_name: str = 'current'):
-        self.client = Anthropic(api_key=api_key)
+        self.api_key = api_key
+        # Shared with the other Claude-backed services so connections stay warm
+        self.client = shared_anthropic_client(api_key)
+        # Same pool without the SDK's own retries, for the message loops below that already
+        # retry with backoff; otherwise each of their attempts would be retried again inside
+        self._message_client = shared_anthropic_client(api_key, max_retries=0)
+        # event loop -> (AsyncAnthropic, closer) for the coroutine API, created on first use in
+        # each loop; the service is shared across threads, each of which may run its own loop
+        self._async_clients = {}
+        self._async_clients_lock = threading.Lock()
         # Configuration constants
         self.MAX_RETRIES = 3
+        self.MAX_CONCURRENCY = PROVIDER_LIMITS['anthropic'][1]
         self.ENABLE_COST_TRACKING = True
+        # Replay identical temperature-0 requests from the shared response cache
+        self.ENABLE_RESPONSE_CACHE = True
+        # Also answer vision validations whose prompt is a close rewording of an earlier one
+        # about the same image. Prompts longer than the embedding model's window are never
+        # matched. Off by default: validation prompts embed the extracted data, and two
+        # prompts differing only in a value can still score above the threshold
+        self.ENABLE_SEMANTIC_CACHE = False
+        # Stream text requests and stop reading once the JSON object closes. Off by default:
+        # a response cut off early reports only the output tokens seen before the cut
+        self.STREAM_RESPONSES = False
+        # Unified extraction replies through a forced tool call instead of free-text JSON
+        self.STRUCTURED_OUTPUT = True
+        # Sampling temperature; at 0 responses are deterministic and safe to memoize
+        self.temperature = 0.0
         self.model_config_name = model_config_name
-        self.prompts = PromptTemplates()
+        self.prompts = _PROMPTS
+        # ((form_fields, tables), (form_fields_str, tables_str)) for the Step 2 structure last
+        # used by data extraction; every page of a document shares one structure
+        self._schema_strings = None
+        # ((form_fields_str, tables_str), rendered UNIFIED_SCHEMA_EXTRACTION_BACKUP) for those strings
+        self._unified_prefix = None
+        # Placeholder-free template, so rendering it once covers every page
+        self._comprehensive_prefix = self.prompts.COMPREHENSIVE_FIELD_EXTRACTION.format()
         self.spatial_preprocessor = SpatialPreprocessor()
         self.vision_extractor = VisionBasedExtractor(api_key)
         self.feedback_analyzer = FeedbackAnalyzer(self)
 
-        # Import model config system
-        import sys
-        import os
-        sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        from model_configs import get_model_for_task
+        # Model config system (imported at module level)
         self.get_model_for_task = get_model_for_task
     
-    def _make_claude_request(self, prompt: str, task_type: str) -> Dict[str, Any]:
-        """Make a Claude request with task-specific model selection and cost tracking"""
+    def _make_claude_request(self, prompt: str, task_type: str, cache_bypass: bool = False,
+                             static_prefix: str = "", stream: bool = None, tool: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Make a Claude request with task-specific model selection and cost tracking
+
+        Identical requests are answered from the response cache unless cache_bypass is set.
+        static_prefix, when given, is the leading part of prompt that repeats across
+        requests; it is marked for Anthropic prompt caching. stream (default
+        STREAM_RESPONSES) reads the response incrementally and returns as soon as its
+        JSON object is complete; the result then has stopped_early set. tool, when given,
+        forces Claude to answer through that tool; its input becomes the result data
+        without any text parsing (and the request is not streamed).
+        """
 
         # Get model from our new model config system
         model_name = get_model_for_task(task_type, self.model_config_name)
-
-        # Set default values for temperature and max_tokens
-        temperature = 0.0
         max_tokens = 8192
 
+        cache_key = self._response_cache_key(prompt, task_type, cache_bypass)
+        if cache_key:
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                print(f"[CACHE] Reusing {task_type} response for an identical prompt")
+                return cached
+
         print(f"[DEBUG] Using model: {model_name} for task: {task_type} (config: {self.model_config_name})")
         
         request_start = time.time()
+        if stream is None:
+            stream = self.STREAM_RESPONSES and tool is None
         
         for attempt in range(self.MAX_RETRIES):
             try:
-                # Build request parameters for Claude
-                response = self.client.messages.create(
-                    model=model_name,  # Use the model from our config system
-                    max_tokens=max_tokens,
-                    temperature=temperature,
-                    messages=[{"role": "user", "content": prompt}]
-                )
-                
-                # Track usage and cost if enabled
-                usage_info = {}
-                if self.ENABLE_COST_TRACKING:
-                    usage_info = self._track_usage(response, task_type, model_name)
-                
-                content = response.content[0].text.strip()
-                
-                # Save prompt and response for debugging
-                import os
-                debug_dir = "debug_pipeline"
-                os.makedirs(debug_dir, exist_ok=True)
-                debug_file = os.path.join(debug_dir, f"debug_{task_type}_{int(time.time())}.txt")
-                with open(debug_file, 'w', encoding='utf-8') as f:
-                    f.write(f"=== CLAUDE ENHANCED DEBUG SESSION ===\n")
-                    f.write(f"UPDATED CODE VERSION: 2025-09-13 NEW FORMAT\n")
-                    f.write(f"Task Type: {task_type}\n")
-                    f.write(f"Model: {model_name}\n")
-                    f.write(f"Temperature: {temperature}\n")
-                    f.write(f"Max Tokens: {max_tokens}\n")
-                    f.write(f"Timestamp: {time.time()}\n")
-                    f.write(f"Request Time: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-                    f.write("=" * 80 + "\n")
-                    f.write("PROMPT SENT TO LLM:\n")
-                    f.write("-" * 80 + "\n")
-                    f.write(prompt)
-                    f.write("\n" + "=" * 80 + "\n")
-                    f.write("RAW RESPONSE FROM LLM:\n")
-                    f.write("-" * 80 + "\n")
-                    f.write(content)
-                    f.write("\n" + "=" * 80 + "\n")
-                print(f"DEBUG - Prompt & response saved to: {debug_file}")
-                
-                # Try to parse JSON, with fallback handling
-                try:
-                    result = json.loads(content)
-                except json.JSONDecodeError:
-                    # Try multiple JSON extraction strategies
-                    result = self._extract_json_from_response(content, model_name, task_type)
-                    if not result["success"]:
-                        return result
-                    result = result["data"]
-                
-                return {
-                    "success": True, 
-                    "data": result,
-                    "usage": usage_info,
-                    "model_used": model_name,
-                    "task_type": task_type,
-                    "response_time": time.time() - request_start
-                }
+                request = self._request_params(model_name, max_tokens, prompt, static_prefix, tool)
+                content = None
+                if stream:
+                    with self._message_client.messages.stream(**request) as message_stream:
+                        scanner = _JsonObjectScanner()
+                        chunks = []
+                        for chunk in message_stream.text_stream:
+                            chunks.append(chunk)
+                            end = scanner.feed(chunk)
+                            if end is not None:
+                                content = "".join(chunks)[scanner.start:end]
+                                break
+                            if scanner.start is None and scanner.consumed > _MAX_PROSE_BEFORE_JSON:
+                                # Not going to answer in JSON; stop paying for output and fall back on the prose
+                                print(f"[STREAM] No JSON after {scanner.consumed} characters, stopping {task_type} generation")
+                                content = "".join(chunks)
+                                break
+                        response = (message_stream.current_message_snapshot if content is not None
+                                    else message_stream.get_final_message())
+                else:
+                    response = self._message_client.messages.create(**request)
+                result = self._claude_request_result(response, prompt, task_type, model_name, max_tokens,
+                                                     request_start, content)
+                self._store_response(cache_key, result)
+                return result
                 
             except json.JSONDecodeError as e:
-                # Try to extract JSON from the response
-                content = response.content[0].text
-                return {
-                    "success": False, 
-                    "error": f"JSON parsing error: {str(e)}", 
-                    "raw_content": content,
-                    "model_used": model_name,
-                    "task_type": task_type
-                }
+                return self._json_error_result(e, response, model_name, task_type)
                 
             except Exception as e:
-                if attempt == self.MAX_RETRIES - 1:
-                    return {
-                        "success": False, 
-                        "error": f"Request failed after {self.MAX_RETRIES} attempts: {str(e)}",
-                        "model_used": model_name,
-                        "task_type": task_type
-                    }
+                failure = self._request_failure(e, attempt, model_name, task_type)
+                if failure:
+                    return failure
                 
                 # Wait before retry
-                time.sleep(2 ** attempt)  # Exponential backoff
+                time.sleep(retry_delay(e, attempt))  # Retry-After, else exponential backoff with jitter
         
         return {"success": False, "error": "Maximum retries exceeded"}
+
+    async def _amake_claude_request(self, prompt: str, task_type: str, cache_bypass: bool = False,
+                                    static_prefix: str = "", stream: bool = None,
+                                    tool: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Coroutine twin of _make_claude_request on the AsyncAnthropic client"""
+
+        model_name = get_model_for_task(task_type, self.model_config_name)
+        max_tokens = 8192
+
+        cache_key = self._response_cache_key(prompt, task_type, cache_bypass)
+        if cache_key:
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                print(f"[CACHE] Reusing {task_type} response for an identical prompt")
+                return cached
+            return await single_flight(cache_key, lambda: self._asend_claude_request(
+                prompt, task_type, model_name, max_tokens, cache_key, static_prefix, stream, tool))
+
+        return await self._asend_claude_request(prompt, task_type, model_name, max_tokens, None, static_prefix, stream, tool)
+
+    async def _asend_claude_request(self, prompt: str, task_type: str, model_name: str, max_tokens: int,
+                                    cache_key, static_prefix: str = "", stream: bool = None,
+                                    tool: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Network half of _amake_claude_request: retries, then stores the result under cache_key"""
+
+        print(f"[DEBUG] Using model: {model_name} for task: {task_type} (config: {self.model_config_name}, async)")
+
+        request_start = time.time()
+        if stream is None:
+            stream = self.STREAM_RESPONSES and tool is None
+
+        for attempt in range(self.MAX_RETRIES):
+            # Paces gather() fan-outs to the provider's requests-per-minute quota
+            await token_bucket_for('anthropic').acquire()
+            try:
+                request = self._request_params(model_name, max_tokens, prompt, static_prefix, tool)
+                content = None
+                if stream:
+                    async with (await self._get_async_client()).messages.stream(**request) as message_stream:
+                        scanner = _JsonObjectScanner()
+                        chunks = []
+                        async for chunk in message_stream.text_stream:
+                            chunks.append(chunk)
+                            end = scanner.feed(chunk)
+                            if end is not None:
+                                content = "".join(chunks)[scanner.start:end]
+                                break
+                            if scanner.start is None and scanner.consumed > _MAX_PROSE_BEFORE_JSON:
+                                # Not going to answer in JSON; stop paying for output and fall back on the prose
+                                print(f"[STREAM] No JSON after {scanner.consumed} characters, stopping {task_type} generation")
+                                content = "".join(chunks)
+                                break
+                        response = (message_stream.current_message_snapshot if content is not None
+                                    else await message_stream.get_final_message())
+                else:
+                    response = await (await self._get_async_client()).messages.create(**request)
+                result = self._claude_request_result(response, prompt, task_type, model_name, max_tokens,
+                                                     request_start, content)
+                self._store_response(cache_key, result)
+                return result
+
+            except json.JSONDecodeError as e:
+                return self._json_error_result(e, response, model_name, task_type)
+
+            except Exception as e:
+                failure = self._request_failure(e, attempt, model_name, task_type)
+                if failure:
+                    return failure
+
+                await asyncio.sleep(retry_delay(e, attempt))
+
+        return {"success": False, "error": "Maximum retries exceeded"}
+
+    def _request_params(self, model_name: str, max_tokens: int, prompt: str, static_prefix: str = "",
+                        tool: Dict[str, Any] = None) -> Dict[str, Any]:
+        """messages.create arguments for a single-turn text request"""
+        request = dict(
+            model=model_name,  # Use the model from our config system
+            max_tokens=max_tokens,
+            temperature=self.temperature,
+            messages=[{"role": "user", "content": self._message_content(prompt, static_prefix)}]
+        )
+        if tool is not None:
+            request["tools"] = [tool]
+            request["tool_choice"] = {"type": "tool", "name": tool["name"]}
+        return request
+
+    def _message_content(self, prompt: str, static_prefix: str = ""):
+        """User message content; a static_prefix of prompt goes in its own cache-marked block"""
+        if static_prefix and len(static_prefix) < len(prompt) and prompt.startswith(static_prefix):
+            return [
+                {"type": "text", "text": static_prefix, "cache_control": {"type": "ephemeral"}},
+                {"type": "text", "text": prompt[len(static_prefix):]}
+            ]
+        return prompt
+
+    def _response_cache_key(self, prompt: str, task_type: str, cache_bypass: bool = False):
+        """Cache key for a request, or None when its response must not be memoized"""
+        # Only deterministic (temperature 0) responses are worth replaying
+        if cache_bypass or not self.ENABLE_RESPONSE_CACHE or self.temperature != 0:
+            return None
+        return response_cache_key('anthropic', self.model_config_name, task_type, prompt)
+
+    def _store_response(self, cache_key, result: Dict[str, Any]) -> None:
+        # Placeholder results built after an unparseable response are not worth replaying
+        if cache_key and result.get("success") and not result.get("fallback_response"):
+            response_cache.put(cache_key, result)
+
+    def cache_info(self) -> Dict[str, Dict[str, int]]:
+        """Hit/miss counters of the process-wide response and semantic caches"""
+        return {"response_cache": response_cache.stats(), "semantic_cache": semantic_cache.cache_info()}
+
+    async def _get_async_client(self) -> AsyncAnthropic:
+        """AsyncAnthropic client for the running event loop
+
+        Its connection pool is tied to the loop that created it, so every loop gets its
+        own client. The client is closed when the loop shuts down its async generators
+        (asyncio.run does this on exit), or earlier by aclose().
+        """
+        loop = asyncio.get_running_loop()
+        with self._async_clients_lock:
+            entry = self._async_clients.get(loop)
+            if entry is not None:
+                return entry[0]
+            client = new_async_anthropic_client(self.api_key, max_retries=0)
+            closer = self._close_with_loop(loop, client)
+            self._async_clients[loop] = (client, closer)
+        # Starting the generator registers it with the loop for shutdown_asyncgens()
+        await closer.__anext__()
+        return client
+
+    async def _close_with_loop(self, loop, client: AsyncAnthropic):
+        """Stays suspended for the loop's lifetime; finalizing it closes client"""
+        try:
+            yield
+        finally:
+            with self._async_clients_lock:
+                self._async_clients.pop(loop, None)
+            await client.close()
+
+    async def aclose(self) -> None:
+        """Close the running loop's async client now instead of at loop shutdown"""
+        with self._async_clients_lock:
+            entry = self._async_clients.get(asyncio.get_running_loop())
+        if entry is not None:
+            await entry[1].aclose()
+
+    def _claude_request_result(self, response, prompt: str, task_type: str, model_name: str,
+                               max_tokens: int, request_start: float, content: str = None) -> Dict[str, Any]:
+        """Track usage, save the debug transcript and parse the JSON body of a response
+
+        content is the JSON object of a streamed response cut off once it closed, or the
+        prose received before a stream that never opened one was abandoned; by default
+        the text of the complete response is parsed.
+        """
+
+        # Track usage and cost if enabled
+        usage_info = {}
+        if self.ENABLE_COST_TRACKING:
+            usage_info = self._track_usage(response, task_type, model_name)
+        
+        stopped_early = content is not None
+        tool_input = None
+        if not stopped_early:
+            tool_input = next((block.input for block in response.content if block.type == "tool_use"), None)
+            if tool_input is not None:
+                # Kept as text only for the debug transcript below
+                content = _json_dumps_indent(tool_input)
+            else:
+                content = response.content[0].text.strip()
+        
+        # Save prompt and response for debugging
+        debug_dir = "debug_pipeline"
+        debug_file = os.path.join(debug_dir, f"debug_{task_type}_{int(time.time())}.txt")
+        with io.StringIO() as f:
+            f.write(f"=== CLAUDE ENHANCED DEBUG SESSION ===\n")
+            f.write(f"UPDATED CODE VERSION: 2025-09-13 NEW FORMAT\n")
+            f.write(f"Task Type: {task_type}\n")
+            f.write(f"Model: {model_name}\n")
+            f.write(f"Temperature: {self.temperature}\n")
+            f.write(f"Max Tokens: {max_tokens}\n")
+            f.write(f"Timestamp: {time.time()}\n")
+            f.write(f"Request Time: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+            f.write("=" * 80 + "\n")
+            f.write("PROMPT SENT TO LLM:\n")
+            f.write("-" * 80 + "\n")
+            f.write(prompt)
+            f.write("\n" + "=" * 80 + "\n")
+            f.write("RAW RESPONSE FROM LLM:\n")
+            f.write("-" * 80 + "\n")
+            f.write(content)
+            f.write("\n" + "=" * 80 + "\n")
+            # Written on a background thread so the request doesn't wait on disk
+            write_debug_file(debug_file, f.getvalue())
+        print(f"DEBUG - Prompt & response saved to: {debug_file}")
+        
+        if tool_input is not None:
+            # Structured output: already a dict, nothing to parse
+            result, extraction = tool_input, {}
+        else:
+            # Try to parse JSON, with fallback handling
+            extraction = self._parse_response_json(content, model_name, task_type)
+            if not extraction["success"]:
+                return extraction
+            result = extraction["data"]
+        
+        return {
+            "success": True, 
+            "data": result,
+            "usage": usage_info,
+            "model_used": model_name,
+            "task_type": task_type,
+            "response_time": time.time() - request_start,
+            "fallback_response": extraction.get("fallback", False),
+            "stopped_early": stopped_early
+        }
+
+    def _json_error_result(self, error: json.JSONDecodeError, response, model_name: str, task_type: str) -> Dict[str, Any]:
+        return {
+            "success": False, 
+            "error": f"JSON parsing error: {str(error)}", 
+            "raw_content": response.content[0].text,
+            "model_used": model_name,
+            "task_type": task_type
+        }
+
+    def _request_failure(self, error: Exception, attempt: int, model_name: str, task_type: str):
+        """Failure result when error should not be retried (or retries ran out), else None"""
+        if not is_retryable_error(error):
+            return {
+                "success": False,
+                "error": f"Request failed: {str(error)}",
+                "model_used": model_name,
+                "task_type": task_type
+            }
+        if attempt == self.MAX_RETRIES - 1:
+            return {
+                "success": False, 
+                "error": f"Request failed after {self.MAX_RETRIES} attempts: {str(error)}",
+                "model_used": model_name,
+                "task_type": task_type
+            }
+        return None
+
+    async def abatch(self, calls: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """Run (prompt, task_type) requests concurrently, at most MAX_CONCURRENCY in flight.
+        Results come back in input order; a call that raises becomes an error result
+        in its slot instead of discarding the rest of the batch."""
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENCY)
+
+        async def run(prompt: str, task_type: str) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    return await self._amake_claude_request(prompt, task_type)
+                except Exception as e:
+                    print(f"ERROR: Batched {task_type} request failed: {str(e)}")
+                    return {
+                        'success': False,
+                        'error': f"Request failed: {str(e)}",
+                        'task_type': task_type
+                    }
+
+        return await asyncio.gather(*(run(prompt, task_type) for prompt, task_type in calls))
     
+    def submit_batch(self, calls: List[Tuple[str, str]], static_prefixes: List[str] = None,
+                     tool: Dict[str, Any] = None) -> str:
+        """Submit (prompt, task_type) requests as one Message Batch and return its id
+
+        Batches are billed at half the synchronous rate and suit offline runs;
+        results arrive asynchronously (usually within minutes, at most 24h).
+        With tool, every request is forced to answer through it, as in _make_claude_request.
+        """
+        if len(calls) > _MAX_BATCH_REQUESTS:
+            raise ValueError(f"A Message Batch holds at most {_MAX_BATCH_REQUESTS} requests, got {len(calls)}")
+        requests = []
+        for index, (prompt, task_type) in enumerate(calls):
+            static_prefix = static_prefixes[index] if static_prefixes else ""
+            requests.append({
+                "custom_id": str(index),
+                "params": self._request_params(
+                    get_model_for_task(task_type, self.model_config_name), 8192, prompt, static_prefix, tool
+                )
+            })
+
+        batch = self.client.messages.batches.create(requests=requests)
+        print(f"[BATCH] Submitted {len(requests)} requests as batch {batch.id}")
+        return batch.id
+
+    def poll_batch(self, batch_id: str, calls: List[Tuple[str, str]]):
+        """Results of an ended batch in submission order, or None while it is still processing"""
+        batch = self.client.messages.batches.retrieve(batch_id)
+        if batch.processing_status != "ended":
+            return None
+
+        results = [None] * len(calls)
+        for entry in self.client.messages.batches.results(batch_id):
+            index = int(entry.custom_id)
+            prompt, task_type = calls[index]
+            model_name = get_model_for_task(task_type, self.model_config_name)
+            if entry.result.type == "succeeded":
+                results[index] = self._claude_request_result(
+                    entry.result.message, prompt, task_type, model_name, 8192, time.time()
+                )
+            else:
+                results[index] = {
+                    "success": False,
+                    "error": f"Batch request {entry.result.type}",
+                    "model_used": model_name,
+                    "task_type": task_type
+                }
+
+        for index, result in enumerate(results):
+            if result is None:
+                results[index] = {"success": False, "error": "No result returned for batch request", "task_type": calls[index][1]}
+        return results
+
+    def run_batch(self, calls: List[Tuple[str, str]], static_prefixes: List[str] = None,
+                  checkpoint_path: str = None, poll_interval: float = 5.0, max_poll_interval: float = 60.0,
+                  tool: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """Submit calls as a Message Batch and wait for the results (in input order)
+
+        With checkpoint_path, the batch id and then the results are recorded as JSONL,
+        so a run interrupted while waiting resumes polling the same batch instead of
+        paying for a new one, and a finished run is replayed without any API call.
+        """
+        calls_digest = hashlib.blake2b(
+            json.dumps(calls, ensure_ascii=False).encode('utf-8'), digest_size=16
+        ).hexdigest()
+
+        batch_id = None
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            with open(checkpoint_path, 'r', encoding='utf-8') as f:
+                records = [json.loads(line) for line in f if line.strip()]
+            if records and records[0].get("calls_digest") == calls_digest:
+                batch_id = records[0]["batch_id"]
+                saved = {record["custom_id"]: record["result"] for record in records[1:]}
+                if len(saved) == len(calls):
+                    print(f"[BATCH] Reusing {len(saved)} checkpointed results of batch {batch_id}")
+                    return [saved[str(index)] for index in range(len(calls))]
+                print(f"[BATCH] Resuming batch {batch_id} from checkpoint")
+
+        if batch_id is None:
+            batch_id = self.submit_batch(calls, static_prefixes, tool)
+            if checkpoint_path:
+                with open(checkpoint_path, 'w', encoding='utf-8') as f:
+                    f.write(json.dumps({"batch_id": batch_id, "calls_digest": calls_digest}) + "\n")
+
+        delay = poll_interval
+        while True:
+            results = self.poll_batch(batch_id, calls)
+            if results is not None:
+                break
+            print(f"[BATCH] Batch {batch_id} still processing, checking again in {delay:.0f}s")
+            time.sleep(delay)
+            delay = min(max_poll_interval, delay * 2)
+
+        if checkpoint_path:
+            with open(checkpoint_path, 'a', encoding='utf-8') as f:
+                for index, result in enumerate(results):
+                    f.write(json.dumps({"custom_id": str(index), "result": result}, default=str) + "\n")
+        return results
+
+    def extract_data_batch(self, items: List[Dict[str, Any]], checkpoint_path: str = None) -> List[Dict[str, Any]]:
+        """extract_data for many pages through one Message Batch (offline runs)
+
+        Each item holds extract_data's arguments: text, field_mapping and optionally
+        user_feedback, previous_result and feedback_history. Results are in item order.
+        """
+        calls = []
+        static_prefixes = []
+        for item in items:
+            static_prefix, page_part = self._unified_extraction_prompt(
+                item["text"], item["field_mapping"], item.get("user_feedback", ""),
+                item.get("previous_result"), item.get("feedback_history")
+            )
+            calls.append((static_prefix + page_part, 'data_extraction'))
+            static_prefixes.append(static_prefix)
+
+        results = self.run_batch(calls, static_prefixes, checkpoint_path, tool=self._extraction_tool())
+        return [self._unified_extraction_result(result) for result in results]
+
+    def extract_data_bulk(self, items: List[Dict[str, Any]], output_jsonl: str, resume: bool = True) -> List[Dict[str, Any]]:
+        """extract_data for many pages in real time, checkpointed to output_jsonl
+
+        Items are as for extract_data_batch. Pages run concurrently on worker threads
+        (at most MAX_CONCURRENCY in flight), so this also works from a thread that
+        already runs an event loop; coroutine callers can gather over abatch instead.
+        Each successful result is appended to output_jsonl as it finishes; with
+        resume, pages already recorded there are not sent again. Results are in item order.
+        """
+        prompts = [
+            self._unified_extraction_prompt(
+                item["text"], item["field_mapping"], item.get("user_feedback", ""),
+                item.get("previous_result"), item.get("feedback_history")
+            )
+            for item in items
+        ]
+        checkpoint = JsonlCheckpoint(output_jsonl, resume)
+
+        def run(prompt_parts: Tuple[str, str]) -> Dict[str, Any]:
+            static_prefix, page_part = prompt_parts
+            prompt = static_prefix + page_part
+            key = response_cache_key('anthropic', self.model_config_name, 'data_extraction', prompt)
+            saved = checkpoint.get(key)
+            if saved is not None:
+                return saved
+            result = self._make_claude_request(prompt, 'data_extraction', static_prefix=static_prefix,
+                                               tool=self._extraction_tool())
+            result = self._unified_extraction_result(result)
+            if result.get("success"):
+                checkpoint.add(key, result)
+            return result
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.MAX_CONCURRENCY, len(prompts)))) as executor:
+                return list(executor.map(run, prompts))
+        finally:
+            checkpoint.close()
+
+    def _parse_response_json(self, content: str, model: str, task_type: str) -> Dict[str, Any]:
+        """Parse a response body: {"success", "data"} plus "fallback" when a placeholder was built
+
+        Only a body that starts like bare JSON gets a direct parse; fenced or prose-wrapped
+        responses can never pass it, so they go straight to _extract_json_from_response
+        instead of raising and catching a decode error first.
+        """
+        if content[:1] in ('{', '['):
+            try:
+                return {"success": True, "data": _json_loads(content)}
+            except json.JSONDecodeError:
+                pass
+        return self._extract_json_from_response(content, model, task_type)
+
     def _extract_json_from_response(self, content: str, model: str, task_type: str) -> Dict[str, Any]:
         """Extract JSON from response using multiple fallback strategies"""
-        import re
         
         # Strategy 1: Extract from markdown code blocks
-        json_match = re.search(r'```(?:json)?\s*(\{[\s\S]*?\})\s*```', content)
-        if json_match:
+        json_str = _fenced_json_object(content)
+        if json_str:
             try:
-                json_str = json_match.group(1).strip()
                 cleaned_json = self._clean_json_string(json_str)
-                result = json.loads(cleaned_json)
+                result = _json_loads(cleaned_json)
                 return {"success": True, "data": result}
             except json.JSONDecodeError as e:
                 print(f"DEBUG - JSON in code block failed: {e}")
         
         # Strategy 2: Extract from response without code blocks
-        json_match = re.search(r'(\{[\s\S]*\})', content)
-        if json_match:
+        json_str = _outer_json_object(content)
+        if json_str:
             try:
-                json_str = json_match.group(1).strip()
+                json_str = json_str.strip()
                 print(f"DEBUG - Attempting to parse JSON (length: {len(json_str)})")
                 
                 # Try to clean up common JSON issues
@@ -156,7 +731,7 @@ class ClaudeService:
                 # Additional aggressive cleaning for vision correction responses
                 cleaned_json = self._aggressive_json_fix(cleaned_json)
 
-                result = json.loads(cleaned_json)
+                result = _json_loads(cleaned_json)
                 return {"success": True, "data": result}
             except json.JSONDecodeError as e:
                 print(f"DEBUG - JSON Parse Error: {e}")
@@ -165,7 +740,7 @@ class ClaudeService:
         # Strategy 3: Try to create a minimal valid response for the task
         fallback_result = self._create_fallback_response(task_type, content)
         if fallback_result:
-            return {"success": True, "data": fallback_result}
+            return {"success": True, "data": fallback_result, "fallback": True}
         
         # All strategies failed
         return {
@@ -218,7 +793,6 @@ class ClaudeService:
     
     def _clean_json_string(self, json_str: str) -> str:
         """Clean common JSON formatting issues"""
-        import re
 
         # Remove any trailing commas before closing brackets/braces
         cleaned = re.sub(r',\s*([}\]])', r'\1', json_str)
@@ -270,7 +844,6 @@ class ClaudeService:
 
     def _aggressive_json_fix(self, json_str: str) -> str:
         """Apply aggressive fixes for malformed JSON from vision corrections"""
-        import re
 
         # First, try to fix common delimiter issues
         # Fix missing commas between objects in arrays
@@ -342,17 +915,24 @@ class ClaudeService:
             usage = response.usage
             input_tokens = usage.input_tokens
             output_tokens = usage.output_tokens
-            total_tokens = input_tokens + output_tokens
+            # Prompt-cache tokens are counted apart from input_tokens (None when caching wasn't used)
+            cache_write_tokens = getattr(usage, 'cache_creation_input_tokens', None) or 0
+            cache_read_tokens = getattr(usage, 'cache_read_input_tokens', None) or 0
+            total_tokens = input_tokens + cache_write_tokens + cache_read_tokens + output_tokens
 
             # Calculate cost
             model_pricing = pricing.get(model, {'input': 0.003, 'output': 0.015})  # fallback to Sonnet pricing
             input_cost = (input_tokens / 1000) * model_pricing['input']
+            # Cache writes bill at 1.25x the input rate, cache reads at 0.1x
+            cache_cost = ((cache_write_tokens * 1.25 + cache_read_tokens * 0.1) / 1000) * model_pricing['input']
             output_cost = (output_tokens / 1000) * model_pricing['output']
-            total_cost = input_cost + output_cost
+            total_cost = input_cost + cache_cost + output_cost
 
             return {
                 'input_tokens': input_tokens,
                 'output_tokens': output_tokens,
+                'cache_creation_input_tokens': cache_write_tokens,
+                'cache_read_input_tokens': cache_read_tokens,
                 'total_tokens': total_tokens,
                 'estimated_cost': round(total_cost, 6),
                 'model': model,
@@ -363,7 +943,15 @@ class ClaudeService:
     
     def classify_structure(self, text: str, text_blocks: list) -> Dict[str, Any]:
         """Step 1: Classify PDF structure as Form, Table, or Mixed"""
-        
+        result = self._make_claude_request(self._classification_prompt(text, text_blocks), 'classification')
+        return self._classification_result(result)
+
+    async def aclassify_structure(self, text: str, text_blocks: list) -> Dict[str, Any]:
+        """Coroutine twin of classify_structure"""
+        result = await self._amake_claude_request(self._classification_prompt(text, text_blocks), 'classification')
+        return self._classification_result(result)
+
+    def _classification_prompt(self, text: str, text_blocks: list) -> str:
         # Create a simplified representation of the document
         doc_info = {
             "text_length": len(text),
@@ -371,14 +959,13 @@ class ClaudeService:
             "sample_text":  text
         }
         
-        prompt = self.prompts.STRUCTURE_CLASSIFICATION.format(
+        return self.prompts.STRUCTURE_CLASSIFICATION.format(
             text_length=doc_info['text_length'],
             total_blocks=doc_info['total_blocks'],
             sample_text=doc_info['sample_text']
         )
-        
-        result = self._make_claude_request(prompt, 'classification')
-        
+
+    def _classification_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
         if result["success"]:
             return result["data"]
         else:
@@ -392,7 +979,18 @@ class ClaudeService:
     
     def identify_fields(self, text: str, classification_result: Dict[str, Any], user_feedback: str = "", feedback_history: list = None, word_coordinates: list = None) -> Dict[str, Any]:
         """Step 2: Comprehensive field and table extraction with spatial preprocessing support"""
-        
+        static_prefix, page_part = self._field_identification_prompt(text, user_feedback, feedback_history, word_coordinates)
+        result = self._make_claude_request(static_prefix + page_part, 'field_identification', static_prefix=static_prefix)
+        return self._field_identification_result(result, user_feedback)
+
+    async def aidentify_fields(self, text: str, classification_result: Dict[str, Any], user_feedback: str = "", feedback_history: list = None, word_coordinates: list = None) -> Dict[str, Any]:
+        """Coroutine twin of identify_fields"""
+        static_prefix, page_part = self._field_identification_prompt(text, user_feedback, feedback_history, word_coordinates)
+        result = await self._amake_claude_request(static_prefix + page_part, 'field_identification', static_prefix=static_prefix)
+        return self._field_identification_result(result, user_feedback)
+
+    def _field_identification_prompt(self, text: str, user_feedback: str = "", feedback_history: list = None, word_coordinates: list = None) -> Tuple[str, str]:
+        """(instructions shared by every document, document text and feedback)"""
         print(f"DEBUG - Starting comprehensive field extraction, text length: {len(text)}")
         print(f"DEBUG - User feedback provided: {bool(user_feedback.strip()) if user_feedback else False}")
         print(f"DEBUG - Feedback history entries: {len(feedback_history) if feedback_history else 0}")
@@ -414,13 +1012,15 @@ class ClaudeService:
         feedback_context = self._prepare_feedback_context(user_feedback, feedback_history)
         
         # Use single comprehensive extraction prompt with enhanced feedback handling
-        prompt = self.prompts.COMPREHENSIVE_FIELD_EXTRACTION.format(
+        static_prefix = self._comprehensive_prefix
+        page_part = self.prompts.COMPREHENSIVE_FIELD_EXTRACTION_TEXT.format(
             text=processed_text,
             user_feedback=feedback_context
         )
-        print(f"DEBUG - Comprehensive prompt length: {len(prompt)}")
-        
-        result = self._make_claude_request(prompt, 'field_identification')
+        print(f"DEBUG - Comprehensive prompt length: {len(static_prefix) + len(page_part)}")
+        return static_prefix, page_part
+
+    def _field_identification_result(self, result: Dict[str, Any], user_feedback: str = "") -> Dict[str, Any]:
         print(f"DEBUG - Comprehensive extraction result: {result.get('success', False)}")
         
         if result["success"]:
@@ -675,8 +1275,25 @@ Remember: This is an iterative refinement process. Each feedback builds on the p
         return result
     
     def extract_data(self, text: str, field_mapping: Dict[str, Any], word_coordinates: List[Dict] = None, user_feedback: str = "", previous_result: Dict[str, Any] = None, feedback_history: List[Dict] = None) -> Dict[str, Any]:
-        """Step 3: Extract actual data using validated Step 2 structure with UNIFIED SCHEMA-BASED extraction"""
+        """Step 3: Extract actual data using validated Step 2 structure with UNIFIED SCHEMA-BASED extraction
+
+        Pages are independent at this step: to extract several, gather aextract_data
+        calls (or use abatch) rather than calling this in a loop.
+        """
+        self._log_step3_inputs(field_mapping, word_coordinates, user_feedback)
+
+        # Use unified schema-based approach (no coordinate dependency)
+        return self._extract_comprehensive_data(text, field_mapping, word_coordinates, user_feedback, previous_result, feedback_history)
 
+    async def aextract_data(self, text: str, field_mapping: Dict[str, Any], word_coordinates: List[Dict] = None, user_feedback: str = "", previous_result: Dict[str, Any] = None, feedback_history: List[Dict] = None) -> Dict[str, Any]:
+        """Coroutine twin of extract_data"""
+        self._log_step3_inputs(field_mapping, word_coordinates, user_feedback)
+        static_prefix, page_part = self._unified_extraction_prompt(text, field_mapping, user_feedback, previous_result, feedback_history)
+        result = await self._amake_claude_request(static_prefix + page_part, 'data_extraction',
+                                                  static_prefix=static_prefix, tool=self._extraction_tool())
+        return self._unified_extraction_result(result)
+
+    def _log_step3_inputs(self, field_mapping: Dict[str, Any], word_coordinates: List[Dict] = None, user_feedback: str = "") -> None:
         print(f"DEBUG Step3 - Starting UNIFIED SCHEMA-BASED data extraction")
         print(f"DEBUG Step3 - Field mapping keys: {list(field_mapping.keys())}")
         print(f"DEBUG Step3 - Field mapping type: {field_mapping.get('field_type', 'unknown')}")
@@ -690,19 +1307,13 @@ Remember: This is an iterative refinement process. Each feedback builds on the p
             print(f"WARNING Step3 - Step2 structure appears empty or invalid")
             print(f"WARNING Step3 - Available keys: {list(field_mapping.keys())}")
 
-        # Use unified schema-based approach (no coordinate dependency)
-        return self._extract_comprehensive_data(text, field_mapping, word_coordinates, user_feedback, previous_result, feedback_history)
-    
-    def _extract_comprehensive_data(self, text: str, field_mapping: Dict[str, Any], word_coordinates: List[Dict] = None, user_feedback: str = "", previous_result: Dict[str, Any] = None, feedback_history: List[Dict] = None) -> Dict[str, Any]:
-        """Extract actual data using the validated Step 2 field and table structure with unified LLM approach"""
-
         print(f"DEBUG Step3 - Using UNIFIED SCHEMA-BASED extraction approach")
         print(f"DEBUG Step3 - Schema contains {len(field_mapping.get('form_fields', {}))} form fields")
         print(f"DEBUG Step3 - Schema contains {len(field_mapping.get('tables', []))} tables")
 
         # Create detailed debug log
         debug_log_path = os.path.join("debug_responses", f"step3_unified_extraction_{int(time.time())}.txt")
-        with open(debug_log_path, 'w', encoding='utf-8') as debug_file:
+        with io.StringIO() as debug_file:
             debug_file.write("=== STEP 3 UNIFIED SCHEMA-BASED EXTRACTION ===\n")
             debug_file.write(f"Timestamp: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
             debug_file.write(f"Field mapping keys: {list(field_mapping.keys())}\n")
@@ -714,6 +1325,10 @@ Remember: This is an iterative refinement process. Each feedback builds on the p
             debug_file.write(f"Form Fields: {field_mapping.get('form_fields', {})}\n")
             debug_file.write(f"Tables: {field_mapping.get('tables', [])}\n")
             debug_file.write("=" * 50 + "\n")
+            write_debug_file(debug_log_path, debug_file.getvalue())
+    
+    def _extract_comprehensive_data(self, text: str, field_mapping: Dict[str, Any], word_coordinates: List[Dict] = None, user_feedback: str = "", previous_result: Dict[str, Any] = None, feedback_history: List[Dict] = None) -> Dict[str, Any]:
+        """Extract actual data using the validated Step 2 field and table structure with unified LLM approach"""
 
         # Use unified schema-based extraction
         result = self._extract_unified_schema_data(text, field_mapping, user_feedback, previous_result, feedback_history)
@@ -723,38 +1338,77 @@ Remember: This is an iterative refinement process. Each feedback builds on the p
     def _extract_unified_schema_data(self, text: str, field_mapping: Dict[str, Any], user_feedback: str = "", previous_result: Dict[str, Any] = None, feedback_history: List[Dict] = None) -> Dict[str, Any]:
         """Extract all data using unified schema-based approach with enhanced feedback analysis"""
 
-        # Handle different Step2 schema formats
-        form_fields_schema = self._normalize_form_fields_schema(field_mapping.get('form_fields', {}))
-        tables_schema = field_mapping.get('tables', [])
+        static_prefix, page_part = self._unified_extraction_prompt(text, field_mapping, user_feedback, previous_result, feedback_history)
 
-        # Create schema strings for prompt
-        form_fields_str = json.dumps(form_fields_schema, indent=2) if form_fields_schema else "No form fields"
-        tables_str = json.dumps(tables_schema, indent=2) if tables_schema else "No tables"
+        # Make single LLM request for everything
+        result = self._make_claude_request(static_prefix + page_part, 'data_extraction',
+                                           static_prefix=static_prefix, tool=self._extraction_tool())
 
-        print(f"DEBUG Step3 - Building unified extraction prompt")
-        print(f"DEBUG Step3 - Normalized form fields: {type(form_fields_schema)} with {len(form_fields_schema) if isinstance(form_fields_schema, (dict, list)) else 0} items")
-        print(f"DEBUG Step3 - Tables schema: {len(tables_schema)} tables")
+        return self._unified_extraction_result(result)
+
+    def _unified_extraction_prompt(self, text: str, field_mapping: Dict[str, Any], user_feedback: str = "", previous_result: Dict[str, Any] = None, feedback_history: List[Dict] = None) -> Tuple[str, str]:
+        """(schema-bound part shared by every page, page text); feedback prompts are all page part"""
+        form_fields_str, tables_str = self._extraction_schema_strings(field_mapping)
 
         # Use enhanced feedback analysis if user feedback is provided
         if user_feedback.strip():
             print(f"DEBUG Step3 - Using enhanced feedback analysis for prompt generation")
-            prompt = self._build_enhanced_unified_prompt(
+            static_prefix = ""
+            page_part = self._build_enhanced_unified_prompt(
                 form_fields_str, tables_str, text, user_feedback, field_mapping, previous_result, feedback_history
             )
         else:
             # Use standard unified schema extraction
             print(f"DEBUG Step3 - Using standard unified schema extraction")
-            prompt = self.prompts.UNIFIED_SCHEMA_EXTRACTION_BACKUP.format(
+            static_prefix = self._unified_extraction_prefix(form_fields_str, tables_str)
+            page_part = self.prompts.UNIFIED_SCHEMA_EXTRACTION_BACKUP_TEXT.format(text=text)
+
+        print(f"DEBUG Step3 - Unified prompt length: {len(static_prefix) + len(page_part)}")
+
+        return static_prefix, page_part
+
+    def _unified_extraction_prefix(self, form_fields_str: str, tables_str: str) -> str:
+        """Schema-bound part of the unified extraction prompt, rendered once per structure
+
+        _extraction_schema_strings hands back the same string objects for every page of a
+        document, so an identity check is enough to reuse the multi-KB rendered template.
+        """
+        return identity_memo(
+            self, '_unified_prefix', (form_fields_str, tables_str),
+            lambda: self.prompts.UNIFIED_SCHEMA_EXTRACTION_BACKUP.format(
                 form_fields_schema=form_fields_str,
-                tables_schema=tables_str,
-                text=text
+                tables_schema=tables_str
             )
+        )
 
-        print(f"DEBUG Step3 - Unified prompt length: {len(prompt)}")
+    def _extraction_schema_strings(self, field_mapping: Dict[str, Any]) -> Tuple[str, str]:
+        """Prompt text for the Step 2 form fields and tables, serialized once per structure"""
+        form_fields, tables = field_mapping.get('form_fields'), field_mapping.get('tables')
+        return identity_memo(
+            self, '_schema_strings', (form_fields, tables),
+            lambda: self._render_extraction_schema_strings(form_fields, tables)
+        )
 
-        # Make single LLM request for everything
-        result = self._make_claude_request(prompt, 'data_extraction')
+    def _render_extraction_schema_strings(self, form_fields, tables) -> Tuple[str, str]:
+        # Handle different Step2 schema formats
+        form_fields_schema = self._normalize_form_fields_schema(form_fields or {})
+        tables_schema = tables or []
+
+        # Create schema strings for prompt
+        form_fields_str = _json_dumps_indent(form_fields_schema) if form_fields_schema else "No form fields"
+        tables_str = _json_dumps_indent(tables_schema) if tables_schema else "No tables"
 
+        print(f"DEBUG Step3 - Building unified extraction prompt")
+        print(f"DEBUG Step3 - Normalized form fields: {type(form_fields_schema)} with {len(form_fields_schema) if isinstance(form_fields_schema, (dict, list)) else 0} items")
+        print(f"DEBUG Step3 - Tables schema: {len(tables_schema)} tables")
+
+        return form_fields_str, tables_str
+
+    def _extraction_tool(self):
+        """Tool that unified extraction answers through, or None for free-text JSON replies"""
+        return _UNIFIED_EXTRACTION_TOOL if self.STRUCTURED_OUTPUT else None
+
+    def _unified_extraction_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
         if result["success"]:
             extracted_result = result["data"]
 
@@ -940,12 +1594,9 @@ Remember: This is an iterative refinement process. Each feedback builds on the p
 
         # Save additional context to debug file
         try:
-            import os
-            import time
             debug_dir = "debug_pipeline"
-            os.makedirs(debug_dir, exist_ok=True)
             context_file = os.path.join(debug_dir, f"step3_form_extraction_context_{int(time.time())}.txt")
-            with open(context_file, 'w', encoding='utf-8') as f:
+            with io.StringIO() as f:
                 f.write("=== STEP 3 FORM FIELD EXTRACTION CONTEXT ===\n")
                 f.write(f"Fields to extract: {form_fields}\n")
                 f.write(f"Number of fields: {len(form_fields)}\n")
@@ -956,6 +1607,7 @@ Remember: This is an iterative refinement process. Each feedback builds on the p
                 f.write("FULL TEXT CONTENT:\n")
                 f.write(text)
                 f.write("\n" + "=" * 80 + "\n")
+                write_debug_file(context_file, f.getvalue())
         except Exception as debug_error:
             print(f"DEBUG - Failed to save context file: {debug_error}")
             # Continue execution even if debug file creation fails
@@ -1256,7 +1908,7 @@ Remember: This is an iterative refinement process. Each feedback builds on the p
             {chr(10).join(f"- {instruction}" for instruction in enhancement_instructions)}
 
             Field Structure to Extract:
-            {json.dumps(base_structure, indent=2)}
+            {_json_dumps_indent(base_structure)}
 
             Apply the enhanced instructions carefully to improve extraction accuracy.
             """
@@ -1265,7 +1917,7 @@ Remember: This is an iterative refinement process. Each feedback builds on the p
             {base_instructions}
 
             Field Structure to Extract:
-            {json.dumps(base_structure, indent=2)}
+            {_json_dumps_indent(base_structure)}
             """
 
         return enhanced_prompt
@@ -1347,184 +1999,140 @@ Remember: This is an iterative refinement process. Each feedback builds on the p
             print(f"DEBUG Step3 - Falling back to direct feedback injection")
 
             # Fallback to simple feedback injection if analysis fails
-            fallback_prompt = self.prompts.UNIFIED_SCHEMA_EXTRACTION_BACKUP.format(
-                form_fields_schema=form_fields_str,
-                tables_schema=tables_str,
-                text=text
-            )
+            fallback_prompt = self._unified_extraction_prefix(form_fields_str, tables_str) \
+                + self.prompts.UNIFIED_SCHEMA_EXTRACTION_BACKUP_TEXT.format(text=text)
             fallback_prompt += f"\n\n**USER FEEDBACK:** {user_feedback}\nApply this feedback to improve extraction accuracy.\n"
 
             return fallback_prompt
 
-    def validate_with_vision(self, image_base64: str, validation_prompt: str) -> Dict[str, Any]:
-        """Perform vision-based validation using Claude API"""
-        try:
-            # Get model config for vision tasks
-            model_name = get_model_for_task('field_identification', self.model_config_name)
-
-            # Set default values for temperature and max_tokens
-            temperature = 0.0
-            max_tokens = 8192
-
-            request_start = time.time()
-
-            for attempt in range(self.MAX_RETRIES):
-                try:
-                    # Build message with image content for Claude
-                    response = self.client.messages.create(
-                        model=model_name,
-                        max_tokens=max_tokens,
-                        temperature=temperature,
-                        messages=[
-                            {
-                                "role": "user",
-                                "content": [
-                                    {"type": "text", "text": validation_prompt},
-                                    {
-                                        "type": "image",
-                                        "source": {
-                                            "type": "base64",
-                                            "media_type": "image/png",
-                                            "data": image_base64
-                                        }
-                                    }
-                                ]
-                            }
-                        ]
-                    )
-
-                    # Track usage if enabled
-                    usage_info = {}
-                    if self.ENABLE_COST_TRACKING:
-                        usage_info = self._track_usage(response, 'vision_validation', model_name)
-
-                    content = response.content[0].text.strip()
-
-                    # Try to parse JSON response
-                    try:
-                        result = json.loads(content)
-                    except json.JSONDecodeError:
-                        result = self._extract_json_from_response(content, model_name, 'vision_validation')
-                        if not result["success"]:
-                            return result
-                        result = result["data"]
-
-                    return {
-                        "success": True,
-                        "data": result,
-                        "usage": usage_info,
-                        "model_used": model_name,
-                        "response_time": time.time() - request_start
-                    }
-
-                except Exception as e:
-                    # Handle rate limiting (429) with longer backoff
-                    if "429" in str(e) or "Too Many Requests" in str(e):
-                        backoff_time = 10 + (2 ** attempt) * 5  # 15s, 25s, 45s...
-                        print(f"Rate limit hit (429), backing off for {backoff_time}s...")
-                        time.sleep(backoff_time)
-                    else:
-                        # Standard exponential backoff for other errors
-                        backoff_time = 2 ** attempt
-                        time.sleep(backoff_time)
+    def validate_with_vision(self, image_base64: str, validation_prompt: str, cache_image: bool = True) -> Dict[str, Any]:
+        """Perform vision-based validation using Claude API (see _vision_request for cache_image)"""
+        image_block = {
+            "type": "image",
+            "source": {
+                "type": "base64",
+                "media_type": "image/png",
+                "data": image_base64
+            }
+        }
+        image_key = hashlib.blake2b(image_base64.encode('ascii'), digest_size=16).hexdigest()
+        return self._vision_request(validation_prompt, image_block, 'vision_validation', "Vision validation",
+                                    image_key, cache_image=cache_image)
 
-                    if attempt == self.MAX_RETRIES - 1:
-                        return {
-                            "success": False,
-                            "error": f"Vision validation failed after {self.MAX_RETRIES} attempts: {str(e)}",
-                            "response_time": time.time() - request_start
-                        }
+    def validate_with_vision_file(self, file_id: str, validation_prompt: str, cache_image: bool = True) -> Dict[str, Any]:
+        """Perform vision-based validation using Claude Files API file_id (token efficient)
 
-        except Exception as e:
-            return {
-                "success": False,
-                "error": f"Vision validation error: {str(e)}"
+        Validation and the correction that follows it reference the same file_id with
+        different prompts; with cache_image the second call reads the image from the
+        prompt cache instead of encoding it again.
+        """
+        image_block = {
+            "type": "image",
+            "source": {
+                "type": "file",
+                "file_id": file_id
             }
+        }
+        # Referencing a file_id requires the Files API beta header
+        result = self._vision_request(validation_prompt, image_block, 'vision_validation_file',
+                                      "Vision validation with file_id", f"file:{file_id}",
+                                      extra_headers={"anthropic-beta": "files-api-2025-04-14"},
+                                      cache_image=cache_image)
+        if result.get("success"):
+            result["token_efficient"] = True
+        return result
 
-    def validate_with_vision_file(self, file_id: str, validation_prompt: str) -> Dict[str, Any]:
-        """Perform vision-based validation using Claude Files API file_id (token efficient)"""
+    def _vision_request(self, validation_prompt: str, image_block: Dict[str, Any], task_type: str,
+                        label: str, image_key: str, extra_headers: Dict[str, str] = None,
+                        cache_image: bool = True) -> Dict[str, Any]:
+        """Send an image + text validation message, retrying transient failures
+
+        The image goes first so it is a prompt prefix shared by every request about the
+        page; cache_image marks it for Anthropic prompt caching. image_key identifies the
+        image (content hash or file id) so identical temperature-0 requests are answered
+        from the response cache. Client errors other than 429/408/409 fail immediately;
+        otherwise the provider's Retry-After is honoured, falling back to exponential
+        backoff with jitter.
+        """
+        cache_key = self._response_cache_key(f"{image_key}\n{validation_prompt}", task_type)
+        if cache_key:
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                print(f"[CACHE] Reusing {task_type} response for an identical image and prompt")
+                return cached
+        semantic_scope = f"{task_type}|{image_key}" if cache_key and self.ENABLE_SEMANTIC_CACHE else None
+        if semantic_scope:
+            cached = semantic_cache.lookup(semantic_scope, validation_prompt)
+            if cached is not None:
+                cached["usage"] = {"cache_hit": True}
+                return cached
+        if cache_image:
+            image_block = {**image_block, "cache_control": {"type": "ephemeral"}}
         try:
             # Get model config for vision tasks
             model_name = get_model_for_task('field_identification', self.model_config_name)
-
-            # Set default values for temperature and max_tokens
-            temperature = 0.0
             max_tokens = 8192
 
             request_start = time.time()
 
             for attempt in range(self.MAX_RETRIES):
                 try:
-                    # Build message with file_id reference for Claude (requires Files API beta header)
-                    response = self.client.messages.create(
+                    response = self._message_client.messages.create(
                         model=model_name,
                         max_tokens=max_tokens,
-                        temperature=temperature,
+                        temperature=self.temperature,
                         messages=[
                             {
                                 "role": "user",
                                 "content": [
-                                    {"type": "text", "text": validation_prompt},
-                                    {
-                                        "type": "image",
-                                        "source": {
-                                            "type": "file",
-                                            "file_id": file_id
-                                        }
-                                    }
+                                    image_block,
+                                    {"type": "text", "text": validation_prompt}
                                 ]
                             }
                         ],
-                        extra_headers={"anthropic-beta": "files-api-2025-04-14"}
+                        extra_headers=extra_headers
                     )
 
                     # Track usage if enabled
                     usage_info = {}
                     if self.ENABLE_COST_TRACKING:
-                        usage_info = self._track_usage(response, 'vision_validation_file', model_name)
+                        usage_info = self._track_usage(response, task_type, model_name)
 
                     content = response.content[0].text.strip()
 
                     # Try to parse JSON response
-                    try:
-                        result = json.loads(content)
-                    except json.JSONDecodeError:
-                        result = self._extract_json_from_response(content, model_name, 'vision_validation_file')
-                        if not result["success"]:
-                            return result
-                        result = result["data"]
+                    parsed = self._parse_response_json(content, model_name, task_type)
+                    if not parsed["success"]:
+                        return parsed
 
-                    return {
+                    result = {
                         "success": True,
-                        "data": result,
+                        "data": parsed["data"],
                         "usage": usage_info,
                         "model_used": model_name,
                         "response_time": time.time() - request_start,
-                        "token_efficient": True
+                        "fallback_response": parsed.get("fallback", False)
                     }
+                    self._store_response(cache_key, result)
+                    if semantic_scope and not result["fallback_response"]:
+                        semantic_cache.add(semantic_scope, validation_prompt, result)
+                    return result
 
                 except Exception as e:
-                    # Handle rate limiting (429) with longer backoff
-                    if "429" in str(e) or "Too Many Requests" in str(e):
-                        backoff_time = 10 + (2 ** attempt) * 5  # 15s, 25s, 45s...
-                        print(f"Rate limit hit (429), backing off for {backoff_time}s...")
-                        time.sleep(backoff_time)
-                    else:
-                        # Standard exponential backoff for other errors
-                        backoff_time = 2 ** attempt
-                        time.sleep(backoff_time)
-
-                    if attempt == self.MAX_RETRIES - 1:
+                    if not is_retryable_error(e) or attempt == self.MAX_RETRIES - 1:
                         return {
                             "success": False,
-                            "error": f"Vision validation with file_id failed after {self.MAX_RETRIES} attempts: {str(e)}",
+                            "error": f"{label} failed after {attempt + 1} attempts: {str(e)}",
                             "response_time": time.time() - request_start
                         }
+                    delay = retry_delay(e, attempt)
+                    print(f"{label} attempt {attempt + 1} failed ({e}), retrying in {delay:.1f}s...")
+                    time.sleep(delay)
 
         except Exception as e:
             return {
                 "success": False,
-                "error": f"Vision validation with file_id error: {str(e)}"
+                "error": f"{label} error: {str(e)}"
             }
 
     def upload_image(self, image_path: str) -> Dict[str, Any]:
@@ -1551,8 +2159,33 @@ Remember: This is an iterative refinement process. Each feedback builds on the p
                 'error': f"Failed to upload image to Claude: {str(e)}"
             }
 
+    def upload_image_bytes(self, data: bytes, mime_type: str = "image/png") -> Dict[str, Any]:
+        """Upload an in-memory encoded image to Claude Files API"""
+        try:
+            extension = mime_type.split("/")[-1]
+            file_upload = self.client.files.create(
+                file=(f"page.{extension}", data, mime_type),
+                purpose="vision"
+            )
+
+            return {
+                'success': True,
+                'file_id': file_upload.id,
+                'filename': file_upload.filename,
+                'size_bytes': file_upload.size_bytes,
+                'type': file_upload.type
+            }
+
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f"Failed to upload image to Claude: {str(e)}"
+            }
+
     def delete_file(self, file_id: str) -> Dict[str, Any]:
         """Delete a specific file from Claude Files API"""
+        # Never hand this id out for a re-rendered page again, even if the delete fails
+        forget_uploads('anthropic', self.api_key, [file_id])
         try:
             # Note: Using the correct delete method for Claude Files API
             response = self.client.beta.files.delete(
@@ -1583,10 +2216,13 @@ Remember: This is an iterative refinement process. Each feedback builds on the p
         """Delete all files from Claude Files API"""
         try:
             # List all files
-            files_response = self.client.beta.files.list(
+            # Iterating the page fetches every later page too
+            files = list(self.client.beta.files.list(
                 extra_headers={"anthropic-beta": "files-api-2025-04-14"}
-            )
-            files = files_response.data
+            ))
+
+            # Nothing uploaded under this key survives this call
+            forget_uploads('anthropic', self.api_key)
 
             if not files:
                 return {
@@ -1600,12 +2236,13 @@ Remember: This is an iterative refinement process. Each feedback builds on the p
             deleted_count = 0
             failed_files = []
 
-            for file in files:
-                result = self.delete_file(file.id)
-                if result['success']:
-                    deleted_count += 1
-                else:
-                    failed_files.append(file.id)
+            file_ids = [file.id for file in files]
+            with ThreadPoolExecutor(max_workers=min(_DELETE_WORKERS, len(file_ids))) as executor:
+                for file_id, result in zip(file_ids, executor.map(self.delete_file, file_ids)):
+                    if result['success']:
+                        deleted_count += 1
+                    else:
+                        failed_files.append(file_id)
 
             message = f"Deleted {deleted_count} Claude files"
             if failed_files:
@@ -0,0 +1,40 @@
+"""
+Background writer for provider debug transcripts
+Prompt/response dumps are written on a single worker thread so LLM calls
+return without waiting on disk I/O
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# One worker keeps writes in submission order; pending writes are joined at interpreter exit
+_writer = ThreadPoolExecutor(max_workers=1)
+
+# Cap on queued writes; past it new dumps are dropped rather than growing memory without bound
+_MAX_PENDING = 1000
+_pending = threading.BoundedSemaphore(_MAX_PENDING)
+
+# Directories already created by the worker
+_created_dirs = set()
+
+
+def _write(filepath: str, text: str) -> None:
+    try:
+        directory = os.path.dirname(filepath)
+        if directory and directory not in _created_dirs:
+            os.makedirs(directory, exist_ok=True)
+            _created_dirs.add(directory)
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(text)
+    except Exception as e:
+        print(f"[DEBUG] Failed to write {filepath}: {e}")
+    finally:
+        _pending.release()
+
+
+def write_debug_file(filepath: str, text: str) -> None:
+    """Queue text to be written to filepath (parent directories are created as needed)"""
+    if not _pending.acquire(blocking=False):
+        print(f"[DEBUG] Debug writer backlog full, skipping {filepath}")
+        return
+    _writer.submit(_write, filepath, text)
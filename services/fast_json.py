@@ -0,0 +1,46 @@
+"""
+JSON parsing for provider responses
+orjson parses and serializes large schemas/responses several times faster; stdlib json
+is used when it isn't installed. orjson.JSONDecodeError subclasses json.JSONDecodeError,
+so callers keep catching json.JSONDecodeError either way. identity_memo caches text
+built from a schema for as long as callers keep passing the same schema object.
+"""
+import json
+from typing import Any, Callable
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+if orjson is not None:
+    loads = orjson.loads
+
+    def dumps_indent(obj) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode('utf-8')
+else:
+    loads = json.loads
+
+    def dumps_indent(obj) -> str:
+        return json.dumps(obj, indent=2)
+
+
+def identity_memo(owner, attr: str, key: tuple, build: Callable[[], Any]):
+    """build(), reused while key holds the same objects as when owner.attr was last built
+
+    owner.attr holds (key, value) from the last build, or None. Prompt inputs such as the
+    schema are the same objects on every page and round, so an identity check stands in
+    for comparing or hashing them.
+    """
+    memo = getattr(owner, attr)
+    if memo is not None and len(memo[0]) == len(key) and all(a is b for a, b in zip(memo[0], key)):
+        return memo[1]
+    value = build()
+    setattr(owner, attr, (key, value))
+    return value
+
+
+def serialized_schema(owner, schema) -> str:
+    """Indented schema text for prompts, memoized per schema object in owner._schema_json"""
+    return identity_memo(owner, '_schema_json', (schema,), lambda: dumps_indent(schema))
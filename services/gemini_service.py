@@ -3,16 +3,65 @@ Google Gemini 2.0 Flash service for PDF data extraction
 Provides text extraction and vision validation capabilities
 """
 import google.generativeai as genai
+import asyncio
+import io
 import json
 import os
+import re
 import time
-from typing import Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Callable, Optional, Tuple
 from PIL import Image
 from model_configs import get_model_for_task
+from .rate_limiter import PROVIDER_LIMITS, is_retryable_error, retry_delay, token_bucket_for
+from .debug_writer import write_debug_file
+from .response_cache import response_cache, response_cache_key, single_flight
+from .checkpoint import JsonlCheckpoint
+from .upload_index import forget_uploads
+from .fast_json import dumps_indent as _json_dumps_indent, identity_memo, loads as _json_loads, serialized_schema
+
+# Parallel delete calls when clearing the File API
+_DELETE_WORKERS = 16
+
+# Header fields of a validation response; the prompt asks for them before corrected_data
+_VALIDATION_PASSED_RE = re.compile(r'"validation_passed"\s*:\s*true')
+_NO_ISSUES_RE = re.compile(r'"issues_found"\s*:\s*\[\s*\]')
+_ACCURACY_RE = re.compile(r'"accuracy_estimate"\s*:\s*([0-9.]+)\s*[,}]')
+
+
+def _passed_without_issues(text: str) -> bool:
+    """True once a streamed validation response has committed to passing with no issues"""
+    return bool(_VALIDATION_PASSED_RE.search(text) and _NO_ISSUES_RE.search(text) and _ACCURACY_RE.search(text))
+
+
+# Text extraction prompt, split around the page text
+_EXTRACTION_PROMPT_HEAD = """
+You are a data extraction specialist. Extract structured data from the provided PDF text according to the given JSON schema.
+
+SCHEMA:
+{schema_str}
+
+PDF TEXT:
+"""
+
+_EXTRACTION_PROMPT_SUFFIX = """
+
+INSTRUCTIONS:
+1. Extract data that matches the schema structure exactly
+2. Return ONLY valid JSON that conforms to the schema
+3. If a field is not found, use null
+4. For arrays/tables, extract all available rows
+5. Ensure proper data types (strings, numbers, booleans)
+6. Do not add any additional fields not in the schema
+
+Return the extracted data as valid JSON:
+"""
+
 
 class GeminiService:
     def __init__(self, api_key: str = None, model_config_name: str = 'gemini_flash'):
         """Initialize Gemini service with API key or service account"""
+        self.api_key = api_key
         # Prefer API key when explicitly provided (needed for File API)
         if api_key:
             print(f"[DEBUG] Using API key authentication (explicit)")
@@ -48,13 +97,41 @@ class GeminiService:
 
         self.model_config_name = model_config_name
         self.MAX_RETRIES = 3
-
-    def _make_gemini_request(self, prompt: str, task_type: str, image_data=None) -> Dict[str, Any]:
-        """Make a Gemini request with task-specific model selection"""
+        self.MAX_CONCURRENCY = PROVIDER_LIMITS['google'][1]
+        # Replay identical temperature-0 text requests from the shared response cache
+        self.ENABLE_RESPONSE_CACHE = True
+        # Sampling temperature; at 0 responses are deterministic and safe to memoize
+        self.temperature = 0.0
+        # genai File handles by name, so repeated validation rounds skip the metadata round-trip
+        self._file_handles = {}
+        # ((schema,), extraction prompt prefix) for the schema last used by extract_data
+        self._extraction_prefix = None
+        # ((schema,), serialized text) for the schema last used by validate_with_vision
+        self._schema_json = None
+
+    def _make_gemini_request(self, prompt: str, task_type: str, image_data=None,
+                             stop_when: Optional[Callable[[str], bool]] = None,
+                             cache_bypass: bool = False) -> Dict[str, Any]:
+        """Make a Gemini request with task-specific model selection
+
+        With stop_when, the response is streamed and abandoned as soon as
+        stop_when(text_so_far) is true; the result then has stopped_early set.
+        Identical text-only requests are answered from the response cache unless
+        cache_bypass is set.
+        """
 
         # Get model from configuration
         model_name = get_model_for_task(task_type, self.model_config_name)
 
+        cache_key = None
+        if image_data is None and stop_when is None:
+            cache_key = self._response_cache_key(prompt, task_type, cache_bypass)
+            if cache_key:
+                cached = response_cache.get(cache_key)
+                if cached is not None:
+                    print(f"[CACHE] Reusing {task_type} response for an identical prompt")
+                    return cached
+
         print(f"[DEBUG] Using Gemini model: {model_name} for task: {task_type}")
 
         request_start = time.time()
@@ -64,87 +141,37 @@ class GeminiService:
                 # Initialize the model
                 model = genai.GenerativeModel(model_name)
 
-                # Prepare content
-                if image_data:
-                    # For vision tasks, include image
-                    content = [prompt, image_data]
-                else:
-                    # For text-only tasks
-                    content = [prompt]
-
                 # Make the request
                 response = model.generate_content(
-                    content,
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=0.0,
-                        max_output_tokens=65000,
-                    )
+                    self._request_content(prompt, image_data),
+                    generation_config=self._generation_config(),
+                    stream=stop_when is not None
                 )
 
-                request_end = time.time()
-                request_duration = request_end - request_start
-
-                # Extract the response text
-                if response.text:
-                    # Save prompt and response for debugging
-                    import os
-                    debug_dir = "debug_pipeline"
-                    os.makedirs(debug_dir, exist_ok=True)
-                    debug_file = os.path.join(debug_dir, f"debug_{task_type}_{int(time.time())}.txt")
-                    with open(debug_file, 'w', encoding='utf-8') as f:
-                        f.write(f"=== GEMINI DEBUG SESSION ===\n")
-                        f.write(f"Task Type: {task_type}\n")
-                        f.write(f"Model: {model_name}\n")
-                        f.write(f"Temperature: 0.0\n")
-                        f.write(f"Max Tokens: 8192\n")
-                        f.write(f"Timestamp: {time.time()}\n")
-                        f.write(f"Request Time: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-                        f.write(f"Request Duration: {request_duration:.2f}s\n")
-                        if hasattr(response, 'usage_metadata'):
-                            f.write(f"Input Tokens: {getattr(response.usage_metadata, 'prompt_token_count', 0)}\n")
-                            f.write(f"Output Tokens: {getattr(response.usage_metadata, 'candidates_token_count', 0)}\n")
-                            f.write(f"Total Tokens: {getattr(response.usage_metadata, 'total_token_count', 0)}\n")
-                        f.write("=" * 80 + "\n")
-                        f.write("PROMPT SENT TO LLM:\n")
-                        f.write("-" * 80 + "\n")
-                        f.write(prompt)
-                        f.write("\n" + "=" * 80 + "\n")
-                        f.write("RAW RESPONSE FROM LLM:\n")
-                        f.write("-" * 80 + "\n")
-                        f.write(response.text)
-                        f.write("\n" + "=" * 80 + "\n")
-                        if image_data:
-                            f.write("IMAGE DATA: Included (vision task)\n")
-                            f.write("=" * 80 + "\n")
-                    print(f"DEBUG - Prompt & response saved to: {debug_file}")
-
-                    return {
-                        'success': True,
-                        'content': response.text,
-                        'model_used': model_name,
-                        'request_duration': request_duration,
-                        'usage': {
-                            'input_tokens': getattr(response.usage_metadata, 'prompt_token_count', 0) if hasattr(response, 'usage_metadata') else 0,
-                            'output_tokens': getattr(response.usage_metadata, 'candidates_token_count', 0) if hasattr(response, 'usage_metadata') else 0,
-                            'total_tokens': getattr(response.usage_metadata, 'total_token_count', 0) if hasattr(response, 'usage_metadata') else 0
-                        }
-                    }
+                stopped_early = False
+                if stop_when is not None:
+                    # Read chunks as they arrive so the rest can be skipped once the outcome is known
+                    response_text = ""
+                    for chunk in response:
+                        response_text += chunk.text
+                        if stop_when(response_text):
+                            stopped_early = True
+                            break
                 else:
-                    return {
-                        'success': False,
-                        'error': 'Empty response from Gemini',
-                        'model_used': model_name
-                    }
+                    response_text = response.text
+
+                result = self._gemini_request_result(
+                    response, response_text, stopped_early, prompt, task_type, model_name, image_data, request_start
+                )
+                if cache_key and result['success']:
+                    response_cache.put(cache_key, result)
+                return result
 
             except Exception as e:
-                print(f"Attempt {attempt + 1} failed: {str(e)}")
-                if attempt == self.MAX_RETRIES - 1:
-                    return {
-                        'success': False,
-                        'error': f"Request failed after {self.MAX_RETRIES} attempts: {str(e)}",
-                        'model_used': model_name
-                    }
-                time.sleep(2 ** attempt)  # Exponential backoff
+                failure = self._request_failure(e, attempt, model_name)
+                if failure:
+                    return failure
+                time.sleep(retry_delay(e, attempt))  # Retry-After, else exponential backoff with jitter
 
         return {
             'success': False,
@@ -152,33 +179,248 @@ class GeminiService:
             'model_used': model_name
         }
 
-    def extract_data(self, text: str, schema: dict, page_num: int = 0) -> Dict[str, Any]:
-        """Extract structured data from text using Gemini"""
+    async def _amake_gemini_request(self, prompt: str, task_type: str, image_data=None,
+                                    cache_bypass: bool = False) -> Dict[str, Any]:
+        """Coroutine twin of _make_gemini_request (without streaming early stop)"""
 
-        # Create extraction prompt
-        schema_str = json.dumps(schema, indent=2)
-        prompt = f"""
-You are a data extraction specialist. Extract structured data from the provided PDF text according to the given JSON schema.
+        model_name = get_model_for_task(task_type, self.model_config_name)
 
-SCHEMA:
-{schema_str}
+        cache_key = None
+        if image_data is None:
+            cache_key = self._response_cache_key(prompt, task_type, cache_bypass)
+            if cache_key:
+                cached = response_cache.get(cache_key)
+                if cached is not None:
+                    print(f"[CACHE] Reusing {task_type} response for an identical prompt")
+                    return cached
+                return await single_flight(cache_key, lambda: self._asend_gemini_request(
+                    prompt, task_type, model_name, image_data, cache_key))
 
-PDF TEXT:
-{text}
+        return await self._asend_gemini_request(prompt, task_type, model_name, image_data, cache_key)
 
-INSTRUCTIONS:
-1. Extract data that matches the schema structure exactly
-2. Return ONLY valid JSON that conforms to the schema
-3. If a field is not found, use null
-4. For arrays/tables, extract all available rows
-5. Ensure proper data types (strings, numbers, booleans)
-6. Do not add any additional fields not in the schema
+    async def _asend_gemini_request(self, prompt: str, task_type: str, model_name: str, image_data,
+                                    cache_key) -> Dict[str, Any]:
+        """Network half of _amake_gemini_request: retries, then stores the result under cache_key"""
 
-Return the extracted data as valid JSON:
-"""
+        print(f"[DEBUG] Using Gemini model: {model_name} for task: {task_type} (async)")
+
+        request_start = time.time()
+
+        for attempt in range(self.MAX_RETRIES):
+            # Paces gather() fan-outs to the provider's requests-per-minute quota
+            await token_bucket_for('google').acquire()
+            try:
+                model = genai.GenerativeModel(model_name)
+                response = await model.generate_content_async(
+                    self._request_content(prompt, image_data),
+                    generation_config=self._generation_config()
+                )
+                result = self._gemini_request_result(
+                    response, response.text, False, prompt, task_type, model_name, image_data, request_start
+                )
+                if cache_key and result['success']:
+                    response_cache.put(cache_key, result)
+                return result
+
+            except Exception as e:
+                failure = self._request_failure(e, attempt, model_name)
+                if failure:
+                    return failure
+                await asyncio.sleep(retry_delay(e, attempt))
+
+        return {
+            'success': False,
+            'error': 'Maximum retries exceeded',
+            'model_used': model_name
+        }
+
+    def _response_cache_key(self, prompt: str, task_type: str, cache_bypass: bool = False):
+        """Cache key for a request, or None when its response must not be memoized"""
+        # Only deterministic (temperature 0) responses are worth replaying
+        if cache_bypass or not self.ENABLE_RESPONSE_CACHE or self.temperature != 0:
+            return None
+        return response_cache_key('google', self.model_config_name, task_type, prompt)
+
+    def _request_content(self, prompt: str, image_data=None) -> list:
+        if isinstance(image_data, list):
+            # For multi-image vision tasks, images follow the prompt in order
+            return [prompt, *image_data]
+        elif image_data:
+            # For vision tasks, include image
+            return [prompt, image_data]
+        # For text-only tasks
+        return [prompt]
+
+    def _generation_config(self):
+        return genai.types.GenerationConfig(
+            temperature=self.temperature,
+            max_output_tokens=65000,
+            # Every Gemini task here answers in JSON; JSON mode guarantees a bare,
+            # parseable body (no code fences or commentary around it)
+            response_mime_type="application/json",
+        )
+
+    def _gemini_request_result(self, response, response_text: str, stopped_early: bool, prompt: str,
+                               task_type: str, model_name: str, image_data, request_start: float) -> Dict[str, Any]:
+        """Save the debug transcript and package a response as a result dict"""
+        request_end = time.time()
+        request_duration = request_end - request_start
+
+        # Extract the response text
+        if response_text:
+            # Save prompt and response for debugging
+            debug_dir = "debug_pipeline"
+            debug_file = os.path.join(debug_dir, f"debug_{task_type}_{int(time.time())}.txt")
+            with io.StringIO() as f:
+                f.write(f"=== GEMINI DEBUG SESSION ===\n")
+                f.write(f"Task Type: {task_type}\n")
+                f.write(f"Model: {model_name}\n")
+                f.write(f"Temperature: 0.0\n")
+                f.write(f"Max Tokens: 8192\n")
+                f.write(f"Timestamp: {time.time()}\n")
+                f.write(f"Request Time: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+                f.write(f"Request Duration: {request_duration:.2f}s\n")
+                if hasattr(response, 'usage_metadata'):
+                    f.write(f"Input Tokens: {getattr(response.usage_metadata, 'prompt_token_count', 0)}\n")
+                    f.write(f"Output Tokens: {getattr(response.usage_metadata, 'candidates_token_count', 0)}\n")
+                    f.write(f"Total Tokens: {getattr(response.usage_metadata, 'total_token_count', 0)}\n")
+                f.write("=" * 80 + "\n")
+                f.write("PROMPT SENT TO LLM:\n")
+                f.write("-" * 80 + "\n")
+                f.write(prompt)
+                f.write("\n" + "=" * 80 + "\n")
+                f.write("RAW RESPONSE FROM LLM:\n")
+                f.write("-" * 80 + "\n")
+                f.write(response_text)
+                f.write("\n" + "=" * 80 + "\n")
+                if image_data:
+                    f.write("IMAGE DATA: Included (vision task)\n")
+                    f.write("=" * 80 + "\n")
+                # Written on a background thread so the request doesn't wait on disk
+                write_debug_file(debug_file, f.getvalue())
+            print(f"DEBUG - Prompt & response saved to: {debug_file}")
+
+            return {
+                'success': True,
+                'content': response_text,
+                'stopped_early': stopped_early,
+                'model_used': model_name,
+                'request_duration': request_duration,
+                'usage': {
+                    'input_tokens': getattr(response.usage_metadata, 'prompt_token_count', 0) if hasattr(response, 'usage_metadata') else 0,
+                    'output_tokens': getattr(response.usage_metadata, 'candidates_token_count', 0) if hasattr(response, 'usage_metadata') else 0,
+                    'total_tokens': getattr(response.usage_metadata, 'total_token_count', 0) if hasattr(response, 'usage_metadata') else 0
+                }
+            }
+        else:
+            return {
+                'success': False,
+                'error': 'Empty response from Gemini',
+                'model_used': model_name
+            }
+
+    def _request_failure(self, error: Exception, attempt: int, model_name: str):
+        """Failure result when error should not be retried (or retries ran out), else None"""
+        print(f"Attempt {attempt + 1} failed: {str(error)}")
+        if not is_retryable_error(error):
+            return {
+                'success': False,
+                'error': f"Request failed: {str(error)}",
+                'model_used': model_name
+            }
+        if attempt == self.MAX_RETRIES - 1:
+            return {
+                'success': False,
+                'error': f"Request failed after {self.MAX_RETRIES} attempts: {str(error)}",
+                'model_used': model_name
+            }
+        return None
+
+    async def abatch(self, calls: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """Run (prompt, task_type) requests concurrently, at most MAX_CONCURRENCY in flight.
+        Results come back in input order; a call that raises becomes an error result
+        in its slot instead of discarding the rest of the batch."""
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENCY)
+
+        async def run(prompt: str, task_type: str) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    return await self._amake_gemini_request(prompt, task_type)
+                except Exception as e:
+                    print(f"ERROR: Batched {task_type} request failed: {str(e)}")
+                    return {
+                        'success': False,
+                        'error': f"Request failed: {str(e)}",
+                        'task_type': task_type
+                    }
+
+        return await asyncio.gather(*(run(prompt, task_type) for prompt, task_type in calls))
 
-        result = self._make_gemini_request(prompt, 'data_extraction')
+    def _extraction_prompt_prefix(self, schema: dict) -> str:
+        """Everything before the page text; identical across pages, so it is serialized
+        once per schema and forms a stable prefix for Gemini's implicit prompt caching"""
+        return identity_memo(
+            self, '_extraction_prefix', (schema,),
+            lambda: _EXTRACTION_PROMPT_HEAD.format(schema_str=_json_dumps_indent(schema))
+        )
 
+    def extract_data(self, text: str, schema: dict, page_num: int = 0) -> Dict[str, Any]:
+        """Extract structured data from text using Gemini
+
+        Pages are independent here: to extract several, gather aextract_data
+        calls rather than calling this in a loop.
+        """
+        result = self._make_gemini_request(self._extraction_prompt(text, schema), 'data_extraction')
+        return self._extraction_result(result)
+
+    async def aextract_data(self, text: str, schema: dict, page_num: int = 0) -> Dict[str, Any]:
+        """Coroutine twin of extract_data"""
+        result = await self._amake_gemini_request(self._extraction_prompt(text, schema), 'data_extraction')
+        return self._extraction_result(result)
+
+    def extract_data_batch(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """extract_data for many pages at once; each item holds text, schema and optionally page_num
+
+        google.generativeai exposes no batch-prediction endpoint, so the pages are sent
+        concurrently on worker threads (at most MAX_CONCURRENCY in flight); this also
+        works from a thread that already runs an event loop, where coroutine callers can
+        gather aextract_data instead. Results are in item order.
+        """
+        with ThreadPoolExecutor(max_workers=max(1, min(self.MAX_CONCURRENCY, len(items)))) as executor:
+            return list(executor.map(
+                lambda item: self.extract_data(item["text"], item["schema"], item.get("page_num", 0)), items
+            ))
+
+    def extract_data_bulk(self, items: List[Dict[str, Any]], output_jsonl: str, resume: bool = True) -> List[Dict[str, Any]]:
+        """extract_data_batch checkpointed to output_jsonl
+
+        Each successful result is appended to output_jsonl as it finishes; with resume,
+        pages already recorded there are not sent again. Results are in item order.
+        """
+        checkpoint = JsonlCheckpoint(output_jsonl, resume)
+
+        def run(item: Dict[str, Any]) -> Dict[str, Any]:
+            prompt = self._extraction_prompt(item["text"], item["schema"])
+            key = response_cache_key('google', self.model_config_name, 'data_extraction', prompt)
+            saved = checkpoint.get(key)
+            if saved is not None:
+                return saved
+            result = self._extraction_result(self._make_gemini_request(prompt, 'data_extraction'))
+            if result.get('success'):
+                checkpoint.add(key, result)
+            return result
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.MAX_CONCURRENCY, len(items)))) as executor:
+                return list(executor.map(run, items))
+        finally:
+            checkpoint.close()
+
+    def _extraction_prompt(self, text: str, schema: dict) -> str:
+        # Schema-bound prefix (built once per schema) + page text
+        return f"{self._extraction_prompt_prefix(schema)}{text}{_EXTRACTION_PROMPT_SUFFIX}"
+
+    def _extraction_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
         if result['success']:
             try:
                 # Parse the JSON response
@@ -191,7 +433,7 @@ Return the extracted data as valid JSON:
                     content = content[:-3]
                 content = content.strip()
 
-                extracted_data = json.loads(content)
+                extracted_data = _json_loads(content)
 
                 return {
                     'success': True,
@@ -220,8 +462,8 @@ Return the extracted data as valid JSON:
             image = Image.open(image_path)
 
             # Create validation prompt
-            schema_str = json.dumps(schema, indent=2)
-            data_str = json.dumps(extracted_data, indent=2)
+            schema_str = serialized_schema(self, schema)
+            data_str = _json_dumps_indent(extracted_data)
 
             prompt = f"""
 You are a data validation specialist. Compare the extracted data against the actual PDF image to verify accuracy.
@@ -267,7 +509,7 @@ Return JSON with this structure:
                         content = content[:-3]
                     content = content.strip()
 
-                    validation_result = json.loads(content)
+                    validation_result = _json_loads(content)
 
                     return {
                         'success': True,
@@ -296,15 +538,25 @@ Return JSON with this structure:
 
     def upload_image(self, image_path: str) -> Dict[str, Any]:
         """Upload image to Gemini File API and return file info with retry logic"""
-        import time
+        return self._upload_file(image_path)
+
+    def upload_image_bytes(self, data: bytes, mime_type: str = "image/png") -> Dict[str, Any]:
+        """Upload an in-memory encoded image to Gemini File API (no temp file)"""
+        return self._upload_file(data, mime_type)
+
+    def _upload_file(self, source, mime_type: Optional[str] = None) -> Dict[str, Any]:
+        """Upload a file path or raw bytes to Gemini File API with retry logic"""
 
         retry_delays = [5, 10, 15]  # Exponential backoff: 5s, 10s, 15s
 
         for attempt in range(30):  # 30 total attempts
             try:
                 print(f"[DEBUG] Gemini upload attempt {attempt + 1}")
-                # Upload file to Gemini
-                uploaded_file = genai.upload_file(image_path)
+                # Upload file to Gemini; bytes get a fresh stream per attempt
+                if isinstance(source, bytes):
+                    uploaded_file = genai.upload_file(io.BytesIO(source), mime_type=mime_type)
+                else:
+                    uploaded_file = genai.upload_file(source)
 
                 print(f"[SUCCESS] Gemini upload succeeded on attempt {attempt + 1}")
                 return {
@@ -339,46 +591,44 @@ Return JSON with this structure:
             'error': "Upload failed after 30 retry attempts"
         }
 
-    def validate_with_vision_file(self, file_id: str, prompt: str) -> Dict[str, Any]:
-        """Validate using uploaded file ID with Gemini"""
-        try:
-            # Get the uploaded file
-            uploaded_file = genai.get_file(file_id)
+    def validate_with_vision_file(self, file_id: str, prompt: str, stop_when_passed: bool = False) -> Dict[str, Any]:
+        """Validate using uploaded file ID with Gemini
 
-            # Make request with file
-            result = self._make_gemini_request(prompt, 'vision_validation', uploaded_file)
+        With stop_when_passed, a response that passes with no issues is cut off
+        before corrected_data is downloaded; data then only carries the header fields.
+        """
+        return self.validate_with_vision_files([file_id], prompt, stop_when_passed)
 
-            if result['success']:
-                try:
-                    content = result['content'].strip()
+    def validate_with_vision_files(self, file_ids: List[str], prompt: str,
+                                   stop_when_passed: bool = False) -> Dict[str, Any]:
+        """Validate using several uploaded file IDs in one Gemini request (images attached in order)"""
+        try:
+            # Get the uploaded files (handles are fetched once per file, then reused)
+            uploaded_files = [self._get_file_handle(file_id) for file_id in file_ids]
 
-                    # Clean up response
-                    if content.startswith('```json'):
-                        content = content[7:]
-                    if content.endswith('```'):
-                        content = content[:-3]
-                    content = content.strip()
+            # Make request with files
+            result = self._make_gemini_request(
+                prompt, 'vision_validation', uploaded_files,
+                stop_when=_passed_without_issues if stop_when_passed else None
+            )
 
-                    validation_result = json.loads(content)
+            return self._vision_file_result(result)
 
-                    return {
-                        'success': True,
-                        'data': validation_result,
-                        'raw_content': result['content'],
-                        'model_used': result['model_used'],
-                        'usage': result.get('usage', {}),
-                        'request_duration': result.get('request_duration', 0)
-                    }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f"File-based validation failed: {str(e)}"
+            }
 
-                except json.JSONDecodeError as e:
-                    return {
-                        'success': False,
-                        'error': f"Failed to parse validation JSON: {str(e)}",
-                        'raw_content': result['content'],
-                        'model_used': result['model_used']
-                    }
-            else:
-                return result
+    async def avalidate_with_vision_files(self, file_ids: List[str], prompt: str) -> Dict[str, Any]:
+        """Coroutine twin of validate_with_vision_files"""
+        try:
+            # Handle lookups are cached after the first round, so a thread hop is rare
+            uploaded_files = await asyncio.to_thread(
+                lambda: [self._get_file_handle(file_id) for file_id in file_ids]
+            )
+            result = await self._amake_gemini_request(prompt, 'vision_validation', uploaded_files)
+            return self._vision_file_result(result)
 
         except Exception as e:
             return {
@@ -386,8 +636,67 @@ Return JSON with this structure:
                 'error': f"File-based validation failed: {str(e)}"
             }
 
+    def _vision_file_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        if result['success'] and result.get('stopped_early'):
+            accuracy = _ACCURACY_RE.search(result['content'])
+            return {
+                'success': True,
+                'data': {
+                    'validation_passed': True,
+                    'accuracy_estimate': float(accuracy.group(1)),
+                    'issues_found': []
+                },
+                'raw_content': result['content'],
+                'model_used': result['model_used'],
+                'usage': result.get('usage', {}),
+                'request_duration': result.get('request_duration', 0)
+            }
+
+        if result['success']:
+            try:
+                content = result['content'].strip()
+
+                # Clean up response
+                if content.startswith('```json'):
+                    content = content[7:]
+                if content.endswith('```'):
+                    content = content[:-3]
+                content = content.strip()
+
+                validation_result = _json_loads(content)
+
+                return {
+                    'success': True,
+                    'data': validation_result,
+                    'raw_content': result['content'],
+                    'model_used': result['model_used'],
+                    'usage': result.get('usage', {}),
+                    'request_duration': result.get('request_duration', 0)
+                }
+
+            except json.JSONDecodeError as e:
+                return {
+                    'success': False,
+                    'error': f"Failed to parse validation JSON: {str(e)}",
+                    'raw_content': result['content'],
+                    'model_used': result['model_used']
+                }
+        else:
+            return result
+
+    def _get_file_handle(self, file_id: str):
+        """Fetch an uploaded file's handle, caching it for later requests"""
+        uploaded_file = self._file_handles.get(file_id)
+        if uploaded_file is None:
+            uploaded_file = genai.get_file(file_id)
+            self._file_handles[file_id] = uploaded_file
+        return uploaded_file
+
     def delete_file(self, file_id: str) -> Dict[str, Any]:
         """Delete a specific file from Gemini File API"""
+        self._file_handles.pop(file_id, None)
+        # Never hand this id out for a re-rendered page again, even if the delete fails
+        forget_uploads('google', self.api_key, [file_id])
         try:
             # Delete file from Gemini
             genai.delete_file(file_id)
@@ -415,6 +724,9 @@ Return JSON with this structure:
             # List all files
             files = list(genai.list_files())
 
+            # Nothing uploaded under this key survives this call
+            forget_uploads('google', self.api_key)
+
             if not files:
                 return {
                     "success": True,
@@ -427,12 +739,13 @@ Return JSON with this structure:
             deleted_count = 0
             failed_files = []
 
-            for file in files:
-                result = self.delete_file(file.name)
-                if result['success']:
-                    deleted_count += 1
-                else:
-                    failed_files.append(file.name)
+            file_names = [file.name for file in files]
+            with ThreadPoolExecutor(max_workers=min(_DELETE_WORKERS, len(file_names))) as executor:
+                for file_name, result in zip(file_names, executor.map(self.delete_file, file_names)):
+                    if result['success']:
+                        deleted_count += 1
+                    else:
+                        failed_files.append(file_name)
 
             message = f"Deleted {deleted_count} Gemini files"
             if failed_files:
@@ -0,0 +1,55 @@
+"""
+Shared Anthropic clients
+Every service that talks to Claude used to build its own Anthropic client, each with
+its own connection pool, so a pipeline run paid a fresh TLS handshake per component.
+Clients are now shared per API key and keep their connections alive between requests.
+"""
+import atexit
+import threading
+
+import httpx
+from anthropic import DEFAULT_MAX_RETRIES, Anthropic, AsyncAnthropic
+
+# Sized for the pipeline's concurrent page fan-out plus the validation services
+_POOL_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60.0)
+# Generation can take minutes; connecting should not
+_TIMEOUT = httpx.Timeout(600.0, connect=5.0)
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def shared_anthropic_client(api_key: str, max_retries: int = None) -> Anthropic:
+    """Process-wide Anthropic client for api_key over one pooled keep-alive connection pool
+
+    Callers that run their own retry loop pass max_retries=0 so failures are not retried
+    twice; they get a view of the shared client that uses the same connection pool.
+    """
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = _clients[api_key] = Anthropic(
+                api_key=api_key,
+                http_client=httpx.Client(limits=_POOL_LIMITS, timeout=_TIMEOUT)
+            )
+    if max_retries is None:
+        return client
+    return client.with_options(max_retries=max_retries)
+
+
+def new_async_anthropic_client(api_key: str, max_retries: int = DEFAULT_MAX_RETRIES) -> AsyncAnthropic:
+    """AsyncAnthropic with the same pool settings; bound to the event loop that first uses it"""
+    return AsyncAnthropic(
+        api_key=api_key,
+        max_retries=max_retries,
+        http_client=httpx.AsyncClient(limits=_POOL_LIMITS, timeout=_TIMEOUT)
+    )
+
+
+@atexit.register
+def _close_shared_clients() -> None:
+    # Close pooled keep-alive connections cleanly instead of leaving them to the interpreter
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
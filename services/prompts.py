@@ -235,11 +235,7 @@ class PromptTemplates:
     5. Think Harder while extracting form fields. DO not miss any field though they do not have value.
 
     You are identifying document STRUCTURE ONLY - field labels and table headers.
-
-    Text to analyze:
-    {text}
-
-    User feedback and instructions: {user_feedback}
+    The text to analyze and any user feedback follow at the end.
 
     ## EXTRACTION GUIDELINES
 
@@ -297,6 +293,15 @@ class PromptTemplates:
     - tables = table names with their column headers
     - NO actual data values in either section!
     """
+
+    # Per-document tail of COMPREHENSIVE_FIELD_EXTRACTION; kept last so the
+    # instructions above are an identical, cacheable prompt prefix
+    COMPREHENSIVE_FIELD_EXTRACTION_TEXT = """
+    Text to analyze:
+    {text}
+
+    User feedback and instructions: {user_feedback}
+    """
     
     COMPREHENSIVE_DATA_EXTRACTION = """
     You are a data extraction specialist. Your job is to extract actual data values from the document text using the VALIDATED field and table structure identified in Step 2.
@@ -413,8 +418,7 @@ class PromptTemplates:
     3. **Precision**: Preserve original formatting, dates, numbers, and compound values exactly.
     4. **Completeness**: Extract everything in one pass - do not separate forms and tables.
 
-    **Document Text:**
-    {text}
+    The document text to extract from is given at the end, after the response format.
 
     **Required JSON Response:**
     {{
@@ -441,6 +445,13 @@ class PromptTemplates:
     }}
     """
 
+    # Per-page tail of UNIFIED_SCHEMA_EXTRACTION_BACKUP; the schema and rules above
+    # stay identical across pages of a document and form the cacheable prefix
+    UNIFIED_SCHEMA_EXTRACTION_BACKUP_TEXT = """
+    **Document Text:**
+    {text}
+    """
+
     # Enhanced Schema-Based Extraction with LLM Feedback Analysis
     UNIFIED_SCHEMA_EXTRACTION = """
     You are a comprehensive data extraction specialist with enhanced intelligence from user feedback analysis.
@@ -0,0 +1,189 @@
+"""
+Client-side rate limiting for provider API calls
+Sliding-window requests-per-minute cap plus an AIMD concurrency limit:
+concurrency halves when the provider throttles and grows back by one per success.
+Coroutine callers pace themselves with a token bucket instead of blocking a thread.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# (requests per minute, max concurrent requests) per provider
+PROVIDER_LIMITS = {
+    'anthropic': (50, 5),
+    'google': (60, 8),
+}
+
+_WINDOW_SECONDS = 60.0
+
+
+class RateLimiter:
+    """Blocking limiter shared by every caller of one provider"""
+
+    def __init__(self, requests_per_minute: int, max_concurrent: int):
+        self.requests_per_minute = requests_per_minute
+        self.max_concurrent = max_concurrent
+        # AIMD-controlled limit, between 1 and max_concurrent
+        self.concurrency_limit = max_concurrent
+        self._in_flight = 0
+        self._request_times = deque()
+        self._condition = threading.Condition()
+
+    def _window_wait(self, now: float) -> float:
+        """Seconds until the sliding window has room; caller holds the condition"""
+        while self._request_times and now - self._request_times[0] >= _WINDOW_SECONDS:
+            self._request_times.popleft()
+        if len(self._request_times) < self.requests_per_minute:
+            return 0.0
+        return _WINDOW_SECONDS - (now - self._request_times[0])
+
+    def acquire(self) -> None:
+        with self._condition:
+            while True:
+                if self._in_flight < self.concurrency_limit:
+                    now = time.monotonic()
+                    wait = self._window_wait(now)
+                    if wait <= 0:
+                        self._request_times.append(now)
+                        self._in_flight += 1
+                        return
+                    self._condition.wait(wait)
+                else:
+                    self._condition.wait()
+
+    def release(self, throttled: bool = False) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            if throttled:
+                # Multiplicative decrease
+                self.concurrency_limit = max(1, self.concurrency_limit // 2)
+            elif self.concurrency_limit < self.max_concurrent:
+                # Additive increase
+                self.concurrency_limit += 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """Hold one request slot; a rate-limit error raised inside counts as throttling"""
+        self.acquire()
+        throttled = False
+        try:
+            yield
+        except Exception as e:
+            throttled = is_rate_limit_error(e)
+            raise
+        finally:
+            self.release(throttled)
+
+
+def is_rate_limit_error(error) -> bool:
+    """True for HTTP 429 / quota errors from either SDK (or their error strings)"""
+    if _status_code(error) == 429:
+        return True
+    message = str(error).lower()
+    return '429' in message or 'rate limit' in message or 'resource exhausted' in message
+
+
+def _status_code(error):
+    status = getattr(error, 'status_code', None) or getattr(error, 'code', None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable_error(error) -> bool:
+    """False only for client errors a retry cannot fix (bad request, auth, not found...)
+
+    429, 408/409 and 5xx are retried, as are errors without an HTTP status
+    (connection resets, timeouts).
+    """
+    status = _status_code(error)
+    if status is None:
+        return True
+    return status in (408, 409, 429) or status >= 500
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter for retry number attempt (0-based)"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_after_seconds(error):
+    """Seconds the provider asked us to wait (Retry-After header), or None"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        return max(0.0, float(headers.get('retry-after')))
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(error, attempt: int, cap: float = 60.0) -> float:
+    """Delay before retrying after error: the provider's Retry-After when given, else backoff_delay"""
+    retry_after = retry_after_seconds(error)
+    if retry_after is not None:
+        return min(cap, retry_after)
+    return backoff_delay(attempt)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(provider: str) -> RateLimiter:
+    """Process-wide limiter for a provider, seeded from PROVIDER_LIMITS"""
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            rpm, concurrent = PROVIDER_LIMITS.get(provider, PROVIDER_LIMITS['anthropic'])
+            limiter = _limiters[provider] = RateLimiter(rpm, concurrent)
+        return limiter
+
+
+class TokenBucket:
+    """Requests-per-minute pacing for coroutines, shared across event loops and threads
+
+    Refills continuously at rate tokens per second up to capacity; acquire() waits
+    with asyncio.sleep, so a gather() fan-out is spread out instead of bursting into 429s.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        # A plain lock: it is only held for the arithmetic, never across an await
+        self._lock = threading.Lock()
+
+    def _take(self) -> float:
+        """Take a token if one is available (0.0), else seconds until one will be"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    async def acquire(self) -> None:
+        wait = self._take()
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self._take()
+
+
+_buckets = {}
+
+
+def token_bucket_for(provider: str) -> TokenBucket:
+    """Process-wide token bucket for a provider: PROVIDER_LIMITS rpm, bursts up to its concurrency"""
+    with _limiters_lock:
+        bucket = _buckets.get(provider)
+        if bucket is None:
+            rpm, concurrent = PROVIDER_LIMITS.get(provider, PROVIDER_LIMITS['anthropic'])
+            bucket = _buckets[provider] = TokenBucket(rpm / _WINDOW_SECONDS, concurrent)
+        return bucket
@@ -0,0 +1,151 @@
+"""
+Memoized LLM responses
+Successful text requests are kept in a process-wide LRU with a TTL, keyed by a hash of
+provider, model config, task type and the rendered prompt. Setting LLM_CACHE_DIR also
+persists entries there so re-runs in other processes reuse them. Identical coroutine
+requests already in flight are coalesced onto one call (single flight).
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# Upper bound on responses kept in memory
+_RESPONSE_CACHE_SIZE = 2048
+# Seconds a memoized response stays usable
+_RESPONSE_CACHE_TTL = 3600
+
+
+def response_cache_key(provider: str, model_config_name: str, task_type: str, prompt: str) -> str:
+    digest = hashlib.blake2b(f"{provider}|{model_config_name}|{task_type}|".encode('utf-8'), digest_size=16)
+    digest.update(prompt.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """Thread-safe LRU+TTL map from request key to result dict, optionally mirrored to a directory"""
+
+    def __init__(self, maxsize: int = _RESPONSE_CACHE_SIZE, ttl: float = _RESPONSE_CACHE_TTL,
+                 directory: Optional[str] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.directory = directory
+        # key -> (wall-clock time stored, result); wall clock so disk entries age the same way
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Lookup counters for diagnostics (see stats)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if time.time() - entry[0] > self.ttl:
+                    del self._entries[key]
+                    entry = None
+                else:
+                    self._entries.move_to_end(key)
+        if entry is None:
+            entry = self._read_disk(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._remember(key, entry)
+        self.hits += 1
+        # Callers annotate the data they get back, so hand out a private copy
+        return copy.deepcopy(entry[1])
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        entry = (time.time(), copy.deepcopy(result))
+        self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def _remember(self, key: str, entry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read_disk(self, key: str):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - stored["ts"] > self.ttl:
+            return None
+        return stored["ts"], stored["result"]
+
+    def _write_disk(self, key: str, entry) -> None:
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"ts": entry[0], "result": entry[1]}, f, default=str)
+            os.replace(tmp_path, self._path(key))
+        except (OSError, TypeError, ValueError) as e:
+            print(f"[WARNING] Could not persist LLM response cache entry: {e}")
+
+
+# Shared by every service instance in the process
+response_cache = ResponseCache(directory=os.getenv('LLM_CACHE_DIR') or None)
+
+
+# (event loop, request key) -> Future of the request currently in flight
+_inflight = {}
+# Result of a flight whose leader was cancelled; its followers then send their own request
+_LEADER_CANCELLED = object()
+
+
+async def single_flight(key: str, make_request: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Run make_request(), or await the identical request already in flight on this loop
+
+    Concurrent callers (a resubmitted page, duplicate prompts in one gather) then share
+    one provider call; each gets its own copy of the result. If the caller making the
+    call is cancelled, the callers waiting on it are not: they start over on their own.
+    """
+    loop = asyncio.get_running_loop()
+    inflight_key = (loop, key)
+    future = _inflight.get(inflight_key)
+    if future is not None:
+        print("[CACHE] Joining an identical request already in flight")
+        # shield: a cancelled follower must not cancel the leader's request
+        result = await asyncio.shield(future)
+        if result is _LEADER_CANCELLED:
+            # The first follower to get here makes the request, the others join it
+            return await single_flight(key, make_request)
+        return copy.deepcopy(result)
+
+    future = _inflight[inflight_key] = loop.create_future()
+    try:
+        result = await make_request()
+    except asyncio.CancelledError:
+        future.set_result(_LEADER_CANCELLED)
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        # Mark retrieved so an unawaited failure isn't logged at garbage collection
+        future.exception()
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        del _inflight[inflight_key]
@@ -13,17 +13,25 @@ import os
 import fitz  # PyMuPDF
 from typing import Dict, Any, List, Optional, Tuple
 from .vision_extractor import VisionBasedExtractor
-from .claude_service import ClaudeService
+from .shared_services import shared_claude_service, shared_gemini_service
 from .visual_field_inspector import VisualFieldInspector
+from .fast_json import identity_memo
+
+# Precompiled once - _clean_json_response runs on every extraction
+_TRAILING_COMMA_RE = re.compile(r',(\s*[}\]])')
+
+# Stands in for the page text when pre-rendering prompt templates; json.dumps escapes
+# NUL, so the schema portion of a prompt can never contain it
+_RAW_TEXT_PLACEHOLDER = "\x00RAW_TEXT\x00"
 
 
 class SchemaTextExtractor:
-    def __init__(self, api_key: str, model_config_name: str = 'current'):
-        """Initialize schema text extractor with vision validation and model config"""
+    def __init__(self, api_key: str, model_config_name: str = 'current', services=None):
+        """Initialize schema text extractor with vision validation and model config; services is the owning pipeline's ServiceScope"""
         self.api_key = api_key
         self.model_config_name = model_config_name
         self.vision_extractor = VisionBasedExtractor(api_key)
-        self.visual_inspector = VisualFieldInspector(api_key, model_config_name)
+        self.visual_inspector = VisualFieldInspector(api_key, model_config_name, services)
 
         # Import here to avoid circular imports
         import sys
@@ -35,13 +43,15 @@ class SchemaTextExtractor:
 
         # Initialize appropriate service based on provider
         if self.provider == 'google':
-            from .gemini_service import GeminiService
             from model_configs import GOOGLE_API_KEY
-            self.ai_service = GeminiService(GOOGLE_API_KEY, model_config_name)
+            self.ai_service = shared_gemini_service(GOOGLE_API_KEY, model_config_name, services)
         else:
-            self.claude_service = ClaudeService(api_key, model_config_name)
+            self.claude_service = shared_claude_service(api_key, model_config_name, services)
             self.ai_service = self.claude_service
 
+        # ((schema,), (prefix, suffix) around the raw text) for the last schema prompted with
+        self._schema_prompt = None
+
     def _make_unified_request(self, prompt: str, task_type: str) -> Dict[str, Any]:
         """Unified request method that handles both Claude and Gemini with same prompts"""
         if self.provider == 'google':
@@ -61,12 +71,19 @@ class SchemaTextExtractor:
             # For Claude, use existing method
             return self.ai_service._make_claude_request(prompt, task_type)
 
-    def extract_raw_text(self, pdf_path: str, page_num: int = 0) -> Dict[str, Any]:
-        """Extract raw text from PDF using enhanced PyMuPDF methods"""
+    def extract_raw_text(self, pdf_path: str, page_num: int = 0, doc=None) -> Dict[str, Any]:
+        """Extract raw text from PDF using enhanced PyMuPDF methods
+
+        An already-open fitz document may be passed as doc; it is left open.
+        """
+        owns_doc = doc is None
         try:
-            doc = fitz.open(pdf_path)
+            if owns_doc:
+                doc = fitz.open(pdf_path)
 
             if page_num >= len(doc):
+                if owns_doc:
+                    doc.close()
                 return {
                     "success": False,
                     "error": f"Page {page_num} does not exist in PDF with {len(doc)} pages"
@@ -177,7 +194,8 @@ class SchemaTextExtractor:
             text_blocks = page.get_text("dict")["blocks"]
             word_data = page.get_text("words")
 
-            doc.close()
+            if owns_doc:
+                doc.close()
 
             return {
                 "success": True,
@@ -590,6 +608,17 @@ class SchemaTextExtractor:
     def _build_text_schema_prompt(self, raw_text: str, schema: Dict[str, Any]) -> str:
         """Build prompt for extracting data from text using user-provided schema"""
 
+        # Everything except raw_text depends only on the schema, so render it once per schema
+        def render_parts():
+            template = self._render_text_schema_prompt(_RAW_TEXT_PLACEHOLDER, schema)
+            return tuple(template.split(_RAW_TEXT_PLACEHOLDER, 1))
+
+        parts = identity_memo(self, '_schema_prompt', (schema,), render_parts)
+        return parts[0] + raw_text + parts[1]
+
+    def _render_text_schema_prompt(self, raw_text: str, schema: Dict[str, Any]) -> str:
+        """Render the full text extraction prompt template"""
+
         # Use clean schema structure for LLM prompt (without descriptions/hints)
         clean_schema_for_prompt = self._extract_clean_schema_structure(schema)
 
@@ -804,7 +833,7 @@ Return valid JSON that matches the exact structure of the provided schema with A
 
         # Clean common issues
         # Remove trailing commas
-        json_part = re.sub(r',(\s*[}\]])', r'\1', json_part)
+        json_part = _TRAILING_COMMA_RE.sub(r'\1', json_part)
 
         # Fix unescaped quotes in string values
         lines = json_part.split('\n')
@@ -0,0 +1,127 @@
+"""
+Semantic cache for vision validation
+Validation prompts about the same page image that differ only in wording are answered
+from an earlier response when their MiniLM embeddings are close enough (cosine >= threshold).
+Entries are scoped per image, so a similar prompt about another page never matches.
+Prompts longer than the model's input window are not cached: the model would embed only
+their leading instructions, so prompts differing in the data after them would collide.
+Needs the optional sentence-transformers package; without it every lookup misses.
+"""
+import copy
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+# Images whose entries are kept; the least recently used image is dropped past this
+_MAX_SCOPES = 512
+# Responses kept per image
+_MAX_ENTRIES_PER_SCOPE = 64
+# Prompt embeddings kept, so a prompt repeated across pages is encoded once
+_EMBEDDING_CACHE_SIZE = 4096
+
+
+class SemanticCache:
+    """Thread-safe map from (scope, prompt embedding) to result dict, matched by cosine similarity"""
+
+    def __init__(self, threshold: float = 0.92, model_name: str = 'all-MiniLM-L6-v2'):
+        self.threshold = threshold
+        self.model_name = model_name
+        self._model = None
+        # scope -> (L2-normalized embeddings, one row per entry; results in row order)
+        self._scopes = OrderedDict()
+        # prompt text -> normalized embedding (read-only ndarray), or None when too long to embed
+        self._embeddings = OrderedDict()
+        self.embedding_hits = 0
+        self.embedding_misses = 0
+        self.too_long = 0
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return SentenceTransformer is not None
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        """Normalized embedding of text, or None when the model would truncate it"""
+        with self._lock:
+            if text in self._embeddings:
+                self._embeddings.move_to_end(text)
+                self.embedding_hits += 1
+                return self._embeddings[text]
+            self.embedding_misses += 1
+            if self._model is None:
+                print(f"[CACHE] Loading sentence embedding model {self.model_name}")
+                self._model = SentenceTransformer(self.model_name)
+            model = self._model
+        if len(model.tokenizer(text, truncation=False)["input_ids"]) > model.max_seq_length:
+            self.too_long += 1
+            embedding = None
+        else:
+            # Normalized, so a dot product is the cosine similarity
+            embedding = model.encode(text, normalize_embeddings=True).astype(np.float32)
+            # Shared between callers, so it must not be modified in place
+            embedding.flags.writeable = False
+        with self._lock:
+            self._embeddings[text] = embedding
+            while len(self._embeddings) > _EMBEDDING_CACHE_SIZE:
+                self._embeddings.popitem(last=False)
+        return embedding
+
+    def cache_info(self) -> Dict[str, int]:
+        return {
+            "embedding_hits": self.embedding_hits,
+            "embedding_misses": self.embedding_misses,
+            "embeddings": len(self._embeddings),
+            "too_long": self.too_long,
+            "images": len(self._scopes)
+        }
+
+    def lookup(self, scope: str, prompt: str) -> Optional[Dict[str, Any]]:
+        """Copy of the stored result for the most similar prompt in scope, if similar enough"""
+        if not self.available:
+            return None
+        with self._lock:
+            entries = self._scopes.get(scope)
+            if entries is None:
+                return None
+            self._scopes.move_to_end(scope)
+            embeddings, results = entries
+        embedding = self._embed(prompt)
+        if embedding is None:
+            return None
+        scores = embeddings @ embedding
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        print(f"[CACHE] Semantic match (cosine {scores[best]:.3f}) for a reworded prompt")
+        return copy.deepcopy(results[best])
+
+    def add(self, scope: str, prompt: str, result: Dict[str, Any]) -> None:
+        if not self.available:
+            return
+        embedding = self._embed(prompt)
+        if embedding is None:
+            return
+        embedding = embedding[np.newaxis, :]
+        result = copy.deepcopy(result)
+        with self._lock:
+            entries = self._scopes.get(scope)
+            if entries is None:
+                embeddings, results = embedding, [result]
+            else:
+                embeddings = np.vstack([entries[0], embedding])[-_MAX_ENTRIES_PER_SCOPE:]
+                results = (entries[1] + [result])[-_MAX_ENTRIES_PER_SCOPE:]
+            self._scopes[scope] = (embeddings, results)
+            self._scopes.move_to_end(scope)
+            while len(self._scopes) > _MAX_SCOPES:
+                self._scopes.popitem(last=False)
+
+
+# Shared by every service instance in the process
+semantic_cache = SemanticCache()
@@ -0,0 +1,43 @@
+"""
+Shared LLM service instances
+A pipeline run builds ClaudeService/GeminiService from several components (file manager,
+text extractor, visual inspector, validators), and each construction repeats the prompt,
+preprocessor and vision-extractor setup. Components of one pipeline now share services
+through the pipeline's ServiceScope. Services are never shared across pipelines: their
+settings (temperature, STREAM_RESPONSES, ...) are mutable, so one session's changes must
+not leak into another's. Only the HTTP clients are process-wide (see http_clients.py).
+The service modules are imported on first use so a Claude-only run never loads the
+Gemini SDK and vice versa.
+"""
+import threading
+
+
+class ServiceScope:
+    """Services shared by the components of one pipeline, keyed by provider, API key and model config"""
+
+    def __init__(self):
+        self._services = {}
+        self._lock = threading.Lock()
+
+
+def shared_claude_service(api_key: str, model_config_name: str = 'current', scope: ServiceScope = None):
+    """ClaudeService for (api_key, model_config_name) shared within scope; a private one without scope"""
+    from .claude_service import ClaudeService
+    return _shared(scope, ('anthropic', api_key, model_config_name), ClaudeService, api_key, model_config_name)
+
+
+def shared_gemini_service(api_key: str = None, model_config_name: str = 'gemini_flash', scope: ServiceScope = None):
+    """GeminiService for (api_key, model_config_name) shared within scope; a private one without scope"""
+    from .gemini_service import GeminiService
+    return _shared(scope, ('google', api_key, model_config_name), GeminiService, api_key, model_config_name)
+
+
+def _shared(scope, key, service_class, api_key, model_config_name):
+    if scope is None:
+        return service_class(api_key, model_config_name)
+    # Construction runs under the lock so concurrent first callers don't build duplicates
+    with scope._lock:
+        service = scope._services.get(key)
+        if service is None:
+            service = scope._services[key] = service_class(api_key, model_config_name)
+        return service
@@ -7,8 +7,9 @@ import json
 import re
 import os
 import sys
+from collections import Counter
 from typing import Dict, Any, List, Tuple, Optional
-from anthropic import Anthropic
+from .http_clients import shared_anthropic_client
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -18,7 +19,7 @@ class TableAlignmentFixer:
     """Specialized fixer for column shifting and key-value association errors"""
 
     def __init__(self, api_key: str, model_config_name: str = 'current'):
-        self.client = Anthropic(api_key=api_key)
+        self.client = shared_anthropic_client(api_key)
         self.model_client_manager = ModelClientManager(
             anthropic_api_key=api_key,
             config_name=model_config_name
@@ -575,7 +576,7 @@ class EnhancedValidationEngine:
 
     def __init__(self, api_key: str, model_config_name: str = 'current'):
         self.table_fixer = TableAlignmentFixer(api_key, model_config_name)
-        self.client = Anthropic(api_key=api_key)
+        self.client = shared_anthropic_client(api_key)
         self.model_client_manager = ModelClientManager(
             anthropic_api_key=api_key,
             config_name=model_config_name
@@ -609,7 +610,8 @@ class EnhancedValidationEngine:
             all_fixes.extend(table_fixes['fixes_applied'])
             log_progress(f"✅ Fixed {len(table_fixes['fixes_applied'])} table issues")
 
-        # Step 2: Fix key-value associations
+        # Step 2: Fix key-value associations (on the table-fixed data; nested objects can
+        # contain tables, so the two passes are not independent and stay sequential)
         log_progress("🔑 Phase 2: Fixing key-value associations...")
         kv_fixes = self.table_fixer.detect_and_fix_key_value_associations(
             file_id, current_data, schema
@@ -699,6 +701,11 @@ class EnhancedValidationEngine:
         expected_tables = schema.get('tables', [])
         extracted_table_data = data.get('table_data', [])
 
+        # Index extracted tables by name once (first occurrence wins, as before)
+        tables_by_name = {}
+        for extracted_table in extracted_table_data:
+            tables_by_name.setdefault(extracted_table.get('table_name'), extracted_table)
+
         print(f"DEBUG: Tables check: Expected {len(expected_tables)} tables")
         for expected_table in expected_tables:
             table_name = expected_table.get('table_name', 'Unknown')
@@ -706,11 +713,7 @@ class EnhancedValidationEngine:
             total_expected += len(expected_headers)
 
             # Find matching table in extracted data
-            matching_table = None
-            for extracted_table in extracted_table_data:
-                if extracted_table.get('table_name') == table_name:
-                    matching_table = extracted_table
-                    break
+            matching_table = tables_by_name.get(table_name)
 
             if matching_table:
                 extracted_headers = matching_table.get('headers', [])
@@ -753,10 +756,12 @@ class EnhancedValidationEngine:
         base_accuracy = 0.90
 
         # Analyze the types of fixes applied
-        column_shift_fixes = len([f for f in fixes if f.get('change_type') == 'column_shift_fix'])
-        key_value_fixes = len([f for f in fixes if f.get('change_type') == 'key_value_reassociation'])
-        missing_table_fixes = len([f for f in fixes if f.get('change_type') == 'missing_table_extracted'])
-        value_corrections = len([f for f in fixes if f.get('change_type') == 'value_corrected'])
+        # One pass over the fixes instead of a filtered list per fix type
+        fix_counts = Counter(f.get('change_type') for f in fixes)
+        column_shift_fixes = fix_counts['column_shift_fix']
+        key_value_fixes = fix_counts['key_value_reassociation']
+        missing_table_fixes = fix_counts['missing_table_extracted']
+        value_corrections = fix_counts['value_corrected']
 
         print(f"DEBUG: Fixes applied:")
         print(f"  Column shift fixes: {column_shift_fixes}")
@@ -0,0 +1,94 @@
+"""
+Persistent index of uploaded page images
+Maps provider + API key + image content hash to the Files API id the image was uploaded
+as, so a page rendered to the same bytes is not uploaded again by a later run. The
+services drop entries whenever they delete files, so a deleted id is never handed out.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".cache", "pipeline", "uploads.json")
+_INDEX_SIZE = 256
+# Gemini deletes uploaded files after 48 hours; stop reusing them a little before that
+_GEMINI_FILE_LIFETIME = 47 * 3600
+
+# "provider:account:image_blake2b" -> {"file_id", "ts"}, oldest first; loaded on first use
+_index = None
+_lock = threading.Lock()
+
+
+def _account(provider: str, api_key: Optional[str]) -> str:
+    # File ids are only readable with the key (workspace) that uploaded them; the key itself is not stored
+    digest = hashlib.blake2b((api_key or "").encode('utf-8'), digest_size=8).hexdigest()
+    return f"{provider}:{digest}"
+
+
+def upload_key(provider: str, api_key: Optional[str], data: bytes) -> str:
+    return f"{_account(provider, api_key)}:{hashlib.blake2b(data, digest_size=16).hexdigest()}"
+
+
+def lookup_upload(key: str) -> Optional[str]:
+    """File id recorded for key, or None (also when a Gemini file has expired)"""
+    with _lock:
+        index = _load()
+        entry = index.get(key)
+        if entry is None:
+            return None
+        if key.startswith("google:") and time.time() - entry["ts"] > _GEMINI_FILE_LIFETIME:
+            del index[key]
+            return None
+        index.move_to_end(key)
+        return entry["file_id"]
+
+
+def record_upload(key: str, file_id: str) -> None:
+    with _lock:
+        index = _load()
+        index[key] = {"file_id": file_id, "ts": time.time()}
+        index.move_to_end(key)
+        while len(index) > _INDEX_SIZE:
+            index.popitem(last=False)
+        _save(index)
+
+
+def forget_uploads(provider: str, api_key: Optional[str], file_ids: Iterable[str] = None) -> None:
+    """Drop entries for deleted files (every file of this provider and key when file_ids is None)"""
+    prefix = _account(provider, api_key) + ":"
+    file_ids = None if file_ids is None else set(file_ids)
+    with _lock:
+        index = _load()
+        stale = [key for key, entry in index.items()
+                 if key.startswith(prefix) and (file_ids is None or entry["file_id"] in file_ids)]
+        if stale:
+            for key in stale:
+                del index[key]
+            _save(index)
+
+
+def _load() -> OrderedDict:
+    """The index, read from disk on first use; caller holds _lock"""
+    global _index
+    if _index is None:
+        try:
+            with open(_INDEX_PATH, 'r', encoding='utf-8') as f:
+                _index = OrderedDict(json.load(f))
+        except (OSError, ValueError):
+            _index = OrderedDict()
+    return _index
+
+
+def _save(index: OrderedDict) -> None:
+    """Write the index atomically; caller holds _lock"""
+    try:
+        os.makedirs(os.path.dirname(_INDEX_PATH), exist_ok=True)
+        tmp_path = f"{_INDEX_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, _INDEX_PATH)
+    except OSError as e:
+        print(f"[WARNING] Could not persist upload cache: {e}")
@@ -8,7 +8,8 @@ import base64
 import io
 from typing import Dict, List, Any, Optional, Tuple
 from PIL import Image
-from anthropic import Anthropic
+from .http_clients import shared_anthropic_client
+from .debug_writer import write_debug_file
 import json
 import time
 import os
@@ -17,7 +18,7 @@ import base64
 class VisionBasedExtractor:
     def __init__(self, api_key: str):
         """Initialize the vision-based extractor with Claude API key"""
-        self.client = Anthropic(api_key=api_key)
+        self.client = shared_anthropic_client(api_key)
         self.model = "claude-3-5-sonnet-20241022"  # Claude 3.5 Sonnet with superior vision capabilities
         
     def convert_pdf_to_image(self, pdf_path: str, page_num: int = 0, dpi: int = 600) -> bytes:
@@ -502,17 +503,17 @@ class VisionBasedExtractor:
         """Save debug response to file"""
         try:
             debug_dir = "debug_pipeline"
-            os.makedirs(debug_dir, exist_ok=True)
             debug_file = os.path.join(debug_dir, f"vision_response_{task_type}_page{page_num}_{int(time.time())}.txt")
             
-            with open(debug_file, 'w', encoding='utf-8') as f:
-                f.write(f"Task Type: {task_type} (Vision)\n")
-                f.write(f"Model: {self.model}\n")
-                f.write(f"Page: {page_num}\n")
-                f.write(f"Timestamp: {time.time()}\n")
-                f.write("=" * 50 + "\n")
-                f.write("VISION RESPONSE:\n")
-                f.write(content)
+            write_debug_file(debug_file, (
+                f"Task Type: {task_type} (Vision)\n"
+                f"Model: {self.model}\n"
+                f"Page: {page_num}\n"
+                f"Timestamp: {time.time()}\n"
+                + "=" * 50 + "\n"
+                "VISION RESPONSE:\n"
+                + content
+            ))
                 
             print(f"DEBUG - Vision response saved to: {debug_file}")
             
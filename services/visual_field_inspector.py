@@ -4,16 +4,19 @@ Validates extracted data by visually inspecting PDF like a human would,
 checking field positions, labels, alignments, and actual values
 """
 
+import io
 import json
 import time
 from typing import Dict, Any, List, Optional
 from .vision_extractor import VisionBasedExtractor
-from .claude_service import ClaudeService
+from .shared_services import shared_claude_service, shared_gemini_service
+from .debug_writer import write_debug_file
+from .fast_json import serialized_schema
 
 
 class VisualFieldInspector:
-    def __init__(self, api_key: str, model_config_name: str = 'claude_sonnet'):
-        """Initialize visual field inspector with vision capabilities"""
+    def __init__(self, api_key: str, model_config_name: str = 'claude_sonnet', services=None):
+        """Initialize visual field inspector with vision capabilities; services is the owning pipeline's ServiceScope"""
         self.vision_extractor = VisionBasedExtractor(api_key)
         self.model_config_name = model_config_name
 
@@ -26,13 +29,15 @@ class VisualFieldInspector:
 
         # Initialize appropriate service based on provider
         if self.provider == 'google':
-            from .gemini_service import GeminiService
             from model_configs import GOOGLE_API_KEY
-            self.ai_service = GeminiService(GOOGLE_API_KEY, model_config_name)
+            self.ai_service = shared_gemini_service(GOOGLE_API_KEY, model_config_name, services)
         else:
-            self.claude_service = ClaudeService(api_key, model_config_name)
+            self.claude_service = shared_claude_service(api_key, model_config_name, services)
             self.ai_service = self.claude_service
 
+        # ((schema,), serialized text) for the schema last embedded in a prompt
+        self._schema_json = None
+
     def validate_all_fields_visually(self, pdf_path: str, extracted_data: Dict,
                                    schema: Dict, page_num: int = 0, file_id: str = None,
                                    page_file_ids: Dict[int, str] = None, raw_text: str = None) -> Dict:
@@ -49,8 +54,6 @@ class VisualFieldInspector:
             import time
             timestamp = int(time.time())
             debug_folder = "debug_pipeline"
-            import os
-            os.makedirs(debug_folder, exist_ok=True)
 
             # Determine which file_id to use for this specific page
             current_file_id = self._get_page_file_id(page_num, file_id, page_file_ids)
@@ -67,11 +70,12 @@ class VisualFieldInspector:
 
             if not response["success"]:
                 # Save failed validation response
-                with open(f"{debug_folder}/validation_failed_{timestamp}.txt", "w", encoding='utf-8') as f:
+                with io.StringIO() as f:
                     f.write(f"VALIDATION FAILED\n")
                     f.write(f"Timestamp: {timestamp}\n")
                     f.write(f"Error: {response.get('error', 'Unknown error')}\n")
                     f.write(f"Raw Content: {response.get('raw_content', 'No raw content')}\n")
+                    write_debug_file(f"{debug_folder}/validation_failed_{timestamp}.txt", f.getvalue())
 
                 return {
                     "success": False,
@@ -84,7 +88,7 @@ class VisualFieldInspector:
 
             # Save successful validation response
             import json
-            with open(f"{debug_folder}/validation_response_{timestamp}.json", "w", encoding='utf-8') as f:
+            with io.StringIO() as f:
                 json.dump({
                     "timestamp": timestamp,
                     "validation_result": validation_result,
@@ -94,6 +98,7 @@ class VisualFieldInspector:
                         "response_time": response.get("response_time")
                     }
                 }, f, indent=2, default=str)
+                write_debug_file(f"{debug_folder}/validation_response_{timestamp}.json", f.getvalue())
 
             return {
                 "success": True,
@@ -121,8 +126,6 @@ class VisualFieldInspector:
             import time
             timestamp = int(time.time())
             debug_folder = "debug_pipeline"
-            import os
-            os.makedirs(debug_folder, exist_ok=True)
 
             # Determine which file_id to use for this specific page
             current_file_id = self._get_page_file_id(page_num, file_id, page_file_ids)
@@ -139,11 +142,12 @@ class VisualFieldInspector:
 
             if not response["success"]:
                 # Save failed correction response
-                with open(f"{debug_folder}/correction_failed_{timestamp}.txt", "w", encoding='utf-8') as f:
+                with io.StringIO() as f:
                     f.write(f"CORRECTION FAILED\n")
                     f.write(f"Timestamp: {timestamp}\n")
                     f.write(f"Error: {response.get('error', 'Unknown error')}\n")
                     f.write(f"Raw Content: {response.get('raw_content', 'No raw content')}\n")
+                    write_debug_file(f"{debug_folder}/correction_failed_{timestamp}.txt", f.getvalue())
 
                 return {
                     "success": False,
@@ -160,7 +164,7 @@ class VisualFieldInspector:
 
             # Save successful correction response
             import json as json_lib
-            with open(f"{debug_folder}/correction_response_{timestamp}.json", "w", encoding='utf-8') as f:
+            with io.StringIO() as f:
                 json_lib.dump({
                     "timestamp": timestamp,
                     "original_data": extracted_data,
@@ -172,6 +176,7 @@ class VisualFieldInspector:
                         "response_time": response.get("response_time")
                     }
                 }, f, indent=2, default=str)
+                write_debug_file(f"{debug_folder}/correction_response_{timestamp}.json", f.getvalue())
 
             return {
                 "success": True,
@@ -184,6 +189,74 @@ class VisualFieldInspector:
                 "error": f"Visual correction failed: {str(e)}"
             }
 
+    def validate_and_correct_visually(self, pdf_path: str, extracted_data: Dict,
+                                      schema: Dict, page_num: int = 0, file_id: str = None,
+                                      page_file_ids: Dict[int, str] = None) -> Dict:
+        """
+        Visual inspection and correction in a single vision call.
+        The model returns the usual validation result plus a top-level corrected_data,
+        which is null when it found nothing to fix.
+        """
+        try:
+            prompt = self._build_visual_validate_and_correct_prompt(extracted_data, schema, page_num)
+
+            timestamp = int(time.time())
+            debug_folder = "debug_pipeline"
+
+            current_file_id = self._get_page_file_id(page_num, file_id, page_file_ids)
+
+            if current_file_id:
+                response = self.ai_service.validate_with_vision_file(current_file_id, prompt)
+            else:
+                image_data = self.vision_extractor.convert_pdf_to_image(pdf_path, page_num)
+                image_base64 = self.vision_extractor.encode_image_to_base64(image_data)
+                response = self.ai_service.validate_with_vision(image_base64, prompt)
+
+            if not response["success"]:
+                with io.StringIO() as f:
+                    f.write(f"VALIDATE+CORRECT FAILED\n")
+                    f.write(f"Timestamp: {timestamp}\n")
+                    f.write(f"Error: {response.get('error', 'Unknown error')}\n")
+                    f.write(f"Raw Content: {response.get('raw_content', 'No raw content')}\n")
+                    write_debug_file(f"{debug_folder}/validate_correct_failed_{timestamp}.txt", f.getvalue())
+
+                return {
+                    "success": False,
+                    "error": f"Vision validation failed: {response.get('error', 'Unknown error')}",
+                    "fields_with_issues": 0,
+                    "accuracy_score": 0.0
+                }
+
+            validation_result = dict(response["data"])
+            corrected_data = validation_result.pop("corrected_data", None)
+            if not isinstance(corrected_data, dict) or not corrected_data:
+                corrected_data = None
+
+            with io.StringIO() as f:
+                json.dump({
+                    "timestamp": timestamp,
+                    "validation_result": validation_result,
+                    "corrected_data": corrected_data,
+                    "response_metadata": {
+                        "success": response.get("success"),
+                        "model_used": response.get("model_used"),
+                        "response_time": response.get("response_time")
+                    }
+                }, f, indent=2, default=str)
+                write_debug_file(f"{debug_folder}/validate_correct_response_{timestamp}.json", f.getvalue())
+
+            return {
+                "success": True,
+                "validation_result": validation_result,
+                "corrected_data": corrected_data
+            }
+
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Visual validation failed: {str(e)}"
+            }
+
     def complete_visual_validation_workflow(self, pdf_path: str, extracted_data: Dict,
                                           schema: Dict, page_num: int = 0, file_id: str = None,
                                           page_file_ids: Dict[int, str] = None) -> Dict:
@@ -278,16 +351,24 @@ class VisualFieldInspector:
         total_corrections = 0
         accuracy_progression = []
 
+        # Rate limiting: minimum spacing between the start of consecutive vision requests.
+        # Time spent waiting on the previous response counts toward it, so the delay only
+        # applies when the API answered faster than the interval.
+        min_request_interval = 4.0
+        last_request_start = None
+
         for round_num in range(1, max_rounds + 1):
             print(f"\n[ROUND] Validation Round {round_num}")
 
-            # Add brief delay before validation to reduce rate limit chance
-            if round_num > 1:
-                import time
-                time.sleep(1)  # 1 second delay before subsequent rounds
+            if last_request_start is not None:
+                remaining = min_request_interval - (time.monotonic() - last_request_start)
+                if remaining > 0:
+                    print(f"[WAIT] Waiting {remaining:.1f}s before next round to avoid rate limits...")
+                    time.sleep(remaining)
 
-            # Perform validation for this round
-            validation_result = self.validate_all_fields_visually(
+            # Validate this round; corrections come back in the same response
+            last_request_start = time.monotonic()
+            validation_result = self.validate_and_correct_visually(
                 pdf_path, current_data, schema, page_num, file_id, page_file_ids
             )
 
@@ -302,7 +383,6 @@ class VisualFieldInspector:
                 # If early rounds, try to continue with a delay
                 if round_num <= 3:
                     print(f"[RETRY] Early round failure, attempting to continue after delay...")
-                    import time
                     time.sleep(2)  # Brief delay for rate limiting
                     continue
 
@@ -337,10 +417,14 @@ class VisualFieldInspector:
 
             print(f"[CORRECT] Round {round_num}: Found {fields_with_issues} issues, applying corrections...")
 
-            # Apply corrections
-            correction_result = self.correct_based_on_visual_inspection(
-                pdf_path, current_data, validation_data, schema, page_num, file_id, page_file_ids
-            )
+            if validation_result["corrected_data"] is not None:
+                correction_result = {"success": True, "corrected_data": validation_result["corrected_data"]}
+            else:
+                # Model reported issues but returned no corrections; ask for them separately
+                last_request_start = time.monotonic()
+                correction_result = self.correct_based_on_visual_inspection(
+                    pdf_path, current_data, validation_data, schema, page_num, file_id, page_file_ids
+                )
 
             if correction_result["success"]:
                 # Track what was corrected
@@ -362,13 +446,6 @@ class VisualFieldInspector:
                 print(f"[ERROR] Round {round_num}: Correction failed")
                 break
 
-            # Rate limiting: Add delay between rounds to avoid 429 errors
-            if round_num < max_rounds:  # Don't delay after the last round
-                import time
-                delay = 3  # 3 second delay between rounds
-                print(f"[WAIT] Waiting {delay}s before next round to avoid rate limits...")
-                time.sleep(delay)
-
         # Calculate final accuracy
         final_accuracy = self._calculate_enhanced_final_accuracy(
             correction_history, accuracy_progression, target_accuracy
@@ -688,7 +765,7 @@ CURRENT EXTRACTED DATA TO VERIFY AND CROSS-REFERENCE:
 {json.dumps(extracted_data, indent=2)}
 
 EXPECTED SCHEMA:
-{json.dumps(schema, indent=2)}
+{serialized_schema(self, schema)}
 
 **CRITICAL VISUAL INSPECTION INSTRUCTIONS:**
 You are looking at page {page_num}. USE THE ACTUAL VISUAL LAYOUT to verify the extracted data above:
@@ -1029,6 +1106,31 @@ Perform the visual inspection now and respond with valid JSON only:"""
 
         return prompt
 
+    def _build_visual_validate_and_correct_prompt(self, extracted_data: Dict, schema: Dict, page_num: int = 0) -> str:
+        """Validation prompt extended to return corrected data in the same response"""
+
+        validation_prompt = self._build_comprehensive_visual_validation_prompt(
+            extracted_data, schema, page_num, None
+        )
+
+        return validation_prompt + """
+
+## CORRECTIONS IN THE SAME RESPONSE:
+
+After the inspection, add one more top-level key, "corrected_data", to the JSON above:
+- If "fields_with_issues" is 0, set "corrected_data" to null.
+- Otherwise set it to the COMPLETE corrected data for this page in the exact schema format
+  (every field and every table row, not just the ones that changed).
+
+When building "corrected_data":
+1. Fix POSITIONING first: move values to the column or field they visually align with.
+2. NEVER truncate text - if the image shows partial text, keep the complete text from the extracted data above.
+3. If a cell or field is truly empty in the image, use null; don't invent single letters or codes.
+4. Extract ALL table rows visible in the image, including faint rows near the bottom of the table or page.
+5. Only change a value when it is clearly wrong, not merely truncated.
+
+Respond with valid JSON only, containing the inspection keys plus "corrected_data":"""
+
     def _build_visual_correction_prompt(self, extracted_data: Dict, validation_result: Dict, schema: Dict, page_num: int = 0) -> str:
         """Build correction prompt based on visual inspection findings"""
 
@@ -1066,7 +1168,7 @@ VISUAL INSPECTION FINDINGS FOR PAGE {page_num}:
 {json.dumps(validation_result, indent=2)}
 
 TARGET SCHEMA:
-{json.dumps(schema, indent=2)}
+{serialized_schema(self, schema)}
 
 **CORRECTION INSTRUCTIONS:**
 Look at page {page_num} image and make corrections based on ACTUAL VISUAL POSITIONING: